@@ -0,0 +1,3 @@
+"""
+Benchmarks of the interpreter, `python benchmarks/run.py --help` runs the suite.
+"""
@@ -0,0 +1,45 @@
+"""
+Cold (parse and write the cache) against warm (load from the cache) startup of eval_file.
+
+Run from the repository root: python benchmarks/bench_cache.py [lines]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.bench_lexer import generate_source
+from light.cache import load_program
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+
+    return time.perf_counter() - start
+
+
+def main(lines=20000):
+    directory = tempfile.mkdtemp()
+    try:
+        script = os.path.join(directory, 'script.lt')
+        with open(script, 'w') as f:
+            f.write(generate_source(lines))
+
+        uncached = timed(lambda: load_program(script, use_cache=False))
+        cold = timed(lambda: load_program(script))
+        warm = min(timed(lambda: load_program(script)) for _ in range(3))
+
+        print(f"{lines} lines")
+        print(f"no cache {uncached:8.3f}s")
+        print(f"cold     {cold:8.3f}s  (parse + write)")
+        print(f"warm     {warm:8.3f}s  ({uncached / warm:.1f}x faster than parsing)")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
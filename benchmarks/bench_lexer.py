@@ -0,0 +1,59 @@
+"""
+Throughput of the regex tokenizer against the character by character Lexer.
+
+Run from the repository root: python benchmarks/bench_lexer.py [lines]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from light.lexer import Lexer, tokenize_iter
+
+
+def suffix(i):
+    """Identifiers can't contain digits, spell `i` in letters instead"""
+    letters = ''
+    while True:
+        i, rest = divmod(i, 26)
+        letters += chr(ord('a') + rest)
+        if i == 0:
+            return letters
+
+
+def generate_source(lines):
+    chunk = [
+        "let fib_{i} = func(n){{ if n < 2 {{ return n }} return fib_{i}(n - 1) + fib_{i}(n - 2) }}",
+        "let value_{i} = (60 * 60 * 24) / 2 - 7 + 0",
+        "if value_{i} >= 10 {{ let flag_{i} = true }} else {{ let flag_{i} = false }}",
+        "let add_{i} = func(x, y){{ return x + y }}; add_{i}(1, -2) != 3",
+    ]
+    return "\n".join(chunk[i % len(chunk)].format(i=suffix(i)) for i in range(lines))
+
+
+def measure(func, source, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = func(source)
+        best = min(best, time.perf_counter() - start)
+
+    return count, best
+
+
+def main(lines=20000):
+    source = generate_source(lines)
+    size = len(source) / 1e6
+
+    old_count, old_time = measure(lambda s: len(Lexer(s).scan()), source)
+    new_count, new_time = measure(lambda s: sum(1 for _ in tokenize_iter(s)), source)
+    assert old_count == new_count
+
+    print(f"{lines} lines, {size:.2f} MB, {new_count} tokens")
+    print(f"Lexer.scan    {old_time:8.3f}s  {size / old_time:6.2f} MB/s")
+    print(f"tokenize_iter {new_time:8.3f}s  {size / new_time:6.2f} MB/s  ({old_time / new_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,238 @@
+"""
+Runs the workloads of `workloads.py` and reports, per benchmark, the
+operations per second, the peak memory traced by tracemalloc and, for one
+operation:
+
+- the blocks it allocates that are still alive when it returns, its result
+  included, split by the phase (lex, parse, load or eval) of the `light`
+  module that allocated them. Blocks freed before it returns, like most
+  intermediate values of an evaluation, aren't counted;
+- the blocks still allocated once its result is dropped, which should stay
+  near zero;
+- the garbage collections it triggers.
+
+Results can be saved as a JSON baseline and compared with a later run,
+changes beyond the threshold are flagged as regressions.
+
+Run from the repository root:
+
+    python benchmarks/run.py --save before.json
+    python benchmarks/run.py --compare before.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import light
+from light.evaluator import ENGINES
+
+from benchmarks.workloads import WORKLOADS
+
+# Relative change of a metric reported as a regression
+THRESHOLD = 0.10
+# Growth in live blocks too small to report, whatever the relative change
+ALLOCATION_SLACK = 100
+
+sys.setrecursionlimit(100000)
+
+# Frames traced per allocation, enough to get past the constructors of `DATA_MODULES`
+TRACE_FRAMES = 8
+
+# As spelled in the file names of traced frames
+LIGHT_DIR = os.path.dirname(light.__file__)
+
+# Phase of the allocations made in a module of `light`, the others evaluate
+PHASE_MODULES = {
+    'lexer.py': 'lex',
+    'parser.py': 'parse',
+    'arena.py': 'load',
+    'cache.py': 'load',
+}
+PHASES = ('lex', 'parse', 'load', 'eval', 'other')
+
+# Modules of the values every phase creates, their allocations count for the caller
+DATA_MODULES = {'ast.py', 'tokens.py', 'objects.py'}
+
+
+def gc_collections():
+    return sum(stats['collections'] for stats in gc.get_stats())
+
+
+def phase_of(traceback):
+    """The phase of the innermost frame of `traceback` in a module of `light`"""
+    for frame in reversed(traceback):
+        directory, name = os.path.split(frame.filename)
+        if directory == LIGHT_DIR and name not in DATA_MODULES:
+            return PHASE_MODULES.get(name, 'eval')
+
+    return 'other'
+
+
+def live_allocations(operation):
+    """
+    Blocks and bytes allocated by `operation` that are still alive when it
+    returns, by phase
+    """
+    blocks = dict.fromkeys(PHASES, 0)
+    sizes = dict.fromkeys(PHASES, 0)
+    # The snapshots' own memory
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+
+    tracemalloc.start(TRACE_FRAMES)
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        result = operation()
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+    finally:
+        tracemalloc.stop()
+    del result
+
+    for stat in after.compare_to(before, 'traceback'):
+        if stat.count_diff > 0:
+            phase = phase_of(stat.traceback)
+            blocks[phase] += stat.count_diff
+            sizes[phase] += max(stat.size_diff, 0)
+
+    return blocks, sizes
+
+
+def measure(operation, repeat):
+    """Metrics of `operation`, timed by its fastest of `repeat` runs"""
+    # Warms up caches and lets the jit engine compile
+    operation()
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    collections = gc_collections()
+    result = operation()
+    collections = gc_collections() - collections
+    del result
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks
+
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    live_blocks, live_bytes = live_allocations(operation)
+
+    return {
+        'ops_per_sec': 1 / best,
+        'peak_bytes': peak,
+        'live_blocks': live_blocks,
+        'live_bytes': live_bytes,
+        'retained_blocks': blocks,
+        'gc_collections': collections,
+    }
+
+
+def run(names, engine, repeat):
+    results = {}
+    for name in names:
+        phase, setup = WORKLOADS[name]
+        try:
+            metrics = measure(setup(engine), repeat)
+        except (RecursionError, ValueError) as e:
+            print(f"{name:10} {phase:6} failed: {e}", file=sys.stderr)
+            continue
+
+        metrics['phase'] = phase
+        results[name] = metrics
+        live = ', '.join(
+            f"{phase_} {metrics['live_blocks'][phase_]} ({metrics['live_bytes'][phase_] / 1024:.1f} KB)"
+            for phase_ in PHASES if metrics['live_blocks'][phase_])
+        print(f"{name:10} {phase:6} {metrics['ops_per_sec']:10.2f} ops/s "
+              f"{metrics['peak_bytes'] / 1024:10.1f} KB peak "
+              f"{metrics['retained_blocks']:8} blocks retained after {metrics['gc_collections']:6} gc\n"
+              f"{'':17} live blocks on return: {live or 'none'}")
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Prints the changes against `baseline`, returns the number of regressions"""
+    regressions = 0
+    for name, metrics in results.items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+
+        speed = metrics['ops_per_sec'] / old['ops_per_sec'] - 1
+        memory = (metrics['peak_bytes'] - old['peak_bytes']) / max(old['peak_bytes'], 1)
+        flags = []
+        if speed < -threshold:
+            flags.append('SLOWER')
+        if memory > threshold:
+            flags.append('MORE MEMORY')
+
+        changes = f"{name:10} {speed:+8.1%} ops/s {memory:+8.1%} peak"
+        # Older baselines saved the same counts as `allocated_blocks`, or none at all
+        old_blocks = old.get('live_blocks', old.get('allocated_blocks'))
+        if old_blocks is not None:
+            live = sum(metrics['live_blocks'].values())
+            old_live = sum(old_blocks.values())
+            growth = (live - old_live) / max(old_live, 1)
+            if growth > threshold and live - old_live > ALLOCATION_SLACK:
+                flags.append('MORE LIVE BLOCKS')
+            changes += f" {growth:+8.1%} live blocks"
+        regressions += bool(flags)
+
+        print(f"{changes}  {' '.join(flags)}")
+
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Light benchmarks")
+    arg_parser.add_argument('names', nargs='*', metavar='name',
+                            help=f"Benchmarks to run, of {', '.join(WORKLOADS)} (default: all)")
+    arg_parser.add_argument('--engine', choices=ENGINES, default='tree',
+                            help="Engine of the eval benchmarks (default: tree)")
+    arg_parser.add_argument('--repeat', type=int, default=5,
+                            help="Timed runs per benchmark, the fastest counts (default: 5)")
+    arg_parser.add_argument('--save', metavar='FILE', help="Save the results as a JSON baseline")
+    arg_parser.add_argument('--compare', metavar='FILE', help="Compare with a saved baseline")
+    arg_parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                            help=f"Relative change flagged as a regression (default: {THRESHOLD})")
+    args = arg_parser.parse_args()
+    for name in args.names:
+        if name not in WORKLOADS:
+            arg_parser.error(f"Unknown benchmark `{name}`")
+
+    results = run(args.names or list(WORKLOADS), args.engine, args.repeat)
+
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'engine': args.engine,
+                'python': platform.python_version(),
+                'results': results,
+            }, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['engine'] != args.engine:
+            print(f"Baseline was run on the {baseline['engine']} engine", file=sys.stderr)
+
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
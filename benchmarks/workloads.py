@@ -0,0 +1,114 @@
+"""
+Light workloads measured by `run.py`.
+
+Every workload is set up once (sources generated, programs parsed) by a
+function taking the engine to evaluate with, it returns the operation that
+is timed.
+"""
+import os
+import tempfile
+
+from light.cache import load_program
+from light.evaluator import Environment, prepare
+from light.lexer import tokenize_iter
+from light.parser import parse_source
+
+from benchmarks.bench_lexer import generate_source
+
+# Lines of the generated source lexed and parsed
+SOURCE_LINES = 5000
+
+FIB = """
+let fib = func(n){ if n < 2 { return n } return fib(n - 1) + fib(n - 2) }
+fib(18)
+"""
+
+TAIL = """
+let count = func(n, acc){ if n == 0 { return acc } return count(n - 1, acc + 1) }
+count(20000, 0)
+"""
+
+LOOP = """
+let count = func(n){ let acc = 0; while n > 0 { acc = acc + 1; n = n - 1 } return acc }
+count(20000)
+"""
+
+ARRAYS = """
+let xs = range(100000)
+let squares = map(func(x){ return x * x }, range(1000))
+sum(xs * xs + 1) + max(xs - 50000) + sum(squares)
+"""
+
+PERSISTENT = """
+let n = 10000
+let v = reduce(conj, range(n), #[])
+let scatter = func(i){ return i * 7919 - i * 7919 / n * n }
+let w = reduce(func(w, i){ return assoc(w, scatter(i), i) }, range(n), v)
+let m = reduce(func(m, i){ return assoc(m, i, w[i]) }, range(n / 4), #{})
+len(w) + m[n / 4 - 1] + get(m, -1, 0) + v[n - 1]
+"""
+
+CLOSURES = """
+let adder = func(x){ return func(y){ return x + y } }
+let compose = func(f, g){ return func(x){ return f(g(x)) } }
+let loop = func(i, acc){
+    if i == 0 { return acc }
+    let step = compose(adder(i), adder(1))
+    return loop(i - 1, step(acc))
+}
+loop(5000, 0)
+"""
+
+
+def evaluation(source):
+    def setup(engine):
+        # Inference, resolving and compiling happen once, only the run is timed
+        runner = prepare(parse_source(source), engine)
+
+        return lambda: runner(Environment())
+
+    return setup
+
+
+def lex(engine):
+    source = generate_source(SOURCE_LINES)
+
+    return lambda: sum(1 for _ in tokenize_iter(source))
+
+
+def parse(engine):
+    source = generate_source(SOURCE_LINES)
+
+    return lambda: parse_source(source)
+
+
+def cache(engine):
+    """Loads a generated script from a warm cache"""
+    # Removed when garbage collected
+    directory = tempfile.TemporaryDirectory()
+    script = os.path.join(directory.name, 'script.lt')
+    with open(script, 'w') as f:
+        f.write(generate_source(SOURCE_LINES))
+    load_program(script)
+
+    def operation():
+        return load_program(script)
+
+    # Keeps the directory as long as the operation
+    operation.directory = directory
+
+    return operation
+
+
+# name -> (phase, setup)
+WORKLOADS = {
+    'lex': ('lex', lex),
+    'parse': ('parse', parse),
+    'cache': ('load', cache),
+    'fib': ('eval', evaluation(FIB)),
+    'tail': ('eval', evaluation(TAIL)),
+    'loop': ('eval', evaluation(LOOP)),
+    'closures': ('eval', evaluation(CLOSURES)),
+    'arrays': ('eval', evaluation(ARRAYS)),
+    'persistent': ('eval', evaluation(PERSISTENT)),
+}
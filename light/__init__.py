@@ -0,0 +1,11 @@
+from .embedding import PROGRAM_CACHE, CompiledProgram, ProgramCache, compile
+from .evaluator import ENGINES, Environment
+
+__all__ = [
+    'compile',
+    'CompiledProgram',
+    'ProgramCache',
+    'PROGRAM_CACHE',
+    'Environment',
+    'ENGINES',
+]
@@ -0,0 +1,223 @@
+"""
+Flat encoding of an AST in parallel arrays.
+
+Nodes are stored in preorder. Node `i` has its kind in `kinds[i]`, the
+number of nodes in its subtree in `sizes[i]`, and in `data[i]` either the
+index of its literal in `literals` (identifiers and literals) or the token
+kind of its operator. The first child of `i` is `i + 1` and every next
+sibling follows the subtree of the previous one, so no pointers are stored.
+
+An arena takes a few bytes per node instead of a Python object each, and
+scanning it for a kind of node runs over a byte string.
+"""
+from array import array
+
+from . import ast
+from . import tokens
+
+PROGRAM = 0
+BLOCK = 1
+ASSIGNMENT = 2
+RETURN = 3
+CONDITIONAL = 4
+IDENTIFIER = 5
+FUNCTION_LITERAL = 6
+FUNCTION_CALL = 7
+INT_LITERAL = 8
+BOOL_LITERAL = 9
+BINARY_OP = 10
+PREFIX_OP = 11
+WHILE = 12
+REASSIGNMENT = 13
+ARRAY_LITERAL = 14
+INDEX = 15
+VECTOR_LITERAL = 16
+MAP_LITERAL = 17
+
+KINDS = {
+    ast.Program: PROGRAM,
+    ast.Block: BLOCK,
+    ast.Assignment: ASSIGNMENT,
+    ast.Return: RETURN,
+    ast.Conditional: CONDITIONAL,
+    ast.Identifier: IDENTIFIER,
+    ast.FunctionLiteral: FUNCTION_LITERAL,
+    ast.FunctionCall: FUNCTION_CALL,
+    ast.IntLiteral: INT_LITERAL,
+    ast.BoolLiteral: BOOL_LITERAL,
+    ast.BinaryOp: BINARY_OP,
+    ast.PrefixOp: PREFIX_OP,
+    ast.While: WHILE,
+    ast.Reassignment: REASSIGNMENT,
+    ast.ArrayLiteral: ARRAY_LITERAL,
+    ast.Index: INDEX,
+    ast.VectorLiteral: VECTOR_LITERAL,
+    ast.MapLiteral: MAP_LITERAL,
+}
+
+# Kinds whose data is an index into `literals`
+LITERAL_KINDS = (IDENTIFIER, INT_LITERAL, BOOL_LITERAL)
+
+
+class Arena:
+    def __init__(self):
+        self.kinds = array('B')
+        self.sizes = array('I')
+        self.data = array('I')
+        self.literals = []
+        self._literal_ids = {}
+
+    @classmethod
+    def from_program(cls, program):
+        arena = cls()
+        kinds = arena.kinds
+        data = arena.data
+        nchildren = []
+
+        stack = [program]
+        while stack:
+            node = stack.pop()
+            kind = KINDS[type(node)]
+            kinds.append(kind)
+            if kind == IDENTIFIER:
+                data.append(arena.intern(node.ident.literal))
+            elif kind in LITERAL_KINDS:
+                data.append(arena.intern(node.token.literal))
+            elif kind == BINARY_OP or kind == PREFIX_OP:
+                data.append(node.op.kind)
+            else:
+                data.append(0)
+
+            children = ast.children(node)
+            nchildren.append(len(children))
+            stack.extend(reversed(children))
+
+        # Children come after their parent, so sizes are summed up backwards
+        sizes = [1] * len(kinds)
+        for i in range(len(kinds) - 1, -1, -1):
+            child = i + 1
+            for _ in range(nchildren[i]):
+                sizes[i] += sizes[child]
+                child += sizes[child]
+        arena.sizes = array('I', sizes)
+
+        return arena
+
+    def __getstate__(self):
+        return (self.kinds, self.sizes, self.data, self.literals)
+
+    def __setstate__(self, state):
+        self.kinds, self.sizes, self.data, self.literals = state
+        self._literal_ids = {literal: i for i, literal in enumerate(self.literals)}
+
+    def intern(self, literal):
+        try:
+            return self._literal_ids[literal]
+        except KeyError:
+            self._literal_ids[literal] = len(self.literals)
+            self.literals.append(literal)
+
+            return len(self.literals) - 1
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.kinds, self.sizes, self.data))
+
+    def children(self, i):
+        """Indices of the children of node `i`"""
+        children = []
+        child = i + 1
+        end = i + self.sizes[i]
+        while child < end:
+            children.append(child)
+            child += self.sizes[child]
+
+        return children
+
+    def walk(self, i=0):
+        """Indices of node `i` and all nodes below it, in preorder"""
+        return range(i, i + self.sizes[i])
+
+    def literal(self, i):
+        return self.literals[self.data[i]]
+
+    def find(self, kind, i=0):
+        """Indices of the nodes of `kind` below node `i`"""
+        kinds = self.kinds.tobytes()
+        end = i + self.sizes[i]
+        found = []
+        i = kinds.find(kind, i, end)
+        while i != -1:
+            found.append(i)
+            i = kinds.find(kind, i + 1, end)
+
+        return found
+
+    def count(self, kind):
+        return self.kinds.count(kind)
+
+    def to_program(self):
+        """Decodes the arena back into `ast` nodes"""
+        kinds = self.kinds
+        data = self.data
+        # One token per literal, nodes with the same name share it
+        idents = [tokens.Token(tokens.IDENT, literal) for literal in self.literals]
+        ints = [tokens.Token(tokens.INT, literal) for literal in self.literals]
+
+        # Children have higher indices than their parent, build bottom up
+        nodes = [None] * len(kinds)
+        for i in range(len(kinds) - 1, -1, -1):
+            kind = kinds[i]
+            if kind == IDENTIFIER:
+                nodes[i] = ast.Identifier(idents[data[i]])
+                continue
+            if kind == INT_LITERAL:
+                nodes[i] = ast.IntLiteral(ints[data[i]])
+                continue
+
+            indices = self.children(i)
+            children = [nodes[child] for child in indices]
+            if kind == BINARY_OP:
+                node = ast.BinaryOp(tokens.FIXED_TOKENS[data[i]], children[0], children[1])
+            elif kind == FUNCTION_CALL:
+                node = ast.FunctionCall(children[0], children[1:])
+            elif kind == BLOCK:
+                node = ast.Block(children)
+            elif kind == RETURN:
+                node = ast.Return(children[0])
+            elif kind == CONDITIONAL:
+                node = ast.Conditional(*children)
+            elif kind == ASSIGNMENT:
+                node = ast.Assignment(children[0], children[1])
+            elif kind == WHILE:
+                node = ast.While(children[0], children[1])
+            elif kind == REASSIGNMENT:
+                node = ast.Reassignment(children[0], children[1])
+            elif kind == ARRAY_LITERAL:
+                node = ast.ArrayLiteral(children)
+            elif kind == VECTOR_LITERAL:
+                node = ast.VectorLiteral(children)
+            elif kind == MAP_LITERAL:
+                node = ast.MapLiteral(children)
+            elif kind == INDEX:
+                node = ast.Index(children[0], children[1])
+            elif kind == FUNCTION_LITERAL:
+                node = ast.FunctionLiteral(children[:-1], children[-1])
+            elif kind == BOOL_LITERAL:
+                literal = self.literals[data[i]]
+                node = ast.BoolLiteral(tokens.FIXED_TOKENS[
+                    tokens.TRUE if literal == 'true' else tokens.FALSE])
+            elif kind == PREFIX_OP:
+                node = ast.PrefixOp(tokens.FIXED_TOKENS[data[i]], children[0])
+            else:
+                node = ast.Program(children)
+            nodes[i] = node
+
+            # Free the children, only the root stays referenced
+            for child in indices:
+                nodes[child] = None
+
+        return nodes[0]
@@ -0,0 +1,311 @@
+"""
+Arrays and their elementwise operators.
+
+An `objects.Array` keeps its elements in `values`. When NumPy is installed
+and the elements are all integers, or all booleans, that is a NumPy array
+of int64 or bool and operators run vectorized in C. Integers that don't fit
+in an int64, and arithmetic whose result might not, are computed on exact
+Python ints instead. Other arrays, and every array without NumPy, hold a
+list of Light values and operators loop over them in Python.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import persistent
+from . import tokens
+from .objects import FALSE, TRUE, Array, Integer, Map, Vector, box, to_object
+
+# Elements of int64 arrays are within +-INT64_MAX, so negating one can't overflow
+INT64_MAX = 2 ** 63 - 1
+
+# Dividends below it are exact as floats, so `int(left / right)` truncates exactly
+FLOAT_EXACT = 2 ** 53
+
+INT_TYPES = (int, Integer)
+
+# Semantics of the binary operators on scalars
+SCALAR_OPS = {
+    tokens.PLUS: lambda left, right: Integer(left + right),
+    tokens.MINUS: lambda left, right: Integer(left - right),
+    tokens.ASTERISK: lambda left, right: Integer(left * right),
+    tokens.SLASH: lambda left, right: Integer(int(left / right)),
+    tokens.EQ: lambda left, right: TRUE if left == right else FALSE,
+    tokens.NEQ: lambda left, right: TRUE if left != right else FALSE,
+    tokens.GT: lambda left, right: TRUE if left > right else FALSE,
+    tokens.LT: lambda left, right: TRUE if left < right else FALSE,
+    tokens.GTE: lambda left, right: TRUE if left >= right else FALSE,
+    tokens.LTE: lambda left, right: TRUE if left <= right else FALSE,
+}
+
+SYMBOLS = {
+    tokens.PLUS: '+',
+    tokens.MINUS: '-',
+    tokens.ASTERISK: '*',
+    tokens.EQ: '==',
+    tokens.NEQ: '!=',
+    tokens.GT: '>',
+    tokens.LT: '<',
+    tokens.GTE: '>=',
+    tokens.LTE: '<=',
+}
+
+OPERATOR_TEMPLATE = """
+def apply(left, right):
+{check}    try:
+        return {scalar}
+    except TypeError:
+        return binary_op(kind, left, right)
+"""
+
+if numpy is not None:
+    VECTOR_OPS = {
+        tokens.PLUS: numpy.add,
+        tokens.MINUS: numpy.subtract,
+        tokens.ASTERISK: numpy.multiply,
+        tokens.EQ: numpy.equal,
+        tokens.NEQ: numpy.not_equal,
+        tokens.GT: numpy.greater,
+        tokens.LT: numpy.less,
+        tokens.GTE: numpy.greater_equal,
+        tokens.LTE: numpy.less_equal,
+    }
+
+
+def make(values):
+    """Array of the Light values `values`, vectorized if their types allow it"""
+    if numpy is not None and values:
+        if all(type(value) in INT_TYPES for value in values):
+            if -INT64_MAX <= min(values) and max(values) <= INT64_MAX:
+                return Array(numpy.array(values, dtype=numpy.int64))
+        elif all(value is TRUE or value is FALSE for value in values):
+            return Array(numpy.array([value is TRUE for value in values], dtype=bool))
+
+    return Array([box(value) for value in values])
+
+
+def arange(start, stop):
+    """Array of the integers from `start` up to `stop - 1`"""
+    integers = range(start, stop)
+    if numpy is not None and integers and -INT64_MAX <= start and stop <= INT64_MAX:
+        return Array(numpy.arange(start, stop, dtype=numpy.int64))
+
+    return Array(list(map(Integer, integers)))
+
+
+def vector(value):
+    """`value` as an int64 or bool NumPy array, None if it's kept in a list"""
+    values = value.values
+
+    return None if type(values) is list else values
+
+
+def bound(operand):
+    """Largest absolute value of an int operand of `vectorized`"""
+    if type(operand) is int:
+        return abs(operand)
+
+    return max(int(operand.max()), -int(operand.min()))
+
+
+def vectorized(kind, left, right):
+    """
+    `left op right` with NumPy, where an operand is a NumPy array and the
+    other one an int or a NumPy array of the same length. None if the result
+    could overflow or the operand types need the scalar semantics.
+    """
+    operands = []
+    bools = 0
+    for value in (left, right):
+        if type(value) is Array:
+            operand = vector(value)
+            if operand is None:
+                return None
+            bools += operand.dtype == bool
+        elif type(value) in INT_TYPES:
+            operand = int(value)
+        elif value is TRUE or value is FALSE:
+            operand = numpy.bool_(value is TRUE)
+            bools += 1
+        else:
+            return None
+        operands.append(operand)
+    left, right = operands
+
+    if bools:
+        # Booleans only compare equal to booleans, and have no arithmetic or order
+        if bools != 2 or kind not in (tokens.EQ, tokens.NEQ):
+            return None
+        return VECTOR_OPS[kind](left, right)
+
+    if kind == tokens.PLUS or kind == tokens.MINUS:
+        if bound(left) + bound(right) > INT64_MAX:
+            return None
+    elif kind == tokens.ASTERISK:
+        if bound(left) * bound(right) > INT64_MAX:
+            return None
+    elif kind == tokens.SLASH:
+        if bound(left) >= FLOAT_EXACT or bound(right) > INT64_MAX:
+            return None
+    elif max(bound(left), bound(right)) > INT64_MAX:
+        return None
+
+    if kind == tokens.SLASH:
+        if numpy.any(right == 0):
+            raise ZeroDivisionError("division by zero")
+        # Truncated towards zero, like `int(left / right)`
+        quotient = numpy.abs(left) // numpy.abs(right)
+        return numpy.where((left < 0) != (right < 0), -quotient, quotient)
+
+    return VECTOR_OPS[kind](left, right)
+
+
+def binary_op(kind, left, right):
+    """`left op right` on Light values, elementwise if either one is an array"""
+    left_array = type(left) is Array
+    right_array = type(right) is Array
+    if not (left_array or right_array):
+        return SCALAR_OPS[kind](left, right)
+
+    if left_array and right_array and len(left.values) != len(right.values):
+        raise ValueError(
+            f"Arrays of lengths {len(left.values)} and {len(right.values)} can't be combined")
+
+    if numpy is not None:
+        result = vectorized(kind, left, right)
+        if result is not None:
+            return Array(result)
+
+    if left_array and right_array:
+        pairs = zip(left.elements(), right.elements())
+    elif left_array:
+        pairs = ((value, right) for value in left.elements())
+    else:
+        pairs = ((left, value) for value in right.elements())
+
+    return make([binary_op(kind, l, r) for l, r in pairs])
+
+
+def operator(kind, boxed):
+    """
+    `left op right` as a single function, computed by the Python operator
+    and only going through `binary_op` when an operand is an array. Arrays
+    make the operators raise a TypeError, except `==` and `!=` which test
+    for them. Arithmetic results are Integers if `boxed`, ints otherwise.
+    """
+    if kind == tokens.SLASH:
+        scalar = "int(left / right)"
+    else:
+        scalar = f"left {SYMBOLS[kind]} right"
+    if kind in (tokens.PLUS, tokens.MINUS, tokens.ASTERISK, tokens.SLASH):
+        if boxed:
+            scalar = f"Integer({scalar})"
+    else:
+        scalar = f"TRUE if {scalar} else FALSE"
+
+    check = ""
+    if kind == tokens.EQ or kind == tokens.NEQ:
+        check = (
+            "    if type(left) is Array or type(right) is Array:\n"
+            "        return binary_op(kind, left, right)\n")
+
+    namespace = {
+        'kind': kind,
+        'binary_op': binary_op,
+        'Array': Array,
+        'Integer': Integer,
+        'TRUE': TRUE,
+        'FALSE': FALSE,
+    }
+    exec(OPERATOR_TEMPLATE.format(check=check, scalar=scalar), namespace)
+
+    return namespace['apply']
+
+
+def operators(boxed):
+    """An `operator` for every binary operator, by token kind"""
+    return {kind: operator(kind, boxed) for kind in SCALAR_OPS}
+
+
+def negate(value):
+    if type(value) is not Array:
+        return Integer(-value)
+
+    values = vector(value)
+    if values is not None and values.dtype != bool:
+        return Array(-values)
+
+    return make([negate(element) for element in value.elements()])
+
+
+def index(array, i):
+    """The element `i` of `array`, or the value of the key `i` of a map"""
+    if type(array) is Vector or type(array) is Map:
+        return persistent.get(array, i)
+    if type(array) is not Array:
+        raise ValueError(f"Object {array} can't be indexed")
+    if type(i) not in INT_TYPES:
+        raise ValueError(f"Index {i} is not an integer")
+
+    values = array.values
+    if not 0 <= i < len(values):
+        raise ValueError(f"Index {i} is out of range of an array of length {len(values)}")
+
+    if type(values) is list:
+        return values[i]
+
+    return to_object(values.item(i))
+
+
+def int_vector(array):
+    """The int64 NumPy array of `array`, None if it has none"""
+    values = vector(array)
+    if values is None or values.dtype == bool:
+        return None
+
+    return values
+
+
+def total(array):
+    values = int_vector(array)
+    if values is not None and len(values) * bound(values) <= INT64_MAX:
+        return Integer(int(values.sum()))
+
+    return Integer(sum(array.elements()))
+
+
+def minimum(array):
+    values = int_vector(array)
+    if values is not None:
+        return Integer(int(values.min()))
+    if not array.values:
+        raise ValueError("`min` of an empty array")
+
+    return min(array.elements())
+
+
+def maximum(array):
+    values = int_vector(array)
+    if values is not None:
+        return Integer(int(values.max()))
+    if not array.values:
+        raise ValueError("`max` of an empty array")
+
+    return max(array.elements())
+
+
+def any_true(array):
+    values = vector(array)
+    if values is not None:
+        return TRUE if values.dtype == bool and values.any() else FALSE
+
+    return TRUE if any(value is TRUE for value in array.values) else FALSE
+
+
+def all_true(array):
+    values = vector(array)
+    if values is not None:
+        return TRUE if values.dtype == bool and values.all() else FALSE
+
+    return TRUE if all(value is TRUE for value in array.values) else FALSE
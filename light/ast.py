@@ -1,13 +1,19 @@
 
+# Every node class declares __slots__, programs can have millions of nodes
+# that live as long as the program runs
+
 class Statement:
-    pass
+    __slots__ = ()
 
 
 class Expression:
-    pass
+    # `type` is INT or BOOL when proven by `inference.py`
+    __slots__ = ('type',)
 
 
 class Program():
+    __slots__ = ('statements',)
+
     def __init__(self, statements):
         self.statements = statements
     
@@ -16,11 +22,20 @@ class Program():
 
 
 class Block(Statement):
+    __slots__ = ('statements', 'frame_size', 'escapes')
+
     def __init__(self, statements):
         self.statements = statements
+        # Number of local slots, set by the resolver on function bodies
+        self.frame_size = None
+        # Whether inner functions can keep the frame alive after the call,
+        # set by the resolver on function bodies
+        self.escapes = None
 
 
 class Assignment(Statement):
+    __slots__ = ('ident', 'expr')
+
     def __init__(self, ident, expr):
         self.ident = ident
         self.expr = expr
@@ -29,7 +44,21 @@ class Assignment(Statement):
         return f"Assignment({repr(self.ident)}, {repr(self.expr)})"
 
 
+class Reassignment(Statement):
+    """`name = expr`, rebinds the nearest existing binding of `name`"""
+    __slots__ = ('ident', 'expr')
+
+    def __init__(self, ident, expr):
+        self.ident = ident
+        self.expr = expr
+
+    def __repr__(self):
+        return f"Reassignment({repr(self.ident)}, {repr(self.expr)})"
+
+
 class Return(Statement):
+    __slots__ = ('expr',)
+
     def __init__(self, expr):
         self.expr = expr
 
@@ -38,69 +67,120 @@ class Return(Statement):
 
 
 class Conditional(Statement):
+    __slots__ = ('cond', 'cons', 'alt')
+
     def __init__(self, cond, cons, alt=None):
         self.cond = cond
         self.cons = cons
         self.alt = alt
 
 
+class While(Statement):
+    __slots__ = ('cond', 'body')
+
+    def __init__(self, cond, body):
+        self.cond = cond
+        self.body = body
+
+
 class Identifier(Expression):
+    __slots__ = ('ident', 'address')
+
     def __init__(self, ident):
         self.ident = ident
-        self.literal = ident.literal
+        self.type = None
+        # (depth, slot, fallback) of a local variable, set by the resolver.
+        # Stays None for globals
+        self.address = None
+
+    @property
+    def literal(self):
+        return self.ident.literal
 
     def __repr__(self):
         return f"Identifier({self.literal})"
 
 class FunctionLiteral(Expression):
+    __slots__ = ('params', 'body', 'name', 'needs_closure')
+
     def __init__(self, params, body, name=None):
+        self.type = None
         self.params = params
         self.body = body
         self.name = name
+        # Whether the body reads locals of enclosing functions, set by the resolver
+        self.needs_closure = None
 
     def __repr__(self):
         return f"FunctionLiteral({repr(self.name)}, {repr(self.params)})"
 
 
 class FunctionCall(Expression):
+    __slots__ = ('ident', 'args')
+
     def __init__(self, ident, args):
+        self.type = None
         self.ident = ident
-        self.name = self.ident.literal
         self.args = args
 
+    @property
+    def name(self):
+        return self.ident.ident.literal
+
     def __repr__(self):
         return f"FunctionCall({repr(self.name)}, {repr(self.args)})"
 
 
 class IntLiteral(Expression):
+    __slots__ = ('token',)
+
     def __init__(self, token):
         self.token = token
-        self.literal = self.token.literal
+        self.type = None
+
+    @property
+    def literal(self):
+        return self.token.literal
 
     def __repr__(self):
         return f"IntLiteral({repr(self.literal)})"
 
 
 class BoolLiteral(Expression):
+    __slots__ = ('token',)
+
     def __init__(self, token):
         self.token = token
-        self.literal = self.token.literal
+        self.type = None
+
+    @property
+    def literal(self):
+        return self.token.literal
 
     def __repr__(self):
         return f"BoolLiteral({repr(self.literal)})"
 
 
 class StringLiteral(Expression):
-    def __init__(self, literal):
+    __slots__ = ('token',)
+
+    def __init__(self, token):
         self.token = token
-        self.literal = self.token.literal
+        self.type = None
+
+    @property
+    def literal(self):
+        return self.token.literal
 
     def __repr__(self):
         return f"StringLiteral({repr(self.literal)})"
 
 
 class BinaryOp(Expression):
+    __slots__ = ('op', 'left', 'right')
+
     def __init__(self, op, left, right):
+        self.type = None
         self.left = left
         self.right = right
         self.op = op
@@ -110,6 +190,97 @@ class BinaryOp(Expression):
 
 
 class PrefixOp(Expression):
+    __slots__ = ('op', 'right')
+
     def __init__(self, op, right):
+        self.type = None
         self.op = op
         self.right = right
+
+
+class ArrayLiteral(Expression):
+    __slots__ = ('elements',)
+
+    def __init__(self, elements):
+        self.type = None
+        self.elements = elements
+
+    def __repr__(self):
+        return f"ArrayLiteral({repr(self.elements)})"
+
+
+class VectorLiteral(Expression):
+    """`#[a, b]`"""
+    __slots__ = ('elements',)
+
+    def __init__(self, elements):
+        self.type = None
+        self.elements = elements
+
+    def __repr__(self):
+        return f"VectorLiteral({repr(self.elements)})"
+
+
+class MapLiteral(Expression):
+    """`#{key: value}`, `elements` holds the keys and values alternating"""
+    __slots__ = ('elements',)
+
+    def __init__(self, elements):
+        self.type = None
+        self.elements = elements
+
+    def __repr__(self):
+        return f"MapLiteral({repr(self.elements)})"
+
+
+# Nodes whose children are their `elements`
+COLLECTION_LITERALS = (ArrayLiteral, VectorLiteral, MapLiteral)
+
+
+class Index(Expression):
+    """`left[index]`"""
+    __slots__ = ('left', 'index')
+
+    def __init__(self, left, index):
+        self.type = None
+        self.left = left
+        self.index = index
+
+    def __repr__(self):
+        return f"Index({repr(self.left)}, {repr(self.index)})"
+
+
+def children(node):
+    if isinstance(node, (Program, Block)):
+        return list(node.statements)
+    if isinstance(node, (Assignment, Reassignment)):
+        return [node.ident, node.expr]
+    if isinstance(node, Return):
+        return [node.expr]
+    if isinstance(node, Conditional):
+        return [node.cond, node.cons] + ([node.alt] if node.alt is not None else [])
+    if isinstance(node, While):
+        return [node.cond, node.body]
+    if isinstance(node, BinaryOp):
+        return [node.left, node.right]
+    if isinstance(node, PrefixOp):
+        return [node.right]
+    if isinstance(node, FunctionCall):
+        return [node.ident] + list(node.args)
+    if isinstance(node, FunctionLiteral):
+        return list(node.params) + [node.body]
+    if isinstance(node, COLLECTION_LITERALS):
+        return list(node.elements)
+    if isinstance(node, Index):
+        return [node.left, node.index]
+
+    return []
+
+
+def walk(node):
+    """Yields `node` and all nodes below it"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(children(node)))
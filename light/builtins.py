@@ -0,0 +1,130 @@
+"""
+Functions implemented in Python, bound in every global `Environment`.
+
+Engines call a builtin straight away with the evaluated arguments, no frame
+is created and no body walked. Its first argument is `call(func, values)`
+of the engine running the program, through which `map` and `reduce` apply
+Light functions without going back through the AST of the call. The
+reductions run vectorized on arrays backed by NumPy, see `arrays.py`.
+`get`, `assoc` and `conj` work on the persistent vectors and maps of
+`persistent.py`, and return updated copies sharing most of their trie.
+"""
+from . import arrays
+from . import objects
+from . import persistent
+
+# Name -> objects.Builtin
+BUILTINS = {}
+
+# Marks the end of the elements in `reduce`, None is itself a Light value
+_MISSING = object()
+
+
+def builtin(name, arity=None, pure=True):
+    def register(func):
+        BUILTINS[name] = objects.Builtin(name, func, arity, pure)
+        return func
+
+    return register
+
+
+def check_array(value, name):
+    if type(value) is not objects.Array:
+        raise ValueError(f"`{name}` expects an array, got {value}")
+
+    return value
+
+
+@builtin('len', (1,))
+def len_(call, value):
+    if type(value) is objects.Vector or type(value) is objects.Map:
+        return objects.Integer(value.count)
+
+    return objects.Integer(len(check_array(value, 'len').values))
+
+
+@builtin('range', (1, 2))
+def range_(call, start, stop=None):
+    """`range(n)` is `[0, ..., n - 1]`, `range(m, n)` is `[m, ..., n - 1]`"""
+    if stop is None:
+        start, stop = 0, start
+
+    return arrays.arange(start, stop)
+
+
+@builtin('sum', (1,))
+def sum_(call, array):
+    return arrays.total(check_array(array, 'sum'))
+
+
+@builtin('min', (1,))
+def min_(call, array):
+    return arrays.minimum(check_array(array, 'min'))
+
+
+@builtin('max', (1,))
+def max_(call, array):
+    return arrays.maximum(check_array(array, 'max'))
+
+
+@builtin('any', (1,))
+def any_(call, array):
+    return arrays.any_true(check_array(array, 'any'))
+
+
+@builtin('all', (1,))
+def all_(call, array):
+    return arrays.all_true(check_array(array, 'all'))
+
+
+@builtin('get', (2, 3))
+def get(call, coll, key, *default):
+    """`coll[key]`, or `default` when `coll` has no such index or key"""
+    if not default:
+        return persistent.get(persistent.check_collection(coll, 'get'), key)
+
+    value = persistent.lookup(persistent.check_collection(coll, 'get'), key)
+
+    return default[0] if value is persistent.MISSING else value
+
+
+@builtin('assoc', (3,))
+def assoc(call, coll, key, value):
+    """`coll` with `key` bound to `value`, an index of a vector up to its length"""
+    return persistent.assoc(persistent.check_collection(coll, 'assoc'), key, value)
+
+
+@builtin('conj', (2,))
+def conj(call, coll, value):
+    """`coll` with `value` appended, or for a map the key and value of `#[key, value]` added"""
+    return persistent.conj(persistent.check_collection(coll, 'conj'), value)
+
+
+# Pure only if the function passed in is, which isn't known statically
+@builtin('map', (2,), pure=False)
+def map_(call, func, array):
+    box = objects.box
+
+    return arrays.make([box(call(func, [value])) for value in check_array(array, 'map').elements()])
+
+
+@builtin('reduce', (2, 3), pure=False)
+def reduce_(call, func, array, *initial):
+    """Folds `array` from the left, starting from `initial` or the first element"""
+    values = iter(check_array(array, 'reduce').elements())
+    if initial:
+        acc = initial[0]
+    else:
+        acc = next(values, _MISSING)
+        if acc is _MISSING:
+            raise ValueError("`reduce` of an empty array with no initial value")
+
+    for value in values:
+        acc = call(func, [acc, value])
+
+    return objects.box(acc)
+
+
+@builtin('print', pure=False)
+def print_(call, *values):
+    print(*values)
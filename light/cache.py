@@ -0,0 +1,86 @@
+"""
+On-disk cache of parsed programs, the `.pyc` of Light.
+
+`eval_file` stores the parsed `ast.Program` of a script, encoded as an
+`arena.Arena`, in a `__lightcache__` directory next to it. An entry is only
+used when both the source hash and `CACHE_VERSION` match, otherwise the
+script is parsed again and the entry rewritten.
+"""
+import hashlib
+import os
+import pickle
+import sys
+
+from .arena import Arena
+from .parser import parse_source
+
+# Bump whenever the AST or token classes change shape
+CACHE_VERSION = 7
+CACHE_DIR = '__lightcache__'
+MAGIC = b'LPC\0'
+
+_HEADER_SIZE = len(MAGIC) + 4 + 32
+
+
+def cache_path(file_):
+    directory, name = os.path.split(os.path.abspath(file_))
+    tag = f"py{sys.version_info[0]}{sys.version_info[1]}"
+
+    return os.path.join(directory, CACHE_DIR, f"{name}.{tag}.lpc")
+
+
+def header(source):
+    digest = hashlib.sha256(source.encode('utf-8')).digest()
+
+    return MAGIC + CACHE_VERSION.to_bytes(4, 'little') + digest
+
+
+def read_cache(path, source):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if data[:_HEADER_SIZE] != header(source):
+        return None
+
+    try:
+        return pickle.loads(data[_HEADER_SIZE:]).to_program()
+    except Exception:
+        # Corrupt or incompatible entry, it gets rewritten
+        return None
+
+
+def write_cache(path, source, program):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            f.write(header(source))
+            pickle.dump(Arena.from_program(program), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except Exception:
+        # Caching is best effort: the directory may be read only, or the
+        # tree too deep to encode, the program then just runs uncached
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def load_program(file_, use_cache=True):
+    """Parses `file_`, going through the on-disk cache if `use_cache`"""
+    with open(file_) as f:
+        source = f.read()
+
+    if not use_cache:
+        return parse_source(source)
+
+    path = cache_path(file_)
+    program = read_cache(path, source)
+    if program is None:
+        program = parse_source(source)
+        write_cache(path, source, program)
+
+    return program
@@ -0,0 +1,435 @@
+from . import arrays
+from . import ast
+from . import objects
+from . import tokens
+from .compiler import literal_value
+from .evaluator import BINARY_FUNCS, BUILDERS, Environment
+
+class ClosureCompilerError(Exception):
+    pass
+
+
+def can_return(ast_node):
+    """Whether executing the statement can produce an `objects.Returned`"""
+    if isinstance(ast_node, ast.Return):
+        return True
+    if isinstance(ast_node, ast.Block):
+        return any(can_return(stmt) for stmt in ast_node.statements)
+    if isinstance(ast_node, ast.Conditional):
+        return can_return(ast_node.cons) or (
+            ast_node.alt is not None and can_return(ast_node.alt))
+    if isinstance(ast_node, ast.While):
+        return can_return(ast_node.body)
+
+    return False
+
+
+class ClosureCompiler:
+    """
+    Turns the AST into a tree of Python closures, each taking an `Environment`.
+
+    The dispatch on node and operator types happens once here, running the
+    program is then just calling the closures. A `return f(...)` gives back
+    an `objects.TailCall` that the caller's `run_tail_calls` makes in a loop,
+    so tail recursion runs in constant Python stack.
+    """
+
+    def compile(self, ast_node):
+        if isinstance(ast_node, ast.Assignment):
+            return self.compile_assignment(ast_node)
+        if isinstance(ast_node, ast.Return):
+            return self.compile_return(ast_node)
+        if isinstance(ast_node, ast.Conditional):
+            return self.compile_conditional(ast_node)
+        if isinstance(ast_node, ast.While):
+            return self.compile_while(ast_node)
+        if isinstance(ast_node, ast.Reassignment):
+            return self.compile_reassignment(ast_node)
+        if isinstance(ast_node, ast.Block):
+            return self.compile_statements(ast_node.statements)
+        if isinstance(ast_node, ast.Expression):
+            return self.compile_expression(ast_node)
+        else:
+            raise ClosureCompilerError(f"Cannot compile {ast_node}")
+
+    def compile_statements(self, statements):
+        if not statements:
+            return lambda env: None
+        if len(statements) == 1:
+            return self.compile(statements[0])
+
+        thunks = [(self.compile(stmt), can_return(stmt)) for stmt in statements]
+        *init, (last, _) = thunks
+        Returned = objects.Returned
+        TailCall = objects.TailCall
+
+        def block(env):
+            for thunk, returns in init:
+                if returns:
+                    value = thunk(env)
+                    if type(value) is Returned or type(value) is TailCall:
+                        return value
+                else:
+                    thunk(env)
+
+            return last(env)
+
+        return block
+
+    def compile_assignment(self, ast_node):
+        ident = ast_node.ident
+        expr = self.compile(ast_node.expr)
+
+        def assignment(env):
+            env.set(ident, expr(env))
+
+        return assignment
+
+    def compile_reassignment(self, ast_node):
+        ident = ast_node.ident
+        expr = self.compile(ast_node.expr)
+
+        def reassignment(env):
+            env.assign(ident, expr(env))
+
+        return reassignment
+
+    def compile_return(self, ast_node):
+        Returned = objects.Returned
+        if isinstance(ast_node.expr, ast.FunctionCall):
+            return self.compile_tail_call(ast_node.expr)
+
+        expr = self.compile(ast_node.expr)
+
+        return lambda env: Returned(expr(env))
+
+    def compile_tail_call(self, ast_node):
+        """`return f(...)`, whose call is left to the trampoline in `run_tail_calls`"""
+        callee = self.compile_expression(ast_node.ident)
+        args = [self.compile_expression(arg) for arg in ast_node.args]
+        nargs = len(args)
+        Function = objects.Function
+        Builtin = objects.Builtin
+        Returned = objects.Returned
+        TailCall = objects.TailCall
+        call = self.call
+
+        def tail_call(env):
+            func = callee(env)
+            if type(func) is not Function:
+                if type(func) is Builtin:
+                    return Returned(func.invoke(call, [arg(env) for arg in args]))
+                raise ValueError(f"Object {func} is not callable")
+            if len(func.params) != nargs:
+                raise ValueError(
+                    f"Number of arguments passed {nargs} != number of parameters {len(func.params)}")
+
+            return TailCall(func, [arg(env) for arg in args])
+
+        return tail_call
+
+    def compile_conditional(self, ast_node):
+        cond = self.compile(ast_node.cond)
+        cons = self.compile(ast_node.cons)
+        TRUE = objects.TRUE
+        if ast_node.alt is None:
+            return lambda env: cons(env) if cond(env) is TRUE else None
+
+        alt = self.compile(ast_node.alt)
+
+        return lambda env: cons(env) if cond(env) is TRUE else alt(env)
+
+    def compile_while(self, ast_node):
+        cond = self.compile(ast_node.cond)
+        body = self.compile(ast_node.body)
+        TRUE = objects.TRUE
+        Returned = objects.Returned
+        TailCall = objects.TailCall
+
+        if can_return(ast_node.body):
+            def loop(env):
+                while cond(env) is TRUE:
+                    value = body(env)
+                    if type(value) is Returned or type(value) is TailCall:
+                        return value
+        else:
+            def loop(env):
+                while cond(env) is TRUE:
+                    body(env)
+
+        return loop
+
+    def compile_expression(self, ast_node):
+        if isinstance(ast_node, ast.Identifier):
+            ident = ast_node.ident
+            return lambda env: env.get(ident)
+        if isinstance(ast_node, (ast.IntLiteral, ast.BoolLiteral, ast.StringLiteral)):
+            value = literal_value(ast_node)
+            return lambda env: value
+
+        if isinstance(ast_node, ast.BinaryOp):
+            return self.compile_binary_op(ast_node)
+        if isinstance(ast_node, ast.PrefixOp):
+            return self.compile_prefix_op(ast_node)
+
+        if isinstance(ast_node, ast.FunctionLiteral):
+            return self.compile_func_literal(ast_node)
+        if isinstance(ast_node, ast.FunctionCall):
+            return self.compile_func_call(ast_node)
+        if isinstance(ast_node, ast.COLLECTION_LITERALS):
+            return self.compile_collection_literal(ast_node)
+        if isinstance(ast_node, ast.Index):
+            return self.compile_index(ast_node)
+        else:
+            raise ClosureCompilerError(
+                f"Expression of type {ast_node} cannot be compiled")
+
+    def compile_prefix_op(self, ast_node):
+        right = self.compile_expression(ast_node.right)
+        if ast_node.op.kind == tokens.MINUS:
+            Integer = objects.Integer
+            negate = arrays.negate
+
+            def negative(env):
+                value = right(env)
+                try:
+                    return Integer(-value)
+                except TypeError:
+                    return negate(value)
+
+            return negative
+
+        def unknown_prefix(env):
+            right(env)
+
+        return unknown_prefix
+
+    def compile_binary_op(self, ast_node):
+        op = ast_node.op.kind
+        left = self.compile(ast_node.left)
+        Integer = objects.Integer
+        Array = objects.Array
+        # Arrays make the scalar operators raise a TypeError and go elementwise
+        binary_op = arrays.binary_op
+
+        # Specialize the common `x + 1` / `n - 2` shapes with a constant right operand
+        if isinstance(ast_node.right, ast.IntLiteral):
+            const = literal_value(ast_node.right)
+            if op == tokens.PLUS:
+                def add_const(env):
+                    value = left(env)
+                    try:
+                        return Integer(value + const)
+                    except TypeError:
+                        return binary_op(op, value, const)
+
+                return add_const
+            if op == tokens.MINUS:
+                def subtract_const(env):
+                    value = left(env)
+                    try:
+                        return Integer(value - const)
+                    except TypeError:
+                        return binary_op(op, value, const)
+
+                return subtract_const
+            if op == tokens.LT:
+                TRUE, FALSE = objects.TRUE, objects.FALSE
+
+                def less_than_const(env):
+                    value = left(env)
+                    try:
+                        return TRUE if value < const else FALSE
+                    except TypeError:
+                        return binary_op(op, value, const)
+
+                return less_than_const
+            if op == tokens.EQ:
+                TRUE, FALSE = objects.TRUE, objects.FALSE
+
+                def equal_const(env):
+                    value = left(env)
+                    if type(value) is Array:
+                        return binary_op(op, value, const)
+                    return TRUE if value == const else FALSE
+
+                return equal_const
+
+        right = self.compile(ast_node.right)
+        if op == tokens.PLUS:
+            def add(env):
+                left_value = left(env)
+                right_value = right(env)
+                try:
+                    return Integer(left_value + right_value)
+                except TypeError:
+                    return binary_op(op, left_value, right_value)
+
+            return add
+        if op == tokens.MINUS:
+            def subtract(env):
+                left_value = left(env)
+                right_value = right(env)
+                try:
+                    return Integer(left_value - right_value)
+                except TypeError:
+                    return binary_op(op, left_value, right_value)
+
+            return subtract
+        if op == tokens.ASTERISK:
+            def multiply(env):
+                left_value = left(env)
+                right_value = right(env)
+                try:
+                    return Integer(left_value * right_value)
+                except TypeError:
+                    return binary_op(op, left_value, right_value)
+
+            return multiply
+
+        func = BINARY_FUNCS[op]
+
+        return lambda env: func(left(env), right(env))
+
+    def compile_collection_literal(self, ast_node):
+        elements = [self.compile_expression(element) for element in ast_node.elements]
+        make = BUILDERS[type(ast_node)]
+
+        return lambda env: make([element(env) for element in elements])
+
+    def compile_index(self, ast_node):
+        left = self.compile_expression(ast_node.left)
+        index = self.compile_expression(ast_node.index)
+        index_ = arrays.index
+
+        return lambda env: index_(left(env), index(env))
+
+    def compile_func_literal(self, ast_node):
+        params = ast_node.params
+        body = ast_node.body
+        compiled = self.compile_function(params, body)
+        Function = objects.Function
+
+        if ast_node.name is None:
+            def func_literal(env):
+                func = Function(params, body, env)
+                func.compiled = compiled
+                return func
+        else:
+            name = ast_node.name
+
+            def func_literal(env):
+                func = Function(params, body, env)
+                func.compiled = compiled
+                env.set(name, func)
+                return func
+
+        return func_literal
+
+    def compile_function(self, params, body):
+        """The body as a closure of the call's `Environment`, which may give back a `TailCall`"""
+        thunk = self.compile_statements(body.statements)
+        Returned = objects.Returned
+
+        if can_return(body):
+            def run(env):
+                value = thunk(env)
+                if type(value) is Returned:
+                    return value.obj
+                return value
+        else:
+            run = thunk
+
+        return run
+
+    def call(self, func, values):
+        """Calls `func` with evaluated arguments, how builtins call back into Light"""
+        if type(func) is objects.Builtin:
+            return func.invoke(self.call, values)
+        if type(func) is not objects.Function:
+            raise ValueError(f"Object {func} is not callable")
+        if len(func.params) != len(values):
+            raise ValueError(
+                f"Number of arguments passed {len(values)} != number of parameters {len(func.params)}")
+
+        compiled = func.compiled
+        if compiled is None:
+            compiled = func.compiled = self.compile_function(func.params, func.body)
+
+        local_env = Environment(parent=func.closure)
+        for param, value in zip(func.params, values):
+            local_env.set(param, value)
+
+        return self.run_tail_calls(compiled(local_env))
+
+    def run_tail_calls(self, result):
+        """Makes the calls of the `TailCall`s returned by compiled bodies, one after the other"""
+        while type(result) is objects.TailCall:
+            func = result.func
+            compiled = func.compiled
+            if compiled is None:
+                compiled = func.compiled = self.compile_function(func.params, func.body)
+
+            local_env = Environment(parent=func.closure)
+            for param, value in zip(func.params, result.args):
+                local_env.set(param, value)
+            result = compiled(local_env)
+
+        return result
+
+    def compile_func_call(self, ast_node):
+        callee = self.compile_expression(ast_node.ident)
+        args = [self.compile_expression(arg) for arg in ast_node.args]
+        nargs = len(args)
+        Function = objects.Function
+        Builtin = objects.Builtin
+        TailCall = objects.TailCall
+        call = self.call
+        run_tail_calls = self.run_tail_calls
+
+        def func_call(env):
+            func = callee(env)
+            if type(func) is not Function:
+                if type(func) is Builtin:
+                    return func.invoke(call, [arg(env) for arg in args])
+                raise ValueError(f"Object {func} is not callable")
+            if len(func.params) != nargs:
+                raise ValueError(
+                    f"Number of arguments passed {nargs} != number of parameters {len(func.params)}")
+
+            compiled = func.compiled
+            if compiled is None:
+                # Functions created by another engine are compiled lazily
+                compiled = func.compiled = self.compile_function(func.params, func.body)
+
+            local_env = Environment(parent=func.closure)
+            for param, arg in zip(func.params, args):
+                local_env.set(param, arg(env))
+
+            result = compiled(local_env)
+            if type(result) is TailCall:
+                return run_tail_calls(result)
+            return result
+
+        return func_call
+
+
+def compile_closure(program):
+    """Compiles an `ast.Program` into a callable taking the global `Environment`"""
+    c = ClosureCompiler()
+    thunks = [(c.compile(stmt), can_return(stmt)) for stmt in program.statements]
+    Returned = objects.Returned
+    TailCall = objects.TailCall
+
+    def run(env):
+        value = None
+        for thunk, returns in thunks:
+            value = thunk(env)
+            if returns and type(value) is Returned:
+                return value.obj
+            if returns and type(value) is TailCall:
+                return c.run_tail_calls(value)
+
+        return value
+
+    return run
@@ -0,0 +1,275 @@
+from . import ast
+from . import objects
+from . import tokens
+
+class CompilerError(Exception):
+    pass
+
+#
+# Opcodes
+#
+# Every instruction is a pair of ints (opcode, argument) stored flat in
+# `Code.ops`. Instructions that take no argument carry a 0.
+#
+
+LOAD_CONST = 0
+LOAD_NAME = 1
+STORE_NAME = 2
+POP_TOP = 3
+DUP_TOP = 4
+JUMP = 5
+POP_JUMP_IF_NOT_TRUE = 6
+MAKE_FUNCTION = 7
+CALL_FUNCTION = 8
+RETURN_VALUE = 9
+UNARY_NEGATIVE = 10
+BINARY_ADD = 11
+BINARY_SUBTRACT = 12
+BINARY_MULTIPLY = 13
+BINARY_DIVIDE = 14
+COMPARE_EQ = 15
+COMPARE_NEQ = 16
+COMPARE_GT = 17
+COMPARE_LT = 18
+COMPARE_GTE = 19
+COMPARE_LTE = 20
+TAIL_CALL = 21
+ASSIGN_NAME = 22
+BUILD_ARRAY = 23
+BINARY_SUBSCR = 24
+BUILD_VECTOR = 25
+BUILD_MAP = 26
+
+OPNAMES = {
+    value: name for name, value in list(globals().items())
+    if name.isupper() and isinstance(value, int)
+}
+
+BINARY_OPCODES = {
+    tokens.PLUS: BINARY_ADD,
+    tokens.MINUS: BINARY_SUBTRACT,
+    tokens.ASTERISK: BINARY_MULTIPLY,
+    tokens.SLASH: BINARY_DIVIDE,
+    tokens.EQ: COMPARE_EQ,
+    tokens.NEQ: COMPARE_NEQ,
+    tokens.GT: COMPARE_GT,
+    tokens.LT: COMPARE_LT,
+    tokens.GTE: COMPARE_GTE,
+    tokens.LTE: COMPARE_LTE,
+}
+
+BUILD_OPS = {
+    ast.ArrayLiteral: BUILD_ARRAY,
+    ast.VectorLiteral: BUILD_VECTOR,
+    ast.MapLiteral: BUILD_MAP,
+}
+
+
+class Code:
+    def __init__(self, ops, consts, names, params=(), body=None):
+        self.ops = ops
+        self.consts = consts
+        self.names = names
+        self.params = params
+        self.body = body
+
+    def disassemble(self):
+        lines = []
+        for pc in range(0, len(self.ops), 2):
+            op, arg = self.ops[pc], self.ops[pc+1]
+            if op == LOAD_CONST or op == MAKE_FUNCTION:
+                detail = f"({self.consts[arg]!r})"
+            elif op == LOAD_NAME or op == STORE_NAME or op == ASSIGN_NAME:
+                detail = f"({self.names[arg].literal})"
+            else:
+                detail = ""
+            lines.append(f"{pc:>4} {OPNAMES[op]:<22}{arg} {detail}".rstrip())
+
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return f"Code({repr(self.params)})"
+
+
+class Compiler:
+    """
+    Lowers an AST into `Code` objects for the VM.
+
+    Every statement leaves exactly one value on the stack, which mirrors
+    how `Evaluator.eval_block` returns the value of the last statement.
+    """
+
+    def __init__(self, params=(), body=None):
+        self.ops = []
+        self.consts = []
+        self.names = []
+        self._name_index = {}
+        self.params = params
+        self.body = body
+
+    def emit(self, op, arg=0):
+        self.ops.append(op)
+        self.ops.append(arg)
+
+        return len(self.ops) - 2
+
+    def patch(self, at, target):
+        self.ops[at+1] = target
+
+    def add_const(self, value):
+        self.consts.append(value)
+
+        return len(self.consts) - 1
+
+    def add_name(self, ident):
+        literal = ident.literal
+        if literal not in self._name_index:
+            self._name_index[literal] = len(self.names)
+            self.names.append(ident)
+
+        return self._name_index[literal]
+
+    def code(self):
+        return Code(self.ops, self.consts, self.names, self.params, self.body)
+
+    def compile_statements(self, statements):
+        if not statements:
+            self.emit(LOAD_CONST, self.add_const(None))
+            return
+
+        last = len(statements) - 1
+        for i, stmt in enumerate(statements):
+            self.compile(stmt)
+            if i != last:
+                self.emit(POP_TOP)
+
+    def compile(self, ast_node):
+        if isinstance(ast_node, ast.Assignment):
+            return self.compile_assignment(ast_node)
+        if isinstance(ast_node, ast.Return):
+            return self.compile_return(ast_node)
+        if isinstance(ast_node, ast.Conditional):
+            return self.compile_conditional(ast_node)
+        if isinstance(ast_node, ast.While):
+            return self.compile_while(ast_node)
+        if isinstance(ast_node, ast.Reassignment):
+            return self.compile_reassignment(ast_node)
+        if isinstance(ast_node, ast.Block):
+            return self.compile_statements(ast_node.statements)
+        if isinstance(ast_node, ast.Expression):
+            return self.compile_expression(ast_node)
+        else:
+            raise CompilerError(f"Cannot compile {ast_node}")
+
+    def compile_assignment(self, ast_node):
+        self.compile(ast_node.expr)
+        self.emit(STORE_NAME, self.add_name(ast_node.ident))
+        self.emit(LOAD_CONST, self.add_const(None))
+
+    def compile_reassignment(self, ast_node):
+        self.compile(ast_node.expr)
+        self.emit(ASSIGN_NAME, self.add_name(ast_node.ident))
+        self.emit(LOAD_CONST, self.add_const(None))
+
+    def compile_return(self, ast_node):
+        expr = ast_node.expr
+        if isinstance(expr, ast.FunctionCall):
+            # The callee replaces the current frame, the RETURN_VALUE is only
+            # reached when returning from the top level program
+            self.compile_call(expr, TAIL_CALL)
+        else:
+            self.compile(expr)
+        self.emit(RETURN_VALUE)
+
+    def compile_conditional(self, ast_node):
+        self.compile(ast_node.cond)
+        jump_alt = self.emit(POP_JUMP_IF_NOT_TRUE)
+        self.compile(ast_node.cons)
+        jump_end = self.emit(JUMP)
+        self.patch(jump_alt, len(self.ops))
+        if ast_node.alt is not None:
+            self.compile(ast_node.alt)
+        else:
+            self.emit(LOAD_CONST, self.add_const(None))
+        self.patch(jump_end, len(self.ops))
+
+    def compile_while(self, ast_node):
+        start = len(self.ops)
+        self.compile(ast_node.cond)
+        jump_end = self.emit(POP_JUMP_IF_NOT_TRUE)
+        self.compile(ast_node.body)
+        self.emit(POP_TOP)
+        self.emit(JUMP, start)
+        self.patch(jump_end, len(self.ops))
+        self.emit(LOAD_CONST, self.add_const(None))
+
+    def compile_expression(self, ast_node):
+        if isinstance(ast_node, ast.Identifier):
+            self.emit(LOAD_NAME, self.add_name(ast_node.ident))
+        elif isinstance(ast_node, (ast.IntLiteral, ast.BoolLiteral, ast.StringLiteral)):
+            self.emit(LOAD_CONST, self.add_const(literal_value(ast_node)))
+        elif isinstance(ast_node, ast.BinaryOp):
+            self.compile(ast_node.left)
+            self.compile(ast_node.right)
+            self.emit(BINARY_OPCODES[ast_node.op.kind])
+        elif isinstance(ast_node, ast.PrefixOp):
+            self.compile_expression(ast_node.right)
+            if ast_node.op.kind == tokens.MINUS:
+                self.emit(UNARY_NEGATIVE)
+            else:
+                # Evaluator.eval_prefix_op yields None for unknown operators
+                self.emit(POP_TOP)
+                self.emit(LOAD_CONST, self.add_const(None))
+        elif isinstance(ast_node, ast.FunctionLiteral):
+            self.compile_func_literal(ast_node)
+        elif isinstance(ast_node, ast.FunctionCall):
+            self.compile_call(ast_node, CALL_FUNCTION)
+        elif isinstance(ast_node, ast.COLLECTION_LITERALS):
+            for element in ast_node.elements:
+                self.compile_expression(element)
+            self.emit(BUILD_OPS[type(ast_node)], len(ast_node.elements))
+        elif isinstance(ast_node, ast.Index):
+            self.compile_expression(ast_node.left)
+            self.compile_expression(ast_node.index)
+            self.emit(BINARY_SUBSCR)
+        else:
+            raise CompilerError(
+                f"Expression of type {ast_node} cannot be compiled")
+
+    def compile_call(self, ast_node, op):
+        self.compile_expression(ast_node.ident)
+        for arg in ast_node.args:
+            self.compile_expression(arg)
+        self.emit(op, len(ast_node.args))
+
+    def compile_func_literal(self, ast_node):
+        code = compile_function(ast_node.params, ast_node.body)
+        self.emit(MAKE_FUNCTION, self.add_const(code))
+        if ast_node.name is not None:
+            self.emit(DUP_TOP)
+            self.emit(STORE_NAME, self.add_name(ast_node.name))
+
+
+def literal_value(ast_node):
+    if isinstance(ast_node, ast.IntLiteral):
+        return objects.Integer(int(ast_node.literal))
+    if isinstance(ast_node, ast.BoolLiteral):
+        return objects.TRUE if ast_node.literal == 'true' else objects.FALSE
+
+    return objects.String(str(ast_node.literal))
+
+
+def compile_function(params, body):
+    c = Compiler(params, body)
+    c.compile_statements(body.statements)
+    c.emit(RETURN_VALUE)
+
+    return c.code()
+
+
+def compile_program(program):
+    c = Compiler()
+    c.compile_statements(program.statements)
+    c.emit(RETURN_VALUE)
+
+    return c.code()
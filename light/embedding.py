@@ -0,0 +1,107 @@
+"""
+API for running Light from Python.
+
+    import light
+
+    handle = light.compile("let sq = func(x){ return x * x }; sq(n)")
+    handle.run({'n': 12})  # 144
+
+`compile` keeps the parsed programs of recently used sources in an LRU
+cache, so running the same source text again skips lexing and parsing.
+`compile(source, optimize=True)` also runs the `optimizer` pass once.
+"""
+from collections import OrderedDict
+
+from .evaluator import Environment, prepare
+from .optimizer import optimize_program
+from .parser import parse_source
+
+
+def parse(source, optimize=False):
+    program = parse_source(source)
+    if optimize:
+        program, _ = optimize_program(program)
+
+    return program
+
+
+class CompiledProgram:
+    """A parsed program that can be run any number of times"""
+
+    def __init__(self, source, program):
+        self.source = source
+        self.program = program
+        # engine -> function running the program, see `evaluator.prepare`
+        self._runners = {}
+
+    def run(self, bindings=None, engine='tree'):
+        """Runs the program with `bindings` (name -> value) as its globals"""
+        env = Environment.from_bindings(bindings or {})
+
+        return self.run_in(env, engine)
+
+    def run_in(self, env, engine='tree'):
+        """Runs the program in an existing global `Environment`"""
+        try:
+            runner = self._runners[engine]
+        except KeyError:
+            runner = self._runners[engine] = prepare(self.program, engine)
+
+        return runner(env)
+
+    def __repr__(self):
+        return f"CompiledProgram({self.source[:40]!r})"
+
+
+class ProgramCache:
+    """Bounded LRU cache of `CompiledProgram`s keyed by their source text and optimize flag"""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._programs = OrderedDict()
+
+    def get(self, source, optimize=False):
+        key = (source, optimize)
+        try:
+            handle = self._programs[key]
+        except KeyError:
+            self.misses += 1
+            handle = CompiledProgram(source, parse(source, optimize))
+            self._programs[key] = handle
+            if len(self._programs) > self.maxsize:
+                self._programs.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.hits += 1
+            self._programs.move_to_end(key)
+
+        return handle
+
+    def clear(self):
+        self._programs.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._programs),
+            'maxsize': self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._programs)
+
+
+PROGRAM_CACHE = ProgramCache()
+
+
+def compile(source, cache=PROGRAM_CACHE, optimize=False):
+    """Parses `source` into a reusable `CompiledProgram`, `cache=None` bypasses the cache"""
+    if cache is None:
+        return CompiledProgram(source, parse(source, optimize))
+
+    return cache.get(source, optimize)
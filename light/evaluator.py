@@ -1,12 +1,56 @@
-import ast
-import objects
-import tokens
+import operator
+import sys
+
+from . import arrays
+from . import ast
+from . import objects
+from . import persistent
+from . import tokens
+from .builtins import BUILTINS
+from .inference import BOOL, INT, infer_program
+
+
+# Values the inline caches hold, only rebinding from or to one of them matters
+CALLABLE_TYPES = (objects.Function, objects.Builtin)
+
+
+class InlineCaches:
+    """
+    The call site inline caches of one global environment and the frames
+    below it, see `Evaluator.lookup_callee`. They live as long as the
+    environments do, so a program run again starts from empty caches.
+    """
+    __slots__ = ('versions', 'entries')
+
+    def __init__(self):
+        # Names looked up through the caches -> number of times a binding
+        # of that name was set since. Bumping it invalidates their entries
+        self.versions = {}
+        # FunctionCall node -> (parent of the calling frame, version, callee)
+        self.entries = {}
 
 
 class Environment:
+    __slots__ = ('parent', '_table', 'caches')
+
     def __init__(self, parent=None):
         self.parent = parent
-        self._table = {}
+        if parent is not None:
+            self._table = {}
+            self.caches = parent.caches
+        else:
+            # Global environments start with the builtins, programs may rebind them
+            self._table = dict(BUILTINS)
+            self.caches = InlineCaches()
+
+    @classmethod
+    def from_bindings(cls, bindings):
+        """Global environment with `bindings` (name -> value) predefined"""
+        env = cls()
+        for name, value in bindings.items():
+            env._table[name] = objects.to_object(value)
+
+        return env
 
     def get(self, ident):
         try:
@@ -18,18 +62,136 @@ class Environment:
             return self.parent.get(ident)
 
     def set(self, ident, value):
-        self._table[ident.literal] = value
+        name = ident.literal
+        self._table[name] = value
+        versions = self.caches.versions
+        if name in versions:
+            versions[name] += 1
+
+    def assign(self, ident, value):
+        """Rebinds `ident` in the nearest environment that binds it"""
+        name = ident.literal
+        env = self
+        while name not in env._table:
+            env = env.parent
+            if env is None:
+                raise ValueError(f"Unbound variable `{name}`")
+
+        table = env._table
+        old = table[name]
+        table[name] = value
+        # Loop counters are rebound all the time, they are never cached
+        versions = self.caches.versions
+        if name in versions and (
+                type(value) in CALLABLE_TYPES or type(old) in CALLABLE_TYPES):
+            versions[name] += 1
+
+    def clear(self):
+        self._table.clear()
+
+    def names(self):
+        names = set(self._table)
+        if self.parent is not None:
+            names |= self.parent.names()
+
+        return names
+
+
+# Semantics of the binary operators as plain functions, shared by the
+# engines that don't go through `Evaluator.eval_binary_op`, elementwise on arrays
+BINARY_FUNCS = arrays.operators(boxed=True)
+
+# Functions making the collection of a literal from its element values, by node type
+BUILDERS = {
+    ast.ArrayLiteral: arrays.make,
+    ast.VectorLiteral: persistent.vector,
+    ast.MapLiteral: persistent.hash_map,
+}
+
+
+# Operators on plain ints, used where the type inference proved the operands
+# integer valued and the result doesn't need to be a Light object
+INT_OPS = {
+    tokens.PLUS: operator.add,
+    tokens.MINUS: operator.sub,
+    tokens.ASTERISK: operator.mul,
+    tokens.SLASH: lambda left, right: int(left / right),
+}
+
+COMPARE_OPS = {
+    tokens.EQ: operator.eq,
+    tokens.NEQ: operator.ne,
+    tokens.GT: operator.gt,
+    tokens.LT: operator.lt,
+    tokens.GTE: operator.ge,
+    tokens.LTE: operator.le,
+}
+
+
+UNBOUND = object()
+
+# Free frames kept for reuse per function body
+FRAME_POOL_SIZE = 64
+
+
+class ArrayEnvironment:
+    """
+    Function frame used with resolved programs, locals live in a list and
+    are read by their `(depth, slot)` address instead of by name.
+    """
+    __slots__ = ('values', 'parent')
+
+    def __init__(self, size, parent=None):
+        self.values = [UNBOUND] * size
+        self.parent = parent
+
+    def get_at(self, depth, slot):
+        """The value in `slot` of the frame `depth` levels up, UNBOUND if it has none yet"""
+        env = self
+        for _ in range(depth):
+            env = env.parent
+
+        return env.values[slot]
+
+    def set_at(self, slot, value):
+        self.values[slot] = value
+
+    def assign_at(self, depth, slot, value):
+        """Rebinds `slot` of the frame `depth` levels up, returns False if it isn't bound yet"""
+        env = self
+        for _ in range(depth):
+            env = env.parent
+
+        if env.values[slot] is UNBOUND:
+            return False
+        env.values[slot] = value
+
+        return True
+
+    def clear(self):
+        self.values[:] = [UNBOUND] * len(self.values)
 
 
 class Evaluator:
 
+    def __init__(self):
+        # Function body -> whether it contains function literals that could capture its frame
+        self._captures = {}
+        # Function body -> frames of finished calls, see `release_frame`
+        self._frames = {}
+
     def eval(self, ast_node, env):
+        # Most frequent in loop bodies, checked first
+        if isinstance(ast_node, ast.Reassignment):
+            return self.eval_reassignment(ast_node, env)
         if isinstance(ast_node, ast.Assignment):
             return self.eval_assignment(ast_node, env)
         if isinstance(ast_node, ast.Return):
             return self.eval_return(ast_node, env)
         if isinstance(ast_node, ast.Conditional):
             return self.eval_conditional(ast_node, env)
+        if isinstance(ast_node, ast.While):
+            return self.eval_while(ast_node, env)
         if isinstance(ast_node, ast.Block):
             return self.eval_block(ast_node, env)
         if isinstance(ast_node, ast.Expression):
@@ -37,35 +199,67 @@ class Evaluator:
         else:
             pass
 
-    def eval_program(self, program):
-        env = Environment()
+    def eval_program(self, program, env=None):
+        if env is None:
+            env = Environment()
+
+        return_ = None
         for statement in program.statements:
             return_ = self.eval(statement, env)
+            if isinstance(return_, objects.TailCall):
+                return objects.box(self.apply(return_.func, return_.args))
+            if isinstance(return_, objects.Returned):
+                return objects.box(return_.obj)
 
-        return return_
+        return objects.box(return_)
+
+    # Environments are passed the tokens of identifiers, whose `literal`
+    # is a plain attribute rather than a property of the node
 
     def eval_assignment(self, ast_node, env):
-        ident = ast_node.ident
+        ident = ast_node.ident.ident
         value = self.eval(ast_node.expr, env)
         env.set(ident, value)
 
+    def eval_reassignment(self, ast_node, env):
+        value = self.eval_expression(ast_node.expr, env)
+        env.assign(ast_node.ident.ident, value)
+
     def eval_return(self, ast_node, env):
-        value = self.eval(ast_node.expr, env)
+        expr = ast_node.expr
+        if isinstance(expr, ast.FunctionCall):
+            # Call in tail position, it is made by the trampoline in `apply`
+            func = self.eval(expr.ident, env)
+            if type(func) is objects.Builtin:
+                return objects.Returned(self.eval_func(func, expr.args, env))
+            return objects.TailCall(func, self.eval_args(func, expr.args, env))
+
+        value = self.eval(expr, env)
 
         return objects.Returned(value)
 
     def eval_conditional(self, ast_node, env):
-        condition = self.eval(ast_node.cond, env)
-        if condition == objects.TRUE:
+        if self.eval_test(ast_node.cond, env):
             return self.eval(ast_node.cons, env)
         elif ast_node.alt is not None:
             return self.eval(ast_node.alt, env)
 
+    def eval_while(self, ast_node, env):
+        # The body runs in the enclosing frame, iterations allocate nothing
+        cond = ast_node.cond
+        body = ast_node.body
+        while self.eval_test(cond, env):
+            result = self.eval_block(body, env)
+            if isinstance(result, objects.Returned):
+                return result
+
     def eval_block(self, ast_node, env):
+        last = None
         for stmt in ast_node.statements:
             last = self.eval(stmt, env)
             if isinstance(last, objects.Returned):
-                return last.obj
+                # Propagate the return out of nested blocks, eval_func unwraps it
+                return last
 
         return last
 
@@ -88,6 +282,11 @@ class Evaluator:
             return self.eval_func_literal(ast_node, env)
         if isinstance(ast_node, ast.FunctionCall):
             return self.eval_func_call(ast_node, env)
+
+        if isinstance(ast_node, ast.Index):
+            return self.eval_index(ast_node, env)
+        if isinstance(ast_node, ast.COLLECTION_LITERALS):
+            return self.eval_collection_literal(ast_node, env)
         else:
             raise ValueError(
                 f"Expression of type {ast_node} cannot be evaluated")
@@ -95,13 +294,52 @@ class Evaluator:
     def eval_identifier(self, ast_node, env):
         return env.get(ast_node.ident)
 
+    def eval_test(self, ast_node, env):
+        """Evaluates a condition to a Python bool, only `true` passes"""
+        if ast_node.type is BOOL and isinstance(ast_node, ast.BinaryOp):
+            left = self.eval_unboxed(ast_node.left, env)
+            right = self.eval_unboxed(ast_node.right, env)
+            if type(left) is objects.Array or type(right) is objects.Array:
+                return arrays.binary_op(ast_node.op.kind, left, right) is objects.TRUE
+
+            return COMPARE_OPS[ast_node.op.kind](left, right)
+
+        return self.eval(ast_node, env) is objects.TRUE
+
+    def eval_unboxed(self, ast_node, env):
+        """
+        Evaluates an expression, to a plain int if it was inferred integer
+        valued. Intermediate results of arithmetic are never boxed, unless an
+        operand is an array, which the int operators raise a TypeError on.
+        """
+        if ast_node.type is INT:
+            if isinstance(ast_node, ast.BinaryOp):
+                left = self.eval_unboxed(ast_node.left, env)
+                right = self.eval_unboxed(ast_node.right, env)
+                try:
+                    return INT_OPS[ast_node.op.kind](left, right)
+                except TypeError:
+                    return arrays.binary_op(ast_node.op.kind, left, right)
+            if isinstance(ast_node, ast.IntLiteral):
+                return int(ast_node.token.literal)
+            if isinstance(ast_node, ast.PrefixOp):
+                right = self.eval_unboxed(ast_node.right, env)
+                try:
+                    return -right
+                except TypeError:
+                    return arrays.negate(right)
+
+        return self.eval(ast_node, env)
+
     def eval_int_literal(self, ast_node, env):
-        value = int(ast_node.literal)
+        value = int(ast_node.token.literal)
+        if ast_node.type is INT:
+            return value
 
         return objects.Integer(value)
 
     def eval_bool_literal(self, ast_node, env):
-        if ast_node.literal == 'true':
+        if ast_node.token.literal == 'true':
             return objects.TRUE
 
         return objects.FALSE
@@ -112,50 +350,77 @@ class Evaluator:
         return objects.String(value)
 
     def eval_prefix_op(self, ast_node, env):
+        if ast_node.type is INT:
+            return self.eval_unboxed(ast_node, env)
+
         op = ast_node.op
         right = self.eval_expression(ast_node.right, env)
-        if isinstance(op, tokens.MINUS):
+        if op.kind == tokens.MINUS:
+            if type(right) is objects.Array:
+                return arrays.negate(right)
             return objects.Integer(-right)
 
     def eval_binary_op(self, ast_node, env):
+        if ast_node.type is INT:
+            return self.eval_unboxed(ast_node, env)
+        if ast_node.type is BOOL:
+            left = self.eval_unboxed(ast_node.left, env)
+            right = self.eval_unboxed(ast_node.right, env)
+            if type(left) is objects.Array or type(right) is objects.Array:
+                return arrays.binary_op(ast_node.op.kind, left, right)
+
+            return objects.TRUE if COMPARE_OPS[ast_node.op.kind](left, right) else objects.FALSE
+
         op = ast_node.op
         # left = self.eval_expression(ast_node.left, env)
         left = self.eval(ast_node.left, env)
         # right = self.eval_expression(ast_node.right, env)
         right = self.eval(ast_node.right, env)
-        if isinstance(op, tokens.PLUS):
+        if type(left) is objects.Array or type(right) is objects.Array:
+            return arrays.binary_op(op.kind, left, right)
+        if op.kind == tokens.PLUS:
             return objects.Integer(left + right)
-        if isinstance(op, tokens.MINUS):
+        if op.kind == tokens.MINUS:
             return objects.Integer(left - right)
-        if isinstance(op, tokens.ASTERISK):
+        if op.kind == tokens.ASTERISK:
             return objects.Integer(left * right)
-        if isinstance(op, tokens.SLASH):
-            return objects.Integer(left / right)
-        if isinstance(op, tokens.EQ):
+        if op.kind == tokens.SLASH:
+            return objects.Integer(int(left / right))
+        if op.kind == tokens.EQ:
             if left == right:
                 return objects.TRUE
             return objects.FALSE
-        if isinstance(op, tokens.NEQ):
+        if op.kind == tokens.NEQ:
             if left != right:
                 return objects.TRUE
             return objects.FALSE
-        if isinstance(op, tokens.GT):
+        if op.kind == tokens.GT:
             if left > right:
                 return objects.TRUE
             return objects.FALSE
-        if isinstance(op, tokens.LT):
+        if op.kind == tokens.LT:
             if left < right:
                 return objects.TRUE
             return objects.FALSE
-        if isinstance(op, tokens.GTE):
+        if op.kind == tokens.GTE:
             if left >= right:
                 return objects.TRUE
             return objects.FALSE
-        if isinstance(op, tokens.LTE):
+        if op.kind == tokens.LTE:
             if left <= right:
                 return objects.TRUE
             return objects.FALSE
 
+    def eval_collection_literal(self, ast_node, env):
+        elements = [self.eval_expression(element, env) for element in ast_node.elements]
+
+        return BUILDERS[type(ast_node)](elements)
+
+    def eval_index(self, ast_node, env):
+        array = self.eval_expression(ast_node.left, env)
+
+        return arrays.index(array, self.eval_expression(ast_node.index, env))
+
     def eval_func_literal(self, ast_node, env):
         params = ast_node.params
         body = ast_node.body
@@ -169,34 +434,224 @@ class Evaluator:
         return func
 
     def eval_func_call(self, ast_node, env):
-        func = self.eval(ast_node.ident, env)
+        func = self.lookup_callee(ast_node, env)
         args = ast_node.args
 
         return self.eval_func(func, args, env)
 
-    def eval_func(self, func, args, env):
-        local_env = Environment(parent=func.closure)
-        params = func.params
-        body = func.body
+    def lookup_callee(self, ast_node, env):
+        """
+        Resolves the callee of a call through the inline cache of the call site.
+
+        Callees bound in the calling frame itself are returned directly. Others
+        are cached for the node in the environment's `InlineCaches`, along
+        with the frame's parent and the version of the name, the entry is
+        valid as long as neither changed.
+        """
+        ident = ast_node.ident.ident
+        name = ident.literal
+        func = env._table.get(name, UNBOUND)
+        if func is not UNBOUND:
+            return func
+
+        caches = env.caches
+        version = caches.versions.setdefault(name, 0)
+        entry = caches.entries.get(ast_node)
+        if entry is not None and entry[0] is env.parent and entry[1] == version:
+            return entry[2]
+
+        func = env.get(ident)
+        if type(func) in CALLABLE_TYPES:
+            caches.entries[ast_node] = (env.parent, version, func)
 
-        if len(args) != len(params):
+        return func
+
+    def check_call(self, func, nargs):
+        if not isinstance(func, objects.Function):
+            raise ValueError(f"Object {func} is not callable")
+
+        if nargs != len(func.params):
             raise ValueError(
-                f"Number of arguments passed {len(args)} != number of parameters {len(params)}")
+                f"Number of arguments passed {nargs} != number of parameters {len(func.params)}")
+
+    def eval_args(self, func, args, env):
+        self.check_call(func, len(args))
+
+        # Arguments are evaluated in the caller's environment
+        return [self.eval_expression(arg, env) for arg in args]
+
+    def eval_func(self, func, args, env):
+        if type(func) is objects.Builtin:
+            return self.call(func, [self.eval_expression(arg, env) for arg in args])
+
+        return self.apply(func, self.eval_args(func, args, env))
+
+    def call(self, func, values):
+        """Calls `func` with evaluated arguments, how builtins call back into Light"""
+        if type(func) is objects.Builtin:
+            return func.invoke(self.call, values)
+
+        self.check_call(func, len(values))
+
+        return self.apply(func, values)
+
+    def apply(self, func, values):
+        local_env = self.new_frame(func)
+        self.bind_params(local_env, func.params, values)
+
+        while True:
+            result = self.eval_block(func.body, local_env)
+            if not isinstance(result, objects.TailCall):
+                break
+
+            if result.func is func and not self.captures(func.body):
+                # Nothing can refer to the frame any more, reuse it for the next iteration
+                local_env.clear()
+            else:
+                self.release_frame(local_env, func)
+                func = result.func
+                local_env = self.new_frame(func)
+            self.bind_params(local_env, func.params, result.args)
+        self.release_frame(local_env, func)
+
+        if isinstance(result, objects.Returned):
+            return result.obj
+
+        return result
+
+    def new_frame(self, func):
+        pool = self._frames.get(func.body)
+        if pool:
+            env = pool.pop()
+            env.parent = func.closure
+            return env
+
+        return self.make_frame(func)
+
+    def make_frame(self, func):
+        return Environment(parent=func.closure)
+
+    def release_frame(self, env, func):
+        """
+        Keeps the frame of a finished call of `func` for the next calls, unless
+        a function created by the call may still refer to it.
+        """
+        if self.captures(func.body):
+            return
+
+        pool = self._frames.setdefault(func.body, [])
+        if len(pool) < FRAME_POOL_SIZE:
+            env.clear()
+            # Don't keep the closure reachable while the frame is unused
+            env.parent = None
+            pool.append(env)
+
+    def bind_params(self, env, params, values):
+        for param, value in zip(params, values):
+            env.set(param.ident, value)
+
+    def captures(self, body):
+        try:
+            return self._captures[body]
+        except KeyError:
+            captures = any(isinstance(node, ast.FunctionLiteral) for node in ast.walk(body))
+            self._captures[body] = captures
+
+            return captures
+
+
+ENGINES = ('tree', 'vm', 'closure', 'resolved', 'stack', 'memo', 'jit')
+# Engines built on `Evaluator`, which uses the inferred types
+TYPED_ENGINES = ('tree', 'resolved', 'memo', 'jit')
 
-        for param, arg in zip(params, args):
-            local_env.set(param, self.eval_expression(arg, local_env))
 
-        return self.eval_block(body, local_env)
+def prepare(program, engine='tree'):
+    """
+    Does the per program work of `engine` once, e.g. compiling to bytecode,
+    and returns a function running the program in a global environment
+    """
+    if engine in TYPED_ENGINES:
+        # Lets the evaluator compute integer expressions on plain ints
+        infer_program(program)
 
+    if engine == 'tree':
+        return lambda env: Evaluator().eval_program(program, env)
+    if engine == 'vm':
+        from .compiler import compile_program
+        from .vm import VM
 
-def eval_file(file_):
-    from parser import parse_source
+        code = compile_program(program)
+        return lambda env: VM().run(code, env)
+    if engine == 'closure':
+        from .closures import compile_closure
 
-    with open(file_) as f:
-        source = f.read()
+        return compile_closure(program)
+    if engine == 'resolved':
+        from .resolver import ResolvedEvaluator, check_globals, resolve_program
 
-    ast_node = parse_source(source)
+        free_names = resolve_program(program)
+
+        def run(env):
+            # Unbound names are reported before any of the program runs
+            check_globals(free_names, env)
+            return ResolvedEvaluator().eval_program(program, env)
+
+        return run
+    if engine == 'stack':
+        from .stack_evaluator import StackEvaluator
+
+        return lambda env: StackEvaluator().eval_program(program, env)
+    if engine == 'memo':
+        from .memo import MemoizingEvaluator
+
+        return lambda env: MemoizingEvaluator().eval_program(program, env)
+    if engine == 'jit':
+        from .jit import JITEvaluator
+
+        return lambda env: JITEvaluator().eval_program(program, env)
+
+    raise ValueError(f"Unknown engine `{engine}`, expected one of {ENGINES}")
+
+
+def execute(program, env, engine='tree'):
+    """Runs `program` in `env` with one of the `ENGINES`"""
+    return prepare(program, engine)(env)
+
+
+def eval_file(file_, engine='tree', cache=True, optimize=False, profile=False, profile_output=None):
+    """
+    Runs the script `file_` and prints its result. With `profile` the script
+    runs on the profiling evaluator instead of `engine`, the report is printed
+    to stderr and the collapsed stacks are written to `profile_output`.
+    """
+    from .cache import load_program
+
+    ast_node = load_program(file_, use_cache=cache)
+    if optimize:
+        from .optimizer import Optimizer
+
+        optimizer = Optimizer()
+        ast_node = optimizer.optimize_program(ast_node)
+        print(f"Optimizer inlined {optimizer.inlined} calls, eliminated {optimizer.eliminated} nodes",
+              file=sys.stderr)
+
+    env = Environment()
+    if profile:
+        from .profiler import ProfilingEvaluator, format_report, write_collapsed_stacks
+
+        evaluator = ProfilingEvaluator()
+        print(evaluator.eval_program(ast_node, env))
+        print(format_report(evaluator.profile), file=sys.stderr)
+        if profile_output is not None:
+            write_collapsed_stacks(evaluator.profile, profile_output)
+        return
 
-    evaluator = Evaluator()
     # The print will be avoided after implementation of print in the language
-    print(evaluator.eval_program(ast_node))
+    print(execute(ast_node, env, engine))
+
+    if engine == 'memo':
+        from .memo import memo_stats
+
+        for name, stats in memo_stats(env).items():
+            print(f"memo {name}: {stats['hits']} hits, {stats['misses']} misses, "
+                  f"{stats['evictions']} evictions", file=sys.stderr)
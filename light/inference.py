@@ -0,0 +1,47 @@
+"""
+Type inference for unboxed integer arithmetic.
+
+Sets the `type` of operator and literal nodes to INT or BOOL where the value
+is proven to be an integer or a boolean (or evaluating it raises), the
+evaluator then computes those nodes on plain Python ints and bools instead
+of allocating Light objects for every intermediate result.
+
+Operators decide the type of their result on their own, the one they give
+on scalars. An operand that turns out to be an array at run time makes the
+evaluator fall back to the elementwise operator instead. Other nodes, names
+and calls included, are left untyped: whatever they evaluate to, plain ints
+included, is passed along as it is, and only boxed into an Integer where a
+Light object is expected.
+"""
+from . import ast
+from . import tokens
+
+INT = 'int'
+BOOL = 'bool'
+
+ARITHMETIC = (tokens.PLUS, tokens.MINUS, tokens.ASTERISK, tokens.SLASH)
+
+
+class TypeInference:
+    def infer_program(self, program):
+        for node in ast.walk(program):
+            self.infer(node)
+
+        return program
+
+    def infer(self, ast_node):
+        """Annotates `ast_node` with the type of its value, if it is known"""
+        if isinstance(ast_node, ast.IntLiteral):
+            ast_node.type = INT
+        elif isinstance(ast_node, ast.BoolLiteral):
+            ast_node.type = BOOL
+        elif isinstance(ast_node, ast.BinaryOp):
+            # Arithmetic on anything but integers raises
+            ast_node.type = INT if ast_node.op.kind in ARITHMETIC else BOOL
+        elif isinstance(ast_node, ast.PrefixOp):
+            ast_node.type = INT
+
+
+def infer_program(program):
+    """Annotates the operators and literals of `program` with their types"""
+    return TypeInference().infer_program(program)
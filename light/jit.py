@@ -0,0 +1,457 @@
+"""
+The `jit` engine, the tree walking evaluator with hot functions compiled
+to Python.
+
+Every `objects.Function` counts its invocations. Once a function reaches
+`JIT_THRESHOLD` its body is translated to Python source specialized for
+the argument types of that call, run through `compile`, and called directly
+from then on. Integers stay plain Python ints inside translated code and
+calls of a function to itself with matching types skip the interpreter,
+self tail calls become a loop. The translated function checks the types of
+its arguments on entry and falls back to the interpreter when they differ
+from the specialized ones. Operators are only inlined on operands known to
+be ints or booleans, any other operand may be an array and goes through
+one of `GENERIC_OPS`.
+"""
+from . import arrays
+from . import ast
+from . import objects
+from . import tokens
+from .evaluator import BUILDERS, Evaluator
+
+# Invocations after which a function is compiled
+JIT_THRESHOLD = 50
+
+class JITError(Exception): pass
+
+
+# Types tracked by the translator, ANY is whatever Light object or int
+INT = 'int'
+BOOL = 'bool'
+ANY = 'any'
+
+# The evaluator passes around both plain ints and Integers
+INT_TYPES = (int, objects.Integer)
+
+# Returned by translated functions whose arguments fail the type guard
+DEOPT = object()
+
+ARITHMETIC_OPS = {
+    tokens.PLUS: '+',
+    tokens.MINUS: '-',
+    tokens.ASTERISK: '*',
+}
+
+COMPARISON_OPS = {
+    tokens.EQ: '==',
+    tokens.NEQ: '!=',
+    tokens.GT: '>',
+    tokens.LT: '<',
+    tokens.GTE: '>=',
+    tokens.LTE: '<=',
+}
+
+
+# Operators on operands that may be arrays, results of arithmetic stay ints
+GENERIC_OPS = arrays.operators(boxed=False)
+
+# Names of the `evaluator.BUILDERS` in the namespace of translated code
+BUILDER_NAMES = {
+    ast.ArrayLiteral: 'build_array',
+    ast.VectorLiteral: 'build_vector',
+    ast.MapLiteral: 'build_map',
+}
+
+
+def type_of(value):
+    if type(value) in INT_TYPES:
+        return INT
+    if value is objects.TRUE or value is objects.FALSE:
+        return BOOL
+
+    return ANY
+
+
+class FunctionTranslator:
+    """
+    Translates the body of a function to the source of a Python factory,
+    `make(func, env, call, tail_call, finish)`, that returns the entry point
+    of `func` taking the list of argument values.
+
+    Light blocks share the frame of their function, so `let` becomes a
+    Python local. Only lets at the top level of the body are supported and
+    their names must not be read before them, otherwise a read could refer
+    to an outer binding. Loops become Python loops, and rebinding a local
+    must keep the type it was translated with.
+    """
+
+    def __init__(self, params, body, param_types):
+        if not all(isinstance(param, ast.Identifier) for param in params):
+            raise JITError("Parameters must be identifiers")
+
+        self.params = [param.literal for param in params]
+        self.types = dict(zip(self.params, param_types))
+        self.body = body
+        self.lets = {
+            node.ident.literal for node in ast.walk(body) if isinstance(node, ast.Assignment)}
+        if self.lets & set(self.params):
+            raise JITError("Parameters can't be rebound")
+        # Only bodies with tail calls can hand a `TailCall` to their caller
+        self.tail_calls = any(
+            isinstance(node, ast.Return) and isinstance(node.expr, ast.FunctionCall)
+            for node in ast.walk(body))
+
+        self.locals = {}
+        self.consts = {}
+        self.lines = []
+        # Depth of the `while` loops being translated
+        self.loops = 0
+
+    def translate(self):
+        args = ', '.join(f"v_{param}" for param in self.params)
+        unpack = f"{args}, = values" if self.params else "pass"
+
+        self.emit(0, "def make(func, env, call, tail_call, finish):")
+        self.emit(1, f"def run({args}):")
+        self.emit(2, "while True:")
+        self.translate_block(self.body.statements, 3, tail=True, top=True)
+        self.emit(1, "def entry(values):")
+        self.emit(2, unpack)
+        for param in self.params:
+            guard = self.guard(param)
+            if guard is not None:
+                self.emit(2, f"if {guard}:")
+                self.emit(3, "return DEOPT")
+        self.emit(2, f"return box(run({args}))")
+        self.emit(1, "return entry")
+
+        return '\n'.join(self.lines) + '\n'
+
+    def emit(self, depth, line):
+        self.lines.append('    ' * depth + line)
+
+    def const(self, value):
+        name = f"K{len(self.consts)}"
+        self.consts[name] = value
+
+        return name
+
+    def guard(self, param):
+        type_ = self.types[param]
+        if type_ == INT:
+            return f"type(v_{param}) not in INT_TYPES"
+        if type_ == BOOL:
+            return f"v_{param} is not TRUE and v_{param} is not FALSE"
+
+        return None
+
+    def translate_block(self, statements, depth, tail, top=False):
+        start = len(self.lines)
+        for i, stmt in enumerate(statements):
+            self.translate_statement(stmt, depth, tail and i == len(statements) - 1, top)
+
+        if tail and not statements:
+            self.emit(depth, "return None")
+        elif len(self.lines) == start:
+            self.emit(depth, "pass")
+
+    def translate_statement(self, stmt, depth, tail, top):
+        if isinstance(stmt, ast.Assignment):
+            if not top:
+                raise JITError("`let` inside a nested block")
+            name = stmt.ident.literal
+            code, type_ = self.translate_expr(stmt.expr)
+            self.locals[name] = type_ if self.locals.get(name, type_) == type_ else ANY
+            self.emit(depth, f"v_{name} = {code}")
+            if tail:
+                self.emit(depth, "return None")
+        elif isinstance(stmt, ast.Reassignment):
+            self.translate_reassignment(stmt, depth)
+            if tail:
+                self.emit(depth, "return None")
+        elif isinstance(stmt, ast.While):
+            self.emit(depth, f"while {self.translate_condition(stmt.cond)}:")
+            self.loops += 1
+            self.translate_block(stmt.body.statements, depth + 1, tail=False)
+            self.loops -= 1
+            if tail:
+                self.emit(depth, "return None")
+        elif isinstance(stmt, ast.Return):
+            if isinstance(stmt.expr, ast.FunctionCall):
+                self.translate_tail_call(stmt.expr, depth)
+            else:
+                code, _ = self.translate_expr(stmt.expr)
+                self.emit(depth, f"return {code}")
+        elif isinstance(stmt, ast.Conditional):
+            self.emit(depth, f"if {self.translate_condition(stmt.cond)}:")
+            self.translate_block(stmt.cons.statements, depth + 1, tail)
+            if stmt.alt is not None:
+                self.emit(depth, "else:")
+                self.translate_block(stmt.alt.statements, depth + 1, tail)
+            elif tail:
+                self.emit(depth, "return None")
+        elif isinstance(stmt, ast.Block):
+            self.translate_block(stmt.statements, depth, tail, top)
+        else:
+            code, _ = self.translate_expr(stmt)
+            self.emit(depth, f"return {code}" if tail else code)
+
+    def translate_reassignment(self, stmt, depth):
+        name = stmt.ident.literal
+        code, type_ = self.translate_expr(stmt.expr)
+        if name in self.types or name in self.locals:
+            types = self.types if name in self.types else self.locals
+            # Reads were translated for the type the name had so far
+            if types[name] not in (ANY, type_):
+                raise JITError(f"`{name}` is rebound to another type")
+            self.emit(depth, f"v_{name} = {code}")
+        elif name in self.lets:
+            raise JITError(f"`{name}` is rebound before its `let`")
+        else:
+            self.emit(depth, f"env.assign({self.const(stmt.ident)}, box({code}))")
+
+    def translate_condition(self, expr):
+        # Comparisons of scalars are tested directly instead of going through TRUE/FALSE
+        if isinstance(expr, ast.BinaryOp) and expr.op.kind in COMPARISON_OPS:
+            code, scalar = self.translate_comparison(expr)
+            if scalar:
+                return code
+        else:
+            code, _ = self.translate_expr(expr)
+
+        return f"{code} is TRUE"
+
+    def translate_operator(self, expr, scalar_types):
+        """
+        The code of the operands of `expr`, and whether both have one of
+        `scalar_types`. Otherwise either one may be an array, and the code is
+        the call of the generic operator computing `expr`.
+        """
+        left, left_type = self.translate_expr(expr.left)
+        right, right_type = self.translate_expr(expr.right)
+        if left_type in scalar_types and right_type in scalar_types:
+            return left, right, True
+
+        return f"{self.generic_op(expr.op.kind)}({left}, {right})", None, False
+
+    def generic_op(self, kind):
+        name = f"op_{kind}"
+        self.consts[name] = GENERIC_OPS[kind]
+
+        return name
+
+    def translate_comparison(self, expr):
+        """The code of `expr` as a Python bool, or its generic code when not comparing scalars"""
+        # Booleans stay Light objects, which are never equal to an int
+        left, right, scalar = self.translate_operator(expr, (INT, BOOL))
+        if not scalar:
+            return left, False
+
+        return f"({left} {COMPARISON_OPS[expr.op.kind]} {right})", True
+
+    def translate_expr(self, expr):
+        if isinstance(expr, ast.IntLiteral):
+            return str(int(expr.literal)), INT
+        if isinstance(expr, ast.BoolLiteral):
+            return ('TRUE' if expr.literal == 'true' else 'FALSE'), BOOL
+        if isinstance(expr, ast.Identifier):
+            return self.translate_identifier(expr)
+        if isinstance(expr, ast.PrefixOp):
+            right, type_ = self.translate_expr(expr.right)
+            if type_ == INT:
+                return f"(-{right})", INT
+            return f"negate({right})", ANY
+        if isinstance(expr, ast.BinaryOp):
+            return self.translate_binary_op(expr)
+        if isinstance(expr, ast.FunctionCall):
+            return self.translate_call(expr)
+        if isinstance(expr, ast.COLLECTION_LITERALS):
+            elements = self.boxed(self.translate_args(expr.elements))
+            return f"{BUILDER_NAMES[type(expr)]}({elements})", ANY
+        if isinstance(expr, ast.Index):
+            left, _ = self.translate_expr(expr.left)
+            index, _ = self.translate_expr(expr.index)
+            return f"index({left}, {index})", ANY
+
+        raise JITError(f"Can't translate {expr}")
+
+    def translate_identifier(self, expr):
+        name = expr.literal
+        if name in self.types:
+            return f"v_{name}", self.types[name]
+        if name in self.locals:
+            return f"v_{name}", self.locals[name]
+        if name in self.lets:
+            raise JITError(f"`{name}` is read before its `let`")
+
+        return f"env.get({self.const(expr.ident)})", ANY
+
+    def translate_binary_op(self, expr):
+        kind = expr.op.kind
+        if kind in COMPARISON_OPS:
+            code, scalar = self.translate_comparison(expr)
+            if not scalar:
+                return code, ANY
+            return f"(TRUE if {code} else FALSE)", BOOL
+
+        left, right, scalar = self.translate_operator(expr, (INT,))
+        if not scalar:
+            return left, ANY
+        if kind == tokens.SLASH:
+            return f"int({left} / {right})", INT
+
+        return f"({left} {ARITHMETIC_OPS[kind]} {right})", INT
+
+    def translate_args(self, args):
+        return [self.translate_expr(arg) for arg in args]
+
+    def boxed(self, args):
+        boxed = []
+        for code, type_ in args:
+            if type_ == INT:
+                boxed.append(f"Integer({code})")
+            elif type_ == BOOL:
+                boxed.append(code)
+            else:
+                boxed.append(f"box({code})")
+
+        return f"[{', '.join(boxed)}]"
+
+    def callee(self, expr):
+        """The code looking the callee up, and whether it can be this function"""
+        name = expr.name
+        if name in self.types or name in self.locals:
+            return f"v_{name}", False
+        if name in self.lets:
+            raise JITError(f"`{name}` is called before its `let`")
+
+        return f"env.get({self.const(expr.ident)})", True
+
+    def direct(self, args):
+        """Whether `args` have the specialized types, so `run` can take them as they are"""
+        if len(args) != len(self.params):
+            return False
+
+        return all(
+            self.types[param] in (ANY, type_) for param, (_, type_) in zip(self.params, args))
+
+    def translate_call(self, expr):
+        callee, may_be_self = self.callee(expr)
+        args = self.translate_args(expr.args)
+        generic = f"call({callee}, {self.boxed(args)})"
+        if not (may_be_self and self.direct(args)):
+            return generic, ANY
+
+        direct = f"run({', '.join(code for code, _ in args)})"
+        if self.tail_calls:
+            direct = f"finish({direct})"
+
+        return f"({direct} if {callee} is func else {generic})", ANY
+
+    def translate_tail_call(self, expr, depth):
+        callee, may_be_self = self.callee(expr)
+        args = self.translate_args(expr.args)
+        if may_be_self and self.direct(args) and not self.loops:
+            # Self tail call, rebind the parameters and loop
+            self.emit(depth, f"if {callee} is func:")
+            if self.params:
+                targets = ', '.join(f"v_{param}" for param in self.params)
+                values = ', '.join(code for code, _ in args)
+                self.emit(depth + 1, f"{targets}, = {values},")
+            self.emit(depth + 1, "continue")
+
+        self.emit(depth, f"return tail_call({callee}, {self.boxed(args)})")
+
+
+class JITEvaluator(Evaluator):
+    def __init__(self, threshold=None):
+        super().__init__()
+        self.threshold = JIT_THRESHOLD if threshold is None else threshold
+        self.compiled = 0
+        self.deopts = 0
+        # (body, argument types) -> factory of entry points, None if untranslatable
+        self._factories = {}
+
+    def factory(self, func, types):
+        key = (func.body, types)
+        try:
+            return self._factories[key]
+        except KeyError:
+            pass
+
+        try:
+            translator = FunctionTranslator(func.params, func.body, types)
+            source = translator.translate()
+        except JITError:
+            factory = None
+        else:
+            namespace = {
+                'Integer': objects.Integer,
+                'TRUE': objects.TRUE,
+                'FALSE': objects.FALSE,
+                'DEOPT': DEOPT,
+                'INT_TYPES': INT_TYPES,
+                'box': objects.box,
+                'negate': arrays.negate,
+                **{name: BUILDERS[node_type] for node_type, name in BUILDER_NAMES.items()},
+                'index': arrays.index,
+                **translator.consts,
+            }
+            exec(compile(source, f"<jit {func!r}>", 'exec'), namespace)
+            factory = namespace['make']
+            self.compiled += 1
+        self._factories[key] = factory
+
+        return factory
+
+    def entry_point(self, func, values):
+        entry = func.jitted
+        if entry is None:
+            func.calls += 1
+            if func.calls < self.threshold:
+                return None
+
+            factory = self.factory(func, tuple(type_of(value) for value in values))
+            if factory is None:
+                entry = False
+            else:
+                entry = factory(func, func.closure, self.call, self.tail_call, self.finish)
+            func.jitted = entry
+
+        return entry or None
+
+    def tail_call(self, func, values):
+        if type(func) is objects.Builtin:
+            return func.invoke(self.call, values)
+
+        self.check_call(func, len(values))
+
+        return objects.TailCall(func, values)
+
+    def finish(self, result):
+        if type(result) is objects.TailCall:
+            return self.apply(result.func, result.args)
+
+        return result
+
+    def apply(self, func, values):
+        while True:
+            entry = self.entry_point(func, values)
+            result = DEOPT if entry is None else entry(values)
+            if result is DEOPT:
+                if entry is not None:
+                    self.deopts += 1
+                local_env = self.new_frame(func)
+                self.bind_params(local_env, func.params, values)
+                result = self.eval_block(func.body, local_env)
+                self.release_frame(local_env, func)
+
+            if not isinstance(result, objects.TailCall):
+                break
+            func = result.func
+            values = result.args
+
+        if isinstance(result, objects.Returned):
+            return result.obj
+
+        return result
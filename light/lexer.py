@@ -1,43 +1,54 @@
+import re
 import string
-import tokens
+from . import tokens
 
 class LexerError(Exception):
     pass
 
+FIXED = tokens.FIXED_TOKENS
+
 KEYWORDS = {
-    'if': tokens.IF,
-    'else': tokens.ELSE,
-    'let': tokens.LET,
-    'func': tokens.FUNC,
-    'return': tokens.RETURN,
-    'true': tokens.TRUE,
-    'false': tokens.FALSE,
+    'if': FIXED[tokens.IF],
+    'else': FIXED[tokens.ELSE],
+    'let': FIXED[tokens.LET],
+    'func': FIXED[tokens.FUNC],
+    'return': FIXED[tokens.RETURN],
+    'while': FIXED[tokens.WHILE],
+    'true': FIXED[tokens.TRUE],
+    'false': FIXED[tokens.FALSE],
 }
 
 SINGLE_CHAR_TOKENS = {
-    '\0': tokens.EOF,
-    '=': tokens.ASSIGN,
-    '+': tokens.PLUS,
-    '-': tokens.MINUS,
-    '*': tokens.ASTERISK,
-    '/': tokens.SLASH,
-    '}': tokens.RBRACE,
-    '{': tokens.LBRACE,
-    ')': tokens.RPARAN,
-    '(': tokens.LPARAN,
-    ',': tokens.COMMA,
-    ';': tokens.SEMICOLON,
-    '<': tokens.LT,
-    '>': tokens.GT,
+    '\0': FIXED[tokens.EOF],
+    '=': FIXED[tokens.ASSIGN],
+    '+': FIXED[tokens.PLUS],
+    '-': FIXED[tokens.MINUS],
+    '*': FIXED[tokens.ASTERISK],
+    '/': FIXED[tokens.SLASH],
+    '}': FIXED[tokens.RBRACE],
+    '{': FIXED[tokens.LBRACE],
+    ']': FIXED[tokens.RBRACKET],
+    '[': FIXED[tokens.LBRACKET],
+    ')': FIXED[tokens.RPARAN],
+    '(': FIXED[tokens.LPARAN],
+    ',': FIXED[tokens.COMMA],
+    ':': FIXED[tokens.COLON],
+    ';': FIXED[tokens.SEMICOLON],
+    '<': FIXED[tokens.LT],
+    '>': FIXED[tokens.GT],
 }
 
 DOUBLE_CHAR_TOKENS = {
-    '==': tokens.EQ,
-    '!=': tokens.NEQ,
-    '>=': tokens.GTE,
-    '<=': tokens.LTE,
+    '==': FIXED[tokens.EQ],
+    '!=': FIXED[tokens.NEQ],
+    '>=': FIXED[tokens.GTE],
+    '<=': FIXED[tokens.LTE],
+    '#[': FIXED[tokens.VECTOR_START],
+    '#{': FIXED[tokens.MAP_START],
 }
 
+IDENT_CHARS = string.ascii_letters + '_'
+
 class Lexer:
 
     def __init__(self, source):
@@ -67,7 +78,7 @@ class Lexer:
 
     def read_string(self):
         pos = self.position
-        while self.next_char in string.ascii_letters+'_':
+        while self.next_char in IDENT_CHARS:
             self.step()
         
         return self.source[pos:self.position+1]
@@ -84,26 +95,27 @@ class Lexer:
 
     def next_token(self):
         self.skip_whitespace()
+        offset = self.position
         
         if self.current_char+self.next_char in DOUBLE_CHAR_TOKENS:
-            token = DOUBLE_CHAR_TOKENS[self.current_char+self.next_char]()
+            token = DOUBLE_CHAR_TOKENS[self.current_char+self.next_char]
             self.step()
 
         elif self.current_char in SINGLE_CHAR_TOKENS:
-            token = SINGLE_CHAR_TOKENS[self.current_char]()
+            token = SINGLE_CHAR_TOKENS[self.current_char]
 
         elif self.current_char in string.digits:
             num = self.read_number()
-            token = tokens.INT(num)
+            token = tokens.Token(tokens.INT, num, offset)
         
-        elif self.current_char in string.ascii_letters + '_':
+        elif self.current_char in IDENT_CHARS:
             string_ = self.read_string()
             if string_ in KEYWORDS:
-                token = KEYWORDS[string_]()
+                token = KEYWORDS[string_]
             else:
-                token = tokens.IDENT(string_)
+                token = tokens.Token(tokens.IDENT, string_, offset)
         else:
-            token = tokens.ILLEGAL(self.current_char)
+            token = tokens.Token(tokens.ILLEGAL, self.current_char, offset)
 
         self.step()
 
@@ -115,12 +127,53 @@ class Lexer:
         while True:
             t = self.next_token()
             toks.append(t)
-            if isinstance(t, tokens.EOF):
+            if t.kind == tokens.EOF:
                 break
         
         return toks
 
-def tokenize(source):
-    l = Lexer(source)
+# Single pass tokenizer, one master regex reproduces `Lexer.next_token`:
+# leading whitespace is skipped, then the first alternative that matches wins
+TOKEN_PATTERN = re.compile(r"""
+    [ \t\n\r\x0b\x0c]*
+    (?:
+        (?P<int>[0-9]+)
+      | (?P<name>[A-Za-z_]+)
+      | (?P<op>==|!=|>=|<=|\#\[|\#\{|[=+\-*/{}(),;:<>\[\]])
+      | (?P<eof>\0|\Z)
+      | (?P<illegal>.)
+    )""", re.VERBOSE | re.DOTALL)
+
+OPERATOR_TOKENS = {**SINGLE_CHAR_TOKENS, **DOUBLE_CHAR_TOKENS}
+
+
+def tokenize_iter(source):
+    """Yields the same tokens as `Lexer.scan`, up to and including EOF"""
+    keywords = KEYWORDS
+    operators = OPERATOR_TOKENS
+    Token = tokens.Token
+    INT = tokens.INT
+    IDENT = tokens.IDENT
+
+    # Group numbers of TOKEN_PATTERN: 1 int, 2 name, 3 op, 4 eof, 5 illegal
+    for match in TOKEN_PATTERN.finditer(source):
+        group = match.lastindex
+        if group == 2:
+            text = match.group(2)
+            if text in keywords:
+                yield keywords[text]
+            else:
+                yield Token(IDENT, text, match.start(2))
+        elif group == 3:
+            yield operators[match.group(3)]
+        elif group == 1:
+            yield Token(INT, match.group(1), match.start(1))
+        elif group == 4:
+            yield FIXED[tokens.EOF]
+            return
+        else:
+            yield Token(tokens.ILLEGAL, match.group(5), match.start(5))
+
 
-    return l.scan()
\ No newline at end of file
+def tokenize(source):
+    return list(tokenize_iter(source))
\ No newline at end of file
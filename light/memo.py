@@ -0,0 +1,124 @@
+"""
+The `memo` engine, the tree walking evaluator with memoized pure functions.
+
+Every pure function (see `purity.py`) gets its own LRU table mapping
+argument tuples to results. A table is only used while the names the
+function depends on are still bound to the values seen when it was
+created, rebinding one of them empties the table.
+"""
+from collections import OrderedDict
+
+from . import objects
+from .evaluator import Evaluator
+from .purity import binding_guards
+
+# Default number of results kept per function
+MEMO_SIZE = 1024
+
+_MISSING = object()
+
+
+class MemoTable:
+    """Bounded LRU table of the results of one function"""
+
+    def __init__(self, maxsize, guards):
+        self.maxsize = maxsize
+        self.guards = guards
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._results = OrderedDict()
+
+    def valid(self):
+        for env, ident, value in self.guards:
+            if env.get(ident) is not value:
+                return False
+
+        return True
+
+    def get(self, key):
+        try:
+            result = self._results[key]
+        except KeyError:
+            self.misses += 1
+            return _MISSING
+
+        self.hits += 1
+        self._results.move_to_end(key)
+
+        return result
+
+    def put(self, key, result):
+        self._results[key] = result
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._results.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._results),
+            'maxsize': self.maxsize,
+        }
+
+
+class MemoizingEvaluator(Evaluator):
+    def __init__(self, maxsize=None):
+        super().__init__()
+        self.maxsize = MEMO_SIZE if maxsize is None else maxsize
+
+    def memo_table(self, func):
+        table = func.memo
+        if table is False:
+            return None
+
+        if table is None:
+            guards = binding_guards(func)
+            if guards is None:
+                func.memo = False
+                return None
+            table = func.memo = MemoTable(self.maxsize, guards)
+        elif not table.valid():
+            # A name the function depends on was rebound
+            table.clear()
+            table.guards = binding_guards(func)
+            if table.guards is None:
+                func.memo = False
+                return None
+
+        return table
+
+    def apply(self, func, values):
+        table = self.memo_table(func)
+        if table is None:
+            return super().apply(func, values)
+
+        key = tuple(values)
+        try:
+            result = table.get(key)
+        except TypeError:
+            # Unhashable argument
+            return super().apply(func, values)
+
+        if result is _MISSING:
+            result = super().apply(func, values)
+            table.put(key, result)
+
+        return result
+
+
+def memo_stats(env):
+    """Statistics of the memo tables of the functions bound in `env`, by name"""
+    stats = {}
+    while env is not None:
+        for name, value in env._table.items():
+            if name not in stats and isinstance(value, objects.Function) and value.memo:
+                stats[name] = value.memo.stats()
+        env = env.parent
+
+    return stats
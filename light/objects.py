@@ -1,9 +1,12 @@
 class Integer(int):
-    def __init__(self, value):
-        self.value = value
+    """
+    Light integer. Evaluators may also use plain ints, which behave the
+    same, `box` turns them into Integers where a Light object is expected.
+    """
+    __slots__ = ()
 
     def __str__(self):
-        return str(self.value)
+        return int.__repr__(self)
 
 
 class Boolean:
@@ -26,6 +29,101 @@ class String:
         return str(self.value)
 
 
+class Array:
+    """
+    Immutable sequence of Light values. `values` is a list of them, or a
+    NumPy array of the integers or booleans, see `arrays.py`.
+    """
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = values
+
+    def elements(self):
+        """The elements as Light values"""
+        values = self.values
+        if type(values) is list:
+            return values
+
+        return [to_object(value) for value in values.tolist()]
+
+    def __str__(self):
+        return f"[{', '.join(str(element) for element in self.elements())}]"
+
+
+class Vector:
+    """
+    Persistent sequence of Light values, a trie of `root` lists `shift` bits
+    high holding all but the last elements, which are in `tail`. Updates
+    share the trie, see `persistent.py`.
+    """
+    __slots__ = ('count', 'shift', 'root', 'tail', 'hash')
+
+    def __init__(self, count, shift, root, tail):
+        self.count = count
+        self.shift = shift
+        self.root = root
+        self.tail = tail
+        # Computed on first use, vectors can be map keys and memo arguments
+        self.hash = None
+
+    def elements(self):
+        """The elements as a list"""
+        # Every level of the trie takes 5 bits, the bottom one holds the leaves
+        nodes = self.root
+        for _ in range(self.shift // 5 - 1):
+            nodes = [child for node in nodes for child in node]
+
+        return [element for leaf in nodes for element in leaf] + self.tail
+
+    def __eq__(self, other):
+        if type(other) is not Vector:
+            return NotImplemented
+
+        return self.count == other.count and self.elements() == other.elements()
+
+    def __hash__(self):
+        if self.hash is None:
+            self.hash = hash(tuple(self.elements()))
+
+        return self.hash
+
+    def __str__(self):
+        return f"#[{', '.join(str(element) for element in self.elements())}]"
+
+
+class Map:
+    """
+    Persistent map from Light values to Light values, a hash array mapped
+    trie of `count` entries under `root`, see `persistent.py`.
+    """
+    __slots__ = ('count', 'root', 'hash')
+
+    def __init__(self, count, root):
+        self.count = count
+        self.root = root
+        self.hash = None
+
+    def items(self):
+        """The `(key, value)` pairs, in the order of the trie"""
+        return [(key, value) for _, key, value in self.root.entries()]
+
+    def __eq__(self, other):
+        if type(other) is not Map:
+            return NotImplemented
+
+        return self.count == other.count and dict(self.items()) == dict(other.items())
+
+    def __hash__(self):
+        if self.hash is None:
+            self.hash = hash(frozenset(self.items()))
+
+        return self.hash
+
+    def __str__(self):
+        return f"#{{{', '.join(f'{key}: {value}' for key, value in self.items())}}}"
+
+
 class Returned:
     def __init__(self, obj):
         self.obj = obj
@@ -34,11 +132,77 @@ class Returned:
         return f"Returned({str(self.obj)})"
 
 
+class TailCall(Returned):
+    """A `return f(...)` whose call is left to the caller's trampoline"""
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return f"TailCall({repr(self.func)}, {repr(self.args)})"
+
+
 class Function:
-    def __init__(self, params, body, closure):
+    def __init__(self, params, body, closure, code=None):
         self.params = params
         self.body = body
         self.closure = closure
+        # Bytecode of the body, filled in by the compiler for the VM
+        self.code = code
+        # Python closure of the body, filled in by the closure compiler
+        self.compiled = None
+        # Table of cached results used by the memo engine, False if impure
+        self.memo = None
+        # Invocations and compiled entry point of the jit engine, False if
+        # the body can't be compiled
+        self.calls = 0
+        self.jitted = None
 
     def __repr__(self):
         return f"{repr(self.params)}"
+
+
+class Builtin:
+    """
+    Function implemented in Python. `func(call, *args)` receives the engine's
+    `call(func, values)` along with the arguments, to call back into Light.
+    """
+    __slots__ = ('name', 'func', 'arity', 'pure')
+
+    def __init__(self, name, func, arity=None, pure=True):
+        self.name = name
+        self.func = func
+        # Accepted numbers of arguments, None for any
+        self.arity = arity
+        # Whether the result only depends on the arguments, see `purity.py`
+        self.pure = pure
+
+    def invoke(self, call, values):
+        if self.arity is not None and len(values) not in self.arity:
+            expected = ' or '.join(str(n) for n in self.arity)
+            raise ValueError(
+                f"Number of arguments passed {len(values)} != number of parameters {expected} of `{self.name}`")
+
+        return self.func(call, *values)
+
+    def __repr__(self):
+        return f"<builtin {self.name}>"
+
+
+def box(value):
+    if type(value) is int:
+        return Integer(value)
+
+    return value
+
+
+def to_object(value):
+    """Converts a Python value to the matching Light object"""
+    if isinstance(value, bool):
+        return TRUE if value else FALSE
+    if isinstance(value, int) and not isinstance(value, Integer):
+        return Integer(value)
+    if isinstance(value, str):
+        return String(value)
+
+    return value
@@ -0,0 +1,468 @@
+from collections import Counter
+
+from . import ast
+from . import objects
+from . import tokens
+from .builtins import BUILTINS
+from .evaluator import BINARY_FUNCS
+from .purity import is_pure
+
+# Largest function body, in AST nodes, that gets inlined at call sites
+INLINE_THRESHOLD = 16
+
+ARITHMETIC = (tokens.PLUS, tokens.MINUS, tokens.ASTERISK, tokens.SLASH)
+ORDERING = (tokens.GT, tokens.LT, tokens.GTE, tokens.LTE)
+
+
+def count_nodes(node):
+    return sum(1 for _ in ast.walk(node))
+
+
+def constant_value(node):
+    """The Light object a literal node evaluates to, None for other nodes"""
+    if isinstance(node, ast.IntLiteral):
+        return objects.Integer(int(node.literal))
+    if isinstance(node, ast.BoolLiteral):
+        return objects.TRUE if node.literal == 'true' else objects.FALSE
+
+    return None
+
+
+def literal_node(value):
+    if isinstance(value, objects.Boolean):
+        kind = tokens.TRUE if value is objects.TRUE else tokens.FALSE
+        return ast.BoolLiteral(tokens.FIXED_TOKENS[kind])
+
+    return ast.IntLiteral(tokens.Token(tokens.INT, str(int(value))))
+
+
+def is_int_valued(node):
+    """
+    Whether node evaluates to an Integer, or an array of them, whenever it
+    evaluates at all. Identities like `x + 0 -> x` are only safe for such
+    operands, for a Boolean `x` the original expression raises a TypeError.
+    """
+    if isinstance(node, ast.IntLiteral):
+        return True
+    if isinstance(node, ast.BinaryOp):
+        return node.op.kind in ARITHMETIC
+    if isinstance(node, ast.PrefixOp):
+        return node.op.kind == tokens.MINUS
+
+    return False
+
+
+def is_zero(node):
+    return isinstance(node, ast.IntLiteral) and int(node.literal) == 0
+
+
+def is_one(node):
+    return isinstance(node, ast.IntLiteral) and int(node.literal) == 1
+
+
+def has_no_effects(node, shadowed):
+    """
+    Whether evaluating `node` can't have effects other than computing its
+    value, so it may run at another point of the evaluation. It may only
+    call pure builtins, whose names aren't in `shadowed`.
+    """
+    if not is_pure([], node):
+        return False
+
+    for sub_node in ast.walk(node):
+        if isinstance(sub_node, ast.FunctionCall):
+            builtin = BUILTINS.get(sub_node.name)
+            if builtin is None or not builtin.pure or sub_node.name in shadowed:
+                return False
+
+    return True
+
+
+def evaluation_order(node):
+    """Yields the nodes of an expression in the order they are read or computed"""
+    for child in ast.children(node):
+        yield from evaluation_order(child)
+    yield node
+
+
+def copy_expr(node, substitutions):
+    """
+    Copies an expression made of literals, identifiers, operators, calls and arrays,
+    replacing identifiers named in `substitutions` by the given expressions.
+    """
+    if isinstance(node, ast.Identifier):
+        if node.literal not in substitutions:
+            return ast.Identifier(node.ident)
+
+        arg = substitutions[node.literal]
+        if isinstance(arg, (ast.IntLiteral, ast.BoolLiteral, ast.Identifier)):
+            return copy_expr(arg, {})
+        # Other arguments are only substituted for parameters used once
+        return arg
+    if isinstance(node, ast.IntLiteral):
+        return ast.IntLiteral(node.token)
+    if isinstance(node, ast.BoolLiteral):
+        return ast.BoolLiteral(node.token)
+    if isinstance(node, ast.BinaryOp):
+        return ast.BinaryOp(node.op, copy_expr(node.left, substitutions),
+                            copy_expr(node.right, substitutions))
+    if isinstance(node, ast.PrefixOp):
+        return ast.PrefixOp(node.op, copy_expr(node.right, substitutions))
+    if isinstance(node, ast.FunctionCall):
+        return ast.FunctionCall(copy_expr(node.ident, substitutions),
+                                [copy_expr(arg, substitutions) for arg in node.args])
+    if isinstance(node, ast.COLLECTION_LITERALS):
+        return type(node)([copy_expr(element, substitutions) for element in node.elements])
+    if isinstance(node, ast.Index):
+        return ast.Index(copy_expr(node.left, substitutions), copy_expr(node.index, substitutions))
+
+    raise TypeError(f"Can't copy {node}")
+
+
+class InlineCandidate:
+    """A function whose body is a single `return <expr>` small enough to inline"""
+
+    def __init__(self, name, params, expr):
+        self.name = name
+        self.params = params
+        self.expr = expr
+        self.uses = Counter(
+            node.literal for node in ast.walk(expr) if isinstance(node, ast.Identifier))
+        # Parameters used as a call target only accept identifiers as arguments
+        self.callees = {
+            node.name for node in ast.walk(expr) if isinstance(node, ast.FunctionCall)}
+
+    @classmethod
+    def from_literal(cls, name, literal):
+        params = [param.literal for param in literal.params if isinstance(param, ast.Identifier)]
+        if len(params) != len(literal.params) or len(set(params)) != len(params):
+            return None
+
+        statements = literal.body.statements
+        if len(statements) != 1 or not isinstance(statements[0], ast.Return):
+            return None
+
+        expr = statements[0].expr
+        size = 0
+        for node in ast.walk(expr):
+            if isinstance(node, ast.FunctionLiteral):
+                return None
+            size += 1
+        if size > INLINE_THRESHOLD:
+            return None
+
+        return cls(name, params, expr)
+
+    def free_names(self):
+        return set(self.uses) - set(self.params)
+
+    def expand(self, call, rebound=(), shadowed=(), bound=()):
+        """
+        The expression replacing `call`, None if the arguments don't allow
+        inlining. `rebound` are the names that `name = expr` assigns to,
+        `shadowed` the names bound anywhere in the program and `bound` the
+        global names certainly bound where the call runs.
+        """
+        if len(call.args) != len(self.params):
+            return None
+
+        substitutions = {}
+        # Parameters whose arguments may raise, in the order of the arguments
+        ordered = []
+        for param, arg in zip(self.params, call.args):
+            uses = self.uses[param]
+            if isinstance(arg, (ast.IntLiteral, ast.BoolLiteral)):
+                pass
+            elif isinstance(arg, ast.Identifier) and arg.literal not in rebound:
+                if arg.literal not in bound:
+                    ordered.append(param)
+            elif rebound:
+                # Calls may rebind names, so the arguments must keep being
+                # evaluated before the body
+                return None
+            elif uses != 1:
+                # Every argument must still be evaluated exactly once
+                return None
+            elif not has_no_effects(arg, shadowed):
+                # The body evaluates it at its use, after the arguments
+                # before it and whatever the body calls first
+                return None
+            else:
+                ordered.append(param)
+
+            if param in self.callees and param in ordered:
+                # Engines differ in when they look up the callee
+                return None
+            substitutions[param] = arg
+
+        if not self.keeps_order(ordered, bound):
+            return None
+
+        return copy_expr(self.expr, substitutions)
+
+    def keeps_order(self, ordered, bound):
+        """
+        Whether the body evaluates the arguments of the `ordered` parameters
+        in their order, before anything else that may raise. The first
+        error is then the one the call would raise.
+        """
+        pending = list(ordered)
+        for node in evaluation_order(self.expr):
+            if not pending:
+                return True
+            if isinstance(node, (ast.IntLiteral, ast.BoolLiteral)):
+                continue
+            if isinstance(node, ast.Identifier):
+                name = node.literal
+                if name == pending[0]:
+                    pending.pop(0)
+                    continue
+                if name in self.params and name not in pending:
+                    continue
+                if name not in self.params and name in bound:
+                    continue
+            return False
+
+        # An unused argument that may raise can't be dropped
+        return not pending
+
+
+class Inliner:
+    """
+    Inlines calls to small non-recursive functions.
+
+    Only functions bound by a top level `let` that is the single binding of
+    their name anywhere in the program are considered, and only calls in
+    the statements after that `let`. The names used by the body must not be
+    bound as locals anywhere, so they resolve to the same globals at every
+    call site. Arguments other than literals and names are only substituted
+    when evaluating them has no effects, and arguments that may raise only
+    when the body still evaluates them in order before anything else that
+    may raise, so nothing observable changes order.
+    The definition itself is kept for calls that aren't inlined and for uses
+    of the function as a value.
+    """
+
+    def __init__(self):
+        self.inlined = 0
+        self.candidates = {}
+        self.rebound = set()
+        self.shadowed = set()
+        # Global names bound before the statement being inlined runs
+        self.bound = set()
+
+    def inline_program(self, program):
+        bindings = Counter()
+        local_names = set()
+        for node in ast.walk(program):
+            if isinstance(node, ast.Reassignment):
+                bindings[node.ident.literal] += 1
+                self.rebound.add(node.ident.literal)
+            elif isinstance(node, ast.Assignment):
+                bindings[node.ident.literal] += 1
+            elif isinstance(node, ast.FunctionLiteral):
+                local_names.update(
+                    param.literal for param in node.params if isinstance(param, ast.Identifier))
+                local_names.update(
+                    sub_node.ident.literal for sub_node in ast.walk(node.body)
+                    if isinstance(sub_node, ast.Assignment))
+
+        self.shadowed = set(bindings) | local_names
+        self.bound = set(BUILTINS) - local_names
+
+        statements = program.statements
+        for i, stmt in enumerate(statements):
+            stmt = statements[i] = self.inline(stmt)
+            if isinstance(stmt, ast.Assignment) and stmt.ident.literal not in local_names:
+                self.bound.add(stmt.ident.literal)
+            if not (isinstance(stmt, ast.Assignment) and isinstance(stmt.expr, ast.FunctionLiteral)):
+                continue
+
+            name = stmt.ident.literal
+            if bindings[name] != 1 or name in local_names:
+                continue
+            candidate = InlineCandidate.from_literal(name, stmt.expr)
+            if candidate is None:
+                continue
+            free_names = candidate.free_names()
+            if name not in free_names and not free_names & local_names:
+                self.candidates[name] = candidate
+
+        return program
+
+    def inline(self, ast_node):
+        if isinstance(ast_node, (ast.Assignment, ast.Reassignment, ast.Return)):
+            ast_node.expr = self.inline(ast_node.expr)
+        elif isinstance(ast_node, ast.Conditional):
+            ast_node.cond = self.inline(ast_node.cond)
+            self.inline(ast_node.cons)
+            if ast_node.alt is not None:
+                self.inline(ast_node.alt)
+        elif isinstance(ast_node, ast.While):
+            ast_node.cond = self.inline(ast_node.cond)
+            self.inline(ast_node.body)
+        elif isinstance(ast_node, ast.Block):
+            ast_node.statements = [self.inline(stmt) for stmt in ast_node.statements]
+        elif isinstance(ast_node, ast.BinaryOp):
+            ast_node.left = self.inline(ast_node.left)
+            ast_node.right = self.inline(ast_node.right)
+        elif isinstance(ast_node, ast.PrefixOp):
+            ast_node.right = self.inline(ast_node.right)
+        elif isinstance(ast_node, ast.COLLECTION_LITERALS):
+            ast_node.elements = [self.inline(element) for element in ast_node.elements]
+        elif isinstance(ast_node, ast.Index):
+            ast_node.left = self.inline(ast_node.left)
+            ast_node.index = self.inline(ast_node.index)
+        elif isinstance(ast_node, ast.FunctionLiteral):
+            self.inline(ast_node.body)
+        elif isinstance(ast_node, ast.FunctionCall):
+            ast_node.args = [self.inline(arg) for arg in ast_node.args]
+            candidate = self.candidates.get(ast_node.name)
+            if candidate is not None:
+                expr = candidate.expand(ast_node, self.rebound, self.shadowed, self.bound)
+                if expr is not None:
+                    self.inlined += 1
+                    return expr
+
+        return ast_node
+
+
+class Optimizer:
+    """
+    Function inlining, constant folding and algebraic simplification.
+
+    Folds operators over int and bool literals exactly as the evaluator
+    would compute them, leaving anything that raises at run time (division
+    by zero, arithmetic on booleans) alone. Conditionals whose condition
+    folds to a literal are replaced by the branch that would run, loops
+    whose condition folds to `false` are dropped.
+    """
+
+    def __init__(self):
+        self.eliminated = 0
+        self.inlined = 0
+
+    def optimize_program(self, program):
+        before = count_nodes(program)
+        inliner = Inliner()
+        inliner.inline_program(program)
+        self.inlined += inliner.inlined
+        program.statements = [self.optimize(stmt) for stmt in program.statements]
+        self.eliminated += before - count_nodes(program)
+
+        return program
+
+    def optimize(self, ast_node):
+        if isinstance(ast_node, (ast.Assignment, ast.Reassignment)):
+            ast_node.expr = self.optimize(ast_node.expr)
+        elif isinstance(ast_node, ast.Return):
+            ast_node.expr = self.optimize(ast_node.expr)
+        elif isinstance(ast_node, ast.Conditional):
+            return self.optimize_conditional(ast_node)
+        elif isinstance(ast_node, ast.While):
+            return self.optimize_while(ast_node)
+        elif isinstance(ast_node, ast.Block):
+            ast_node.statements = [self.optimize(stmt) for stmt in ast_node.statements]
+        elif isinstance(ast_node, ast.BinaryOp):
+            return self.optimize_binary_op(ast_node)
+        elif isinstance(ast_node, ast.PrefixOp):
+            return self.optimize_prefix_op(ast_node)
+        elif isinstance(ast_node, ast.FunctionCall):
+            ast_node.args = [self.optimize(arg) for arg in ast_node.args]
+        elif isinstance(ast_node, ast.COLLECTION_LITERALS):
+            ast_node.elements = [self.optimize(element) for element in ast_node.elements]
+        elif isinstance(ast_node, ast.Index):
+            ast_node.left = self.optimize(ast_node.left)
+            ast_node.index = self.optimize(ast_node.index)
+        elif isinstance(ast_node, ast.FunctionLiteral):
+            self.optimize(ast_node.body)
+
+        return ast_node
+
+    def optimize_conditional(self, ast_node):
+        cond = ast_node.cond = self.optimize(ast_node.cond)
+        cons = ast_node.cons = self.optimize(ast_node.cons)
+        alt = ast_node.alt = self.optimize(ast_node.alt) if ast_node.alt is not None else None
+
+        value = constant_value(cond)
+        if value is None:
+            return ast_node
+
+        # The branches run in the enclosing environment, so a block statement
+        # behaves exactly like the conditional did
+        if value is objects.TRUE:
+            return cons
+        if alt is not None:
+            return alt
+
+        return ast.Block([])
+
+    def optimize_while(self, ast_node):
+        cond = ast_node.cond = self.optimize(ast_node.cond)
+        ast_node.body = self.optimize(ast_node.body)
+
+        if constant_value(cond) is objects.FALSE:
+            return ast.Block([])
+
+        return ast_node
+
+    def optimize_prefix_op(self, ast_node):
+        right = ast_node.right = self.optimize(ast_node.right)
+        if ast_node.op.kind != tokens.MINUS:
+            return ast_node
+
+        if isinstance(right, ast.IntLiteral):
+            return literal_node(-int(right.literal))
+        if isinstance(right, ast.PrefixOp) and right.op.kind == tokens.MINUS \
+                and is_int_valued(right.right):
+            return right.right
+
+        return ast_node
+
+    def optimize_binary_op(self, ast_node):
+        left = ast_node.left = self.optimize(ast_node.left)
+        right = ast_node.right = self.optimize(ast_node.right)
+        kind = ast_node.op.kind
+
+        folded = self.fold(kind, constant_value(left), constant_value(right))
+        if folded is not None:
+            return literal_node(folded)
+
+        if kind == tokens.PLUS:
+            if is_zero(right) and is_int_valued(left):
+                return left
+            if is_zero(left) and is_int_valued(right):
+                return right
+        elif kind == tokens.MINUS:
+            if is_zero(right) and is_int_valued(left):
+                return left
+        elif kind == tokens.ASTERISK:
+            if is_one(right) and is_int_valued(left):
+                return left
+            if is_one(left) and is_int_valued(right):
+                return right
+        # `x / 1` is no identity, the quotient goes through a float which
+        # rounds integers from 2 ** 53 up
+
+        return ast_node
+
+    def fold(self, kind, left, right):
+        if left is None or right is None:
+            return None
+
+        both_ints = isinstance(left, int) and isinstance(right, int)
+        if kind in ARITHMETIC or kind in ORDERING:
+            if not both_ints:
+                return None
+            if kind == tokens.SLASH and right == 0:
+                return None
+
+        return BINARY_FUNCS[kind](left, right)
+
+
+def optimize_program(program):
+    """Optimizes `program` in place, returns it and the number of eliminated nodes"""
+    optimizer = Optimizer()
+    optimizer.optimize_program(program)
+
+    return program, optimizer.eliminated
@@ -1,29 +1,52 @@
-import ast
-import tokens
+
+from . import ast
+from . import tokens
+from .lexer import tokenize_iter
 
 class ParserError(Exception): pass
 
 
+# Size of the token window kept by the parser, a power of two. The parser
+# never looks more than one token behind or ahead of its position
+LOOKAHEAD = 4
+LOOKAHEAD_MASK = LOOKAHEAD - 1
+
+
 class Parser:
+    """
+    Parses any iterable of tokens, e.g. the `lexer.tokenize_iter` generator.
+
+    Tokens are pulled on demand into a small ring buffer, so the full token
+    stream never has to be held in memory.
+    """
 
     def __init__(self, tokens):
-        self.tokens = tokens
+        self.tokens = iter(tokens)
         self.position = 0
-        self.tokens = tokens
+        self._ring = [None] * LOOKAHEAD
+        self._fetched = 0
+
+    def token_at(self, position):
+        if position >= self._fetched:
+            ring = self._ring
+            while self._fetched <= position:
+                try:
+                    ring[self._fetched & LOOKAHEAD_MASK] = next(self.tokens)
+                except StopIteration:
+                    raise ParserError("Reached EOF while parsing")
+                self._fetched += 1
+        elif position < 0 or position <= self._fetched - LOOKAHEAD:
+            raise ParserError(f"Token {position} is outside of the lookahead window")
+
+        return self._ring[position & LOOKAHEAD_MASK]
 
     @property
     def current(self):
-        try:
-            return self.tokens[self.position]
-        except IndexError:
-            raise ParserError("Reached EOF while parsing")
+        return self.token_at(self.position)
 
     @property
     def next(self):
-        try:
-            return self.tokens[self.position+1]
-        except IndexError:
-            raise ParserError("Reached EOF while parsing")
+        return self.token_at(self.position + 1)
 
     def step(self, n=1):
         self.position += n
@@ -37,35 +60,31 @@ class Parser:
 
     def parse_program(self):
         statements = []
-        while not isinstance(self.current, tokens.EOF):
-            if isinstance(self.current, tokens.SEMICOLON):
+        while self.current.kind != tokens.EOF:
+            if self.current.kind == tokens.SEMICOLON:
                 self.step()
                 continue
-            if isinstance(self.current, tokens.LET):
-                stmt = self.parse_let()
-            elif isinstance(self.current, tokens.FUNC):
-                stmt = self.parse_function_literal()
-            elif isinstance(self.current, tokens.RETURN):
-                stmt = self.parse_return()
-            elif isinstance(self.current, tokens.IF):
-                stmt = self.parse_conditional()
-            elif isinstance(self.current, tokens.LBRACE):
-                stmt = self.parse_block()
-            else:
-                stmt = self.parse_expr()
-
-            statements.append(stmt)
+
+            statements.append(self.parse_statement())
 
         return ast.Program(statements)
 
+    def parse_statement(self):
+        parse = self.STATEMENTS.get(self.current.kind)
+        if parse is None:
+            if self.current.kind == tokens.IDENT and self.next.kind == tokens.ASSIGN:
+                return self.parse_reassignment()
+            return self.parse_expr()
+
+        return parse(self)
+
     def parse_let(self):
-        tok = self.current
         self.step()
-        if not isinstance(self.current, tokens.IDENT):
+        if self.current.kind != tokens.IDENT:
             raise ParserError(f"Expected identifer after `let` keyword, found {self.current}")
         ident = self.parse_identifier()
 
-        if not isinstance(self.current, tokens.ASSIGN):
+        if self.current.kind != tokens.ASSIGN:
             raise ParserError(f"Expected `=` after identifier keyword, found {self.current}")
         
         self.step()
@@ -74,6 +93,13 @@ class Parser:
         return ast.Assignment(ident, expr)
         
 
+    def parse_reassignment(self):
+        ident = self.parse_identifier()
+        self.step()
+        expr = self.parse_expr()
+
+        return ast.Reassignment(ident, expr)
+
     def parse_return(self):
         self.step()
         expr = self.parse_expr()
@@ -86,12 +112,19 @@ class Parser:
         cond = self.parse_expr()
         cons = self.parse_block()
         alt = None
-        if isinstance(self.current, tokens.ELSE):
+        if self.current.kind == tokens.ELSE:
             self.step()
             alt = self.parse_block()
         
         return ast.Conditional(cond, cons, alt)
 
+    def parse_while(self):
+        self.step()
+        cond = self.parse_expr()
+        body = self.parse_block()
+
+        return ast.While(cond, body)
+
     def parse_identifier(self):
         ident = self.current
         self.step()
@@ -100,48 +133,36 @@ class Parser:
     def parse_function_call(self):
         ident = self.parse_identifier()
 
-        if not isinstance(self.current, tokens.LPARAN):
+        if self.current.kind != tokens.LPARAN:
             raise ParserError(f"Expected `(` after function name, found {self.current}")
         
-        if isinstance(self.read_char(), tokens.RPARAN):
+        if self.read_char().kind == tokens.RPARAN:
             return ast.FunctionCall(ident, [])
 
         args = []
         while True:
-            if isinstance(self.current, tokens.RPARAN):
+            if self.current.kind == tokens.RPARAN:
                 break
             args.append(self.parse_expr())
 
-            if isinstance(self.current, tokens.COMMA):
+            if self.current.kind == tokens.COMMA:
                 self.step()
 
         return ast.FunctionCall(ident, args)
 
     def parse_block(self):
-        if not isinstance(self.current, tokens.LBRACE):
+        if self.current.kind != tokens.LBRACE:
             raise ParserError(f"Expected {'{'} after function, found `{self.current}`")
         self.step()
         statements = []
-        while not isinstance(self.current, tokens.EOF):
-            if isinstance(self.current, tokens.SEMICOLON):
+        while self.current.kind != tokens.EOF:
+            if self.current.kind == tokens.SEMICOLON:
                 self.step()
                 continue
-            if isinstance(self.current, tokens.LET):
-                stmt = self.parse_let()
-            elif isinstance(self.current, tokens.FUNC):
-                stmt = self.parse_function_literal()
-            elif isinstance(self.current, tokens.RETURN):
-                stmt = self.parse_return()
-            elif isinstance(self.current, tokens.IF):
-                stmt = self.parse_conditional()
-            elif isinstance(self.current, tokens.LBRACE):
-                stmt = self.parse_block()
-            elif isinstance(self.current, tokens.RBRACE):
+            if self.current.kind == tokens.RBRACE:
                 break
-            else:
-                stmt = self.parse_expr()
 
-            statements.append(stmt)
+            statements.append(self.parse_statement())
         
         self.step()
         
@@ -149,19 +170,17 @@ class Parser:
 
     def parse_function_literal(self):
         self.step()
-        if not isinstance(self.current, tokens.LPARAN):
+        if self.current.kind != tokens.LPARAN:
             raise ParserError(f"Expected `(` after function name, found {self.current}")
         
-        if isinstance(self.read_char(), tokens.RPARAN):
-            return ast.FunctionCall(ident, [])
-
+        self.step()
         params = []
         while True:
-            if isinstance(self.current, tokens.RPARAN):
+            if self.current.kind == tokens.RPARAN:
                 break
             params.append(self.parse_expr())
 
-            if isinstance(self.current, tokens.COMMA):
+            if self.current.kind == tokens.COMMA:
                 self.step()
 
         self.step()
@@ -178,67 +197,160 @@ class Parser:
         return expr
 
     def expr(self, rbp=0):
+        binding_powers = BINDING_POWERS
         left = self.nud(self.read_char())
-        while self.bp(self.next) > rbp:
+        while binding_powers.get(self.next.kind, -1) > rbp:
             left = self.led(left, self.read_char())
         
         return left
 
-    def bp(self, token):
-        op = token.literal
-        if op in {'==', '!='}:
-            return 20
-        if op in {'>', '<', '<=', '>='}:
-            return 40
-        if op in {'+', '-'}:
-            return 50
-        if op in {'*', '/'}:
-            return 60
-        
-        return -1
-
     def nud(self, token):
-        if isinstance(token, tokens.IDENT):
-            if isinstance(self.next, tokens.LPARAN):
-                return self.parse_function_call()
-            else:
-                return ast.Identifier(token)
-        if isinstance(token, tokens.LPARAN):
-            e = self.expr()
-            if not isinstance(self.next, tokens.RPARAN):
-                raise ParserError(f"Expected `)` found {self.next}")
-            self.step()
-            return e
-        if isinstance(token, tokens.INT):
-            return ast.IntLiteral(token)
-        if isinstance(token, tokens.FUNC):
-            func = self.parse_function_literal()
-            self.step_back()
-            return func
-        if isinstance(token, (tokens.TRUE, tokens.FALSE)):
-            return ast.BoolLiteral(token)
-        if isinstance(token, tokens.MINUS):
-            return ast.PrefixOp(token, self.nud(self.read_char()))
-        else:
+        parse = self.PREFIX.get(token.kind)
+        if parse is None:
             raise ParserError(f"No prefix parse function found for {token}")
 
-    
+        return parse(self, token)
+
     def led(self, left, token):
-        # Cleaner code here
-        if isinstance(token, (tokens.PLUS, tokens.MINUS, tokens.ASTERISK, tokens.SLASH)):
-            return ast.BinaryOp(token, left , self.expr(self.bp(token)))
-        if isinstance(token, (tokens.EQ, tokens.NEQ, tokens.LT, tokens.GT, tokens.LTE, tokens.GTE)):
-            return ast.BinaryOp(token, left, self.expr(self.bp(token)))
-        else:
+        if token.kind not in BINDING_POWERS:
             raise ParserError(f"No infix parse function found for {token}")
 
+        parse = self.POSTFIX.get(token.kind)
+        if parse is not None:
+            return parse(self, left, token)
+
+        return ast.BinaryOp(token, left, self.expr(BINDING_POWERS[token.kind]))
+
+    def parse_ident_prefix(self, token):
+        if self.next.kind == tokens.LPARAN:
+            return self.parse_function_call()
+
+        return ast.Identifier(token)
+
+    def parse_grouped(self, token):
+        e = self.expr()
+        if self.next.kind != tokens.RPARAN:
+            raise ParserError(f"Expected `)` found {self.next}")
+        self.step()
+
+        return e
+
+    def parse_int(self, token):
+        return ast.IntLiteral(token)
+
+    def parse_bool(self, token):
+        return ast.BoolLiteral(token)
+
+    def parse_func_prefix(self, token):
+        func = self.parse_function_literal()
+        self.step_back()
+
+        return func
+
+    def parse_prefix_op(self, token):
+        # Binds tighter than the binary operators but not than indexing
+        return ast.PrefixOp(token, self.expr(PREFIX_BINDING_POWER))
+
+    def parse_elements(self, name):
+        """The comma separated expressions up to the `]` closing an array or a vector"""
+        self.step()
+        elements = []
+        while self.current.kind != tokens.RBRACKET:
+            elements.append(self.parse_expr())
+
+            if self.current.kind == tokens.COMMA:
+                self.step()
+            elif self.current.kind != tokens.RBRACKET:
+                raise ParserError(f"Expected `,` or `]` in {name}, found {self.current}")
+
+        return elements
+
+    def parse_array(self, token):
+        return ast.ArrayLiteral(self.parse_elements('array'))
+
+    def parse_vector(self, token):
+        return ast.VectorLiteral(self.parse_elements('vector'))
+
+    def parse_map(self, token):
+        self.step()
+        elements = []
+        while self.current.kind != tokens.RBRACE:
+            elements.append(self.parse_expr())
+            if self.current.kind != tokens.COLON:
+                raise ParserError(f"Expected `:` after map key, found {self.current}")
+            self.step()
+            elements.append(self.parse_expr())
+
+            if self.current.kind == tokens.COMMA:
+                self.step()
+            elif self.current.kind != tokens.RBRACE:
+                raise ParserError(f"Expected `,` or `}}` in map, found {self.current}")
+
+        return ast.MapLiteral(elements)
+
+    def parse_index(self, left, token):
+        self.step()
+        index = self.parse_expr()
+        if self.current.kind != tokens.RBRACKET:
+            raise ParserError(f"Expected `]` after index, found {self.current}")
+
+        return ast.Index(left, index)
+
+    # Dispatch tables keyed by token kind
+
+    STATEMENTS = {
+        tokens.LET: parse_let,
+        tokens.FUNC: parse_function_literal,
+        tokens.RETURN: parse_return,
+        tokens.IF: parse_conditional,
+        tokens.WHILE: parse_while,
+        tokens.LBRACE: parse_block,
+    }
+
+    PREFIX = {
+        tokens.IDENT: parse_ident_prefix,
+        tokens.LPARAN: parse_grouped,
+        tokens.INT: parse_int,
+        tokens.FUNC: parse_func_prefix,
+        tokens.TRUE: parse_bool,
+        tokens.FALSE: parse_bool,
+        tokens.MINUS: parse_prefix_op,
+        tokens.LBRACKET: parse_array,
+        tokens.VECTOR_START: parse_vector,
+        tokens.MAP_START: parse_map,
+    }
+
+    # Infix tokens that don't make a binary operator
+    POSTFIX = {
+        tokens.LBRACKET: parse_index,
+    }
+
+
+# Every token kind with a binding power and no POSTFIX parse function parses
+# as a left associative binary operator
+BINDING_POWERS = {
+    tokens.EQ: 20,
+    tokens.NEQ: 20,
+    tokens.GT: 40,
+    tokens.LT: 40,
+    tokens.GTE: 40,
+    tokens.LTE: 40,
+    tokens.PLUS: 50,
+    tokens.MINUS: 50,
+    tokens.ASTERISK: 60,
+    tokens.SLASH: 60,
+    tokens.LBRACKET: 70,
+}
+
+PREFIX_BINDING_POWER = 60
+
+
 def parse(tokens):
     p = Parser(tokens)
     return p.parse_program()
 
 def parse_source(source):
-    from lexer import tokenize
-    toks = tokenize(source)
+    toks = tokenize_iter(source)
 
     p = Parser(toks)
 
@@ -0,0 +1,344 @@
+"""
+Persistent vectors and maps, updated by copying only a path of a trie.
+
+An `objects.Vector` stores its elements in a trie of lists of up to 32
+children, the leaves holding the elements in order, except the last (up
+to 32) elements which are kept in `tail`. Appending copies the tail, and
+once every 32 elements also the path down to the new leaf. Replacing an
+element copies the path to its leaf. Both take O(log32 n) time and memory,
+the rest of the trie is shared with the vector it was built from.
+
+An `objects.Map` is a hash array mapped trie: every node covers 5 bits of
+the 32 bit hash of its keys and stores only the children it has, in a list
+indexed by the number of set bits of its `bitmap` below their position.
+Keys whose whole hashes are equal share a `CollisionNode`.
+"""
+from .objects import Map, Vector, box
+
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+HASH_MASK = 0xFFFFFFFF
+
+# Returned by `lookup` for missing keys and indices
+MISSING = object()
+
+
+def tail_offset(count):
+    """Index of the first element kept in the tail of a vector of `count` elements"""
+    if count < WIDTH:
+        return 0
+
+    return ((count - 1) >> BITS) << BITS
+
+
+def vector(values):
+    """Vector of the Light values `values`, built bottom up"""
+    values = [box(value) for value in values]
+    count = len(values)
+    start = tail_offset(count)
+
+    nodes = [values[i:i + WIDTH] for i in range(0, start, WIDTH)]
+    shift = BITS
+    while len(nodes) > WIDTH:
+        nodes = [nodes[i:i + WIDTH] for i in range(0, len(nodes), WIDTH)]
+        shift += BITS
+
+    return Vector(count, shift, nodes, values[start:])
+
+
+def nth(vec, i):
+    """The element `i` of `vec`, which must be in range"""
+    if i >= tail_offset(vec.count):
+        return vec.tail[i & MASK]
+
+    node = vec.root
+    level = vec.shift
+    while level > 0:
+        node = node[(i >> level) & MASK]
+        level -= BITS
+
+    return node[i & MASK]
+
+
+def new_path(level, node):
+    """`node` at the bottom of a chain of single child nodes `level` bits high"""
+    while level > 0:
+        node = [node]
+        level -= BITS
+
+    return node
+
+
+def push_tail(count, level, parent, tail):
+    """Copy of `parent` with the full `tail` of a vector of `count` elements added as a leaf"""
+    i = ((count - 1) >> level) & MASK
+    node = list(parent)
+    if level == BITS:
+        child = tail
+    elif i < len(parent):
+        child = push_tail(count, level - BITS, parent[i], tail)
+    else:
+        child = new_path(level - BITS, tail)
+
+    if i < len(node):
+        node[i] = child
+    else:
+        node.append(child)
+
+    return node
+
+
+def append(vec, value):
+    """`vec` with `value` appended"""
+    count = vec.count
+    value = box(value)
+    if count - tail_offset(count) < WIDTH:
+        return Vector(count + 1, vec.shift, vec.root, vec.tail + [value])
+
+    # The tail is full, it becomes a leaf and `value` starts a new one
+    shift = vec.shift
+    if (count >> BITS) > (1 << shift):
+        # The trie is full too, it grows a level
+        root = [vec.root, new_path(shift, vec.tail)]
+        shift += BITS
+    else:
+        root = push_tail(count, shift, vec.root, vec.tail)
+
+    return Vector(count + 1, shift, root, [value])
+
+
+def assoc_path(level, node, i, value):
+    node = list(node)
+    if level == 0:
+        node[i & MASK] = value
+    else:
+        child = (i >> level) & MASK
+        node[child] = assoc_path(level - BITS, node[child], i, value)
+
+    return node
+
+
+def assoc_index(vec, i, value):
+    """`vec` with the element `i` replaced by `value`, or appended when `i` is its length"""
+    count = vec.count
+    if i == count:
+        return append(vec, value)
+    if not 0 <= i < count:
+        raise ValueError(f"Index {i} is out of range of a vector of length {count}")
+
+    value = box(value)
+    if i >= tail_offset(count):
+        tail = list(vec.tail)
+        tail[i & MASK] = value
+        return Vector(count, vec.shift, vec.root, tail)
+
+    return Vector(count, vec.shift, assoc_path(vec.shift, vec.root, i, value), vec.tail)
+
+
+#
+# Hash array mapped trie
+#
+
+class BitmapNode:
+    """
+    Node of a map trie. `array` holds, for every set bit of `bitmap`, either
+    a `(hash, key, value)` entry or the node of the next 5 bits.
+    """
+    __slots__ = ('bitmap', 'array')
+
+    def __init__(self, bitmap, array):
+        self.bitmap = bitmap
+        self.array = array
+
+    def find(self, shift, hash_, key):
+        node = self
+        while True:
+            if type(node) is CollisionNode:
+                return node.find(shift, hash_, key)
+
+            bit = 1 << ((hash_ >> shift) & MASK)
+            if not node.bitmap & bit:
+                return MISSING
+            entry = node.array[(node.bitmap & (bit - 1)).bit_count()]
+            if type(entry) is tuple:
+                if entry[0] == hash_ and (entry[1] is key or entry[1] == key):
+                    return entry[2]
+                return MISSING
+
+            node = entry
+            shift += BITS
+
+    def assoc(self, shift, entry):
+        """This node with `entry` added, and whether its key is new"""
+        bit = 1 << ((entry[0] >> shift) & MASK)
+        i = (self.bitmap & (bit - 1)).bit_count()
+        array = self.array
+        if not self.bitmap & bit:
+            return BitmapNode(self.bitmap | bit, array[:i] + [entry] + array[i:]), True
+
+        child = array[i]
+        if type(child) is tuple:
+            if child[0] == entry[0] and (child[1] is entry[1] or child[1] == entry[1]):
+                if child[2] is entry[2]:
+                    return self, False
+                child, added = entry, False
+            else:
+                child, added = pair_node(shift + BITS, child, entry), True
+        else:
+            new_child, added = child.assoc(shift + BITS, entry)
+            if new_child is child:
+                return self, False
+            child = new_child
+
+        array = list(array)
+        array[i] = child
+
+        return BitmapNode(self.bitmap, array), added
+
+    def entries(self):
+        for child in self.array:
+            if type(child) is tuple:
+                yield child
+            else:
+                yield from child.entries()
+
+
+class CollisionNode:
+    """The entries of distinct keys with the same 32 bit hash"""
+    __slots__ = ('hash', 'array')
+
+    def __init__(self, hash_, array):
+        self.hash = hash_
+        self.array = array
+
+    def find(self, shift, hash_, key):
+        if hash_ == self.hash:
+            for entry in self.array:
+                if entry[1] is key or entry[1] == key:
+                    return entry[2]
+
+        return MISSING
+
+    def assoc(self, shift, entry):
+        if entry[0] != self.hash:
+            # Another hash reached this node, it moves one level down
+            node = BitmapNode(1 << ((self.hash >> shift) & MASK), [self])
+            return node.assoc(shift, entry)
+
+        for i, old in enumerate(self.array):
+            if old[1] is entry[1] or old[1] == entry[1]:
+                if old[2] is entry[2]:
+                    return self, False
+                array = list(self.array)
+                array[i] = entry
+                return CollisionNode(self.hash, array), False
+
+        return CollisionNode(self.hash, self.array + [entry]), True
+
+    def entries(self):
+        yield from self.array
+
+
+def pair_node(shift, first, second):
+    """The node holding the entries `first` and `second`, whose keys differ"""
+    if first[0] == second[0]:
+        return CollisionNode(first[0], [first, second])
+
+    first_bit = (first[0] >> shift) & MASK
+    second_bit = (second[0] >> shift) & MASK
+    if first_bit == second_bit:
+        return BitmapNode(1 << first_bit, [pair_node(shift + BITS, first, second)])
+    if first_bit > second_bit:
+        first, second = second, first
+
+    return BitmapNode((1 << first_bit) | (1 << second_bit), [first, second])
+
+
+EMPTY_NODE = BitmapNode(0, [])
+
+
+def key_hash(key):
+    return hash(key) & HASH_MASK
+
+
+def assoc_key(map_, key, value):
+    """`map_` with `key` bound to `value`"""
+    key = box(key)
+    root, added = map_.root.assoc(0, (key_hash(key), key, box(value)))
+    if root is map_.root:
+        return map_
+
+    return Map(map_.count + added, root)
+
+
+def find(map_, key):
+    """The value of `key` in `map_`, MISSING if it has none"""
+    return map_.root.find(0, key_hash(key), key)
+
+
+def hash_map(elements):
+    """Map of the Light values `elements`, keys and values alternating"""
+    map_ = Map(0, EMPTY_NODE)
+    for i in range(0, len(elements), 2):
+        map_ = assoc_key(map_, elements[i], elements[i + 1])
+
+    return map_
+
+
+#
+# Operations on both vectors and maps, behind indexing and the `get`,
+# `assoc` and `conj` builtins
+#
+
+def check_collection(coll, name):
+    if type(coll) is not Vector and type(coll) is not Map:
+        raise ValueError(f"`{name}` expects a vector or a map, got {coll}")
+
+    return coll
+
+
+def check_index(i):
+    if not isinstance(i, int):
+        raise ValueError(f"Index {i} is not an integer")
+
+    return i
+
+
+def lookup(coll, key):
+    """The element `key` of a vector or the value of `key` in a map, MISSING if there is none"""
+    if type(coll) is Vector:
+        if 0 <= check_index(key) < coll.count:
+            return nth(coll, key)
+        return MISSING
+
+    return find(coll, key)
+
+
+def get(coll, key):
+    """`coll[key]`, which must exist"""
+    value = lookup(coll, key)
+    if value is MISSING:
+        if type(coll) is Vector:
+            raise ValueError(f"Index {key} is out of range of a vector of length {coll.count}")
+        raise ValueError(f"Key {key} is not in the map")
+
+    return value
+
+
+def assoc(coll, key, value):
+    if type(coll) is Vector:
+        return assoc_index(coll, check_index(key), value)
+
+    return assoc_key(coll, key, value)
+
+
+def conj(coll, value):
+    """`coll` with `value` added, for a map a vector `#[key, value]`"""
+    if type(coll) is Vector:
+        return append(coll, value)
+
+    if type(value) is not Vector or value.count != 2:
+        raise ValueError(f"Only `#[key, value]` vectors can be added to a map, got {value}")
+
+    return assoc_key(coll, nth(value, 0), nth(value, 1))
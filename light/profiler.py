@@ -0,0 +1,334 @@
+"""
+The `--profile` mode, the tree walking evaluator recording where the time
+of a Light program goes.
+
+For every Light function and builtin it counts the calls and measures the inclusive
+time (of the call and everything it calls) and the exclusive time (of its
+own body only), the same for every call site, and it counts how often each
+kind of AST node is evaluated. The times are also kept per call stack, to
+be written in the collapsed stack format read by flamegraph.pl.
+
+Profiling is a subclass of `Evaluator`, the other engines don't pay for it.
+Programs are profiled without the typed fast paths of `inference.py`, so
+that every evaluation of a node goes through `eval` and is counted.
+"""
+import time
+from collections import Counter
+
+from . import ast
+from . import objects
+from .evaluator import Evaluator
+
+# Name of the code outside of functions
+TOP_LEVEL = '<top level>'
+
+
+class Timing:
+    """Calls and times of a function or a call site, in seconds"""
+    __slots__ = ('name', 'calls', 'inclusive', 'exclusive', 'active')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        # Activations still running, only the outermost one of a recursion
+        # adds to the inclusive time
+        self.active = 0
+
+
+class StackNode:
+    """A call stack, the nodes with the same parent form a tree of stacks"""
+    __slots__ = ('name', 'parent', 'children', 'time')
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = {}
+        # Exclusive time spent with exactly this stack
+        self.time = 0.0
+
+    def child(self, name):
+        try:
+            return self.children[name]
+        except KeyError:
+            node = self.children[name] = StackNode(name, self)
+            return node
+
+
+class Activation:
+    __slots__ = ('function', 'sites', 'stack', 'start', 'children')
+
+    def __init__(self, function, sites, stack):
+        self.function = function
+        # Timing -> start of the call sites that end with this activation.
+        # Sites of tail calls stay open in the activations replacing theirs
+        self.sites = sites
+        self.stack = stack
+        self.start = time.perf_counter()
+        # Time spent in the calls made by this activation
+        self.children = 0.0
+
+
+class Profile:
+    """What `ProfilingEvaluator` recorded during one program"""
+
+    def __init__(self):
+        self.functions = {}
+        # `ast.FunctionCall` -> its Timing
+        self.sites = {}
+        # Name of the node class -> evaluations
+        self.nodes = Counter()
+        self.stacks = StackNode(TOP_LEVEL)
+        self.total = 0.0
+
+    def function(self, name):
+        try:
+            return self.functions[name]
+        except KeyError:
+            timing = self.functions[name] = Timing(name)
+            return timing
+
+    def site(self, ast_node, caller):
+        try:
+            return self.sites[ast_node]
+        except KeyError:
+            name = f"{caller} -> {ast_node.name}"
+            if ast_node.ident.ident.offset is not None:
+                name += f" @{ast_node.ident.ident.offset}"
+            timing = self.sites[ast_node] = Timing(name)
+            return timing
+
+
+class ProfilingEvaluator(Evaluator):
+    def __init__(self):
+        super().__init__()
+        # Function body -> name of the function, kept across programs for the REPL
+        self.names = {}
+        self.anonymous = 0
+        self.profile = Profile()
+        self.activations = []
+        # Call site of the next activation
+        self.next_site = None
+
+    def name_functions(self, program):
+        """Names the function literals of `program` after the names they are bound to"""
+        literals = [node for node in ast.walk(program) if isinstance(node, ast.FunctionLiteral)]
+        bound = {}
+        for node in ast.walk(program):
+            if isinstance(node, ast.Assignment) and isinstance(node.expr, ast.FunctionLiteral):
+                bound[node.expr] = node.ident.literal
+        for node in literals:
+            if node.name is not None:
+                bound[node] = node.name.literal
+
+        used = set(self.names.values())
+        for node in literals:
+            if node.body in self.names:
+                continue
+            name = bound.get(node)
+            if name is None:
+                self.anonymous += 1
+                name = f"<anonymous {self.anonymous}>"
+            # Different functions bound to the same name are told apart
+            unique, i = name, 1
+            while unique in used:
+                i += 1
+                unique = f"{name}#{i}"
+            used.add(unique)
+            self.names[node.body] = unique
+
+    def eval_program(self, program, env=None):
+        """Runs `program` with a new `profile`"""
+        self.name_functions(program)
+        self.profile = Profile()
+        self.activations = []
+        self.next_site = None
+
+        root = Activation(self.profile.function(TOP_LEVEL), {}, self.profile.stacks)
+        root.function.calls += 1
+        root.function.active += 1
+        self.activations.append(root)
+        try:
+            return super().eval_program(program, env)
+        finally:
+            self.leave()
+            self.profile.total = root.function.inclusive
+
+    def eval(self, ast_node, env):
+        if not isinstance(ast_node, ast.Expression):
+            self.profile.nodes[type(ast_node).__name__] += 1
+
+        return super().eval(ast_node, env)
+
+    def eval_expression(self, ast_node, env):
+        self.profile.nodes[type(ast_node).__name__] += 1
+
+        return super().eval_expression(ast_node, env)
+
+    def call_site(self, ast_node):
+        site = self.profile.site(ast_node, self.activations[-1].function.name)
+        site.calls += 1
+
+        return site
+
+    def eval_func_call(self, ast_node, env):
+        site = self.call_site(ast_node)
+        func = self.lookup_callee(ast_node, env)
+        if type(func) is objects.Builtin:
+            values = [self.eval_expression(arg, env) for arg in ast_node.args]
+            self.next_site = site
+            return self.call(func, values)
+
+        values = self.eval_args(func, ast_node.args, env)
+        self.next_site = site
+
+        return self.apply(func, values)
+
+    def eval_return(self, ast_node, env):
+        result = super().eval_return(ast_node, env)
+        if isinstance(result, objects.TailCall):
+            # Made by the trampoline of the caller, without `eval_expression`
+            self.profile.nodes[type(ast_node.expr).__name__] += 1
+            self.next_site = self.call_site(ast_node.expr)
+
+        return result
+
+    def enter(self, func, sites=None):
+        caller = self.activations[-1]
+        if type(func) is objects.Builtin:
+            name = func.name
+        else:
+            name = self.names.get(func.body, '<unknown>')
+        if sites is None:
+            sites = {}
+        activation = Activation(self.profile.function(name), sites, caller.stack.child(name))
+        site = self.next_site
+        if site is not None and site not in sites:
+            # A loop of tail calls keeps its site open from the first one
+            site.active += 1
+            sites[site] = activation.start
+        self.next_site = None
+
+        activation.function.calls += 1
+        activation.function.active += 1
+        self.activations.append(activation)
+
+    def leave(self, tail=False):
+        """Ends the current activation, returns the sites still open when replaced by a tail call"""
+        activation = self.activations.pop()
+        now = time.perf_counter()
+        elapsed = now - activation.start
+        exclusive = elapsed - activation.children
+
+        function = activation.function
+        function.exclusive += exclusive
+        activation.stack.time += exclusive
+        function.active -= 1
+        if function.active == 0:
+            function.inclusive += elapsed
+
+        if self.activations:
+            self.activations[-1].children += elapsed
+
+        if tail:
+            return activation.sites
+
+        for site, start in activation.sites.items():
+            site.active -= 1
+            if site.active == 0:
+                site.inclusive += now - start
+
+    def call(self, func, values):
+        if type(func) is not objects.Builtin:
+            return super().call(func, values)
+
+        # Builtins are timed like Light functions, without a frame of their own
+        self.enter(func)
+        try:
+            return super().call(func, values)
+        finally:
+            self.leave()
+
+    def apply(self, func, values):
+        self.enter(func)
+        try:
+            while True:
+                local_env = self.new_frame(func)
+                self.bind_params(local_env, func.params, values)
+                result = self.eval_block(func.body, local_env)
+                self.release_frame(local_env, func)
+                if not isinstance(result, objects.TailCall):
+                    break
+
+                # The tail call replaces the activation of its caller
+                sites = self.leave(tail=True)
+                func = result.func
+                values = result.args
+                self.enter(func, sites)
+        finally:
+            self.leave()
+
+        if isinstance(result, objects.Returned):
+            return result.obj
+
+        return result
+
+
+def format_time(seconds):
+    return f"{seconds * 1000:10.2f}ms"
+
+
+def format_report(profile, limit=20):
+    """Readable summary of `profile`, the `limit` most expensive entries of each table"""
+    lines = [f"Profile: {format_time(profile.total).strip()} total", ""]
+
+    lines.append(f"{'function':32} {'calls':>10} {'inclusive':>12} {'exclusive':>12}")
+    functions = sorted(profile.functions.values(), key=lambda t: t.exclusive, reverse=True)
+    for timing in functions[:limit]:
+        lines.append(f"{timing.name:32} {timing.calls:10} "
+                     f"{format_time(timing.inclusive)} {format_time(timing.exclusive)}")
+
+    lines.append("")
+    lines.append(f"{'call site':45} {'calls':>10} {'inclusive':>12}")
+    sites = sorted(profile.sites.values(), key=lambda t: t.inclusive, reverse=True)
+    for timing in sites[:limit]:
+        lines.append(f"{timing.name:45} {timing.calls:10} {format_time(timing.inclusive)}")
+
+    lines.append("")
+    lines.append(f"{'node':32} {'evaluations':>12}")
+    for name, count in profile.nodes.most_common(limit):
+        lines.append(f"{name:32} {count:12}")
+
+    return '\n'.join(lines)
+
+
+def collapsed_stacks(profile):
+    """
+    Lines of `frame;frame;frame microseconds`, the exclusive time of every
+    call stack, the input format of flamegraph.pl
+    """
+    lines = []
+    path = []
+    # Depth first, with None marking where to leave a node
+    todo = [profile.stacks]
+    while todo:
+        node = todo.pop()
+        if node is None:
+            path.pop()
+            continue
+
+        path.append(node.name)
+        micros = round(node.time * 1e6)
+        if micros > 0:
+            lines.append(f"{';'.join(path)} {micros}")
+        todo.append(None)
+        todo.extend(reversed(list(node.children.values())))
+
+    return lines
+
+
+def write_collapsed_stacks(profile, file_):
+    with open(file_, 'w') as f:
+        for line in collapsed_stacks(profile):
+            f.write(line + '\n')
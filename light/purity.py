@@ -0,0 +1,95 @@
+"""
+Purity analysis of Light functions.
+
+A function is pure when its result depends only on its arguments and on
+the values its body reads by name. The static check below rules out
+bodies whose result can differ between two calls with the same arguments,
+`binding_guards` then resolves the names read by a function and by the
+functions it calls, whose bindings have to stay the same for a cached
+result to remain valid.
+"""
+from . import ast
+from . import objects
+
+# Values that can't change once bound to a name
+IMMUTABLE_TYPES = (int, objects.Boolean, objects.String, objects.Vector, objects.Map)
+
+
+def param_names(params):
+    return {param.literal for param in params if isinstance(param, ast.Identifier)}
+
+
+def is_pure(params, body):
+    """Whether `body` can only depend on its parameters and the bindings it reads"""
+    params_ = param_names(params)
+    if len(params_) != len(params):
+        return False
+
+    locals_ = params_ | {
+        node.ident.literal for node in ast.walk(body) if isinstance(node, ast.Assignment)}
+    for node in ast.walk(body):
+        if isinstance(node, ast.FunctionLiteral):
+            # Every evaluation creates a new function, which `==` tells apart
+            return False
+        if isinstance(node, ast.FunctionCall) and node.name in params_:
+            # Calls a function passed in, which may not be pure itself
+            return False
+        if isinstance(node, ast.Reassignment) and node.ident.literal not in locals_:
+            # Rebinds a name outside of the call
+            return False
+
+    return True
+
+
+def free_identifiers(params, body):
+    """One `ast.Identifier` for every name `body` reads that isn't a parameter"""
+    params_ = param_names(params)
+    identifiers = {}
+    for node in ast.walk(body):
+        if isinstance(node, ast.Identifier) and node.literal not in params_:
+            identifiers.setdefault(node.literal, node.ident)
+
+    locals_ = {
+        node.ident.literal for node in ast.walk(body) if isinstance(node, ast.Assignment)}
+
+    return identifiers, locals_
+
+
+def binding_guards(func):
+    """
+    The `(env, ident, value)` bindings the result of `func` depends on besides
+    its arguments, following the functions it calls. None if `func` or one of
+    those functions isn't pure, or a name is bound to a mutable value.
+    """
+    guards = []
+    seen = set()
+    stack = [func]
+    while stack:
+        func = stack.pop()
+        if id(func) in seen:
+            continue
+        seen.add(id(func))
+
+        if not is_pure(func.params, func.body):
+            return None
+
+        identifiers, locals_ = free_identifiers(func.params, func.body)
+        for name, ident in identifiers.items():
+            try:
+                value = func.closure.get(ident)
+            except ValueError:
+                if name in locals_:
+                    # Only ever read after the body binds it
+                    continue
+                return None
+
+            if isinstance(value, objects.Function):
+                stack.append(value)
+            elif isinstance(value, objects.Builtin):
+                if not value.pure:
+                    return None
+            elif not isinstance(value, IMMUTABLE_TYPES):
+                return None
+            guards.append((func.closure, ident, value))
+
+    return guards
@@ -1,17 +1,42 @@
-from parser import parse_source
-from evaluator import Evaluator, Environment
+if __name__ == '__main__' and not __package__:
+    # Started as `python repl.py`, import the interpreter as the `light`
+    # package. The script directory must leave sys.path, or `light/ast.py`
+    # would shadow the standard library's `ast`
+    import os
+    import sys
+
+    _here = os.path.dirname(os.path.abspath(__file__))
+    sys.path = [p for p in sys.path if os.path.abspath(p or os.curdir) != _here]
+    sys.path.insert(0, os.path.dirname(_here))
+    __package__ = 'light'
+
+import sys
+
+from .parser import parse_source
+from .evaluator import ENGINES, Environment, eval_file, execute
+from .optimizer import optimize_program
+from .profiler import ProfilingEvaluator, format_report
 
 py_eval = eval
 
 
 class Repl:
-    def __init__(self):
+    def __init__(self, engine='tree', optimize=False, profile=False):
         self.parse = parse_source
-        self.evaluator = Evaluator()
+        self.engine = engine
+        self.optimize = optimize
         self.env = Environment()
+        self.profiler = None
+        if profile:
+            self.profiler = ProfilingEvaluator()
 
     def eval(self, ast):
-        return self.evaluator.eval(ast[0], self.env)
+        if self.profiler is not None:
+            val = self.profiler.eval_program(ast, self.env)
+            print(format_report(self.profiler.profile), file=sys.stderr)
+            return val
+
+        return execute(ast, self.env, self.engine)
 
     def start(self):
         while True:
@@ -21,11 +46,13 @@ class Repl:
                 if line == "":
                     continue
                 ast = self.parse(line)
+                if self.optimize:
+                    ast, _ = optimize_program(ast)
 
                 val = self.eval(ast)
                 if val is not None:
                     print(val)
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError):
                 print("\nThank You")
                 exit()
             except Exception as e:
@@ -33,5 +60,34 @@ class Repl:
 
 
 if __name__ == '__main__':
-    r = Repl()
-    r.start()
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Light interpreter")
+    arg_parser.add_argument('file', nargs='?', help="Script to run, starts the REPL if omitted")
+    arg_parser.add_argument('--engine', choices=ENGINES, default='tree',
+                            help="Execution engine (default: tree)")
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            help="Don't read or write the parsed program cache")
+    arg_parser.add_argument('--memo-size', type=int, default=None,
+                            help="Results cached per pure function by the memo engine")
+    arg_parser.add_argument('--optimize', action='store_true',
+                            help="Fold constants and simplify the program before running it")
+    arg_parser.add_argument('--profile', action='store_true',
+                            help="Print the time spent per function and call site to stderr")
+    arg_parser.add_argument('--profile-output', metavar='FILE', default=None,
+                            help="With --profile, write the call stacks in collapsed format "
+                                 "for flamegraph.pl to FILE")
+    args = arg_parser.parse_args()
+    if args.profile and args.engine != 'tree':
+        arg_parser.error("--profile runs on the tree engine")
+    if args.memo_size is not None:
+        from . import memo
+
+        memo.MEMO_SIZE = args.memo_size
+
+    if args.file is not None:
+        eval_file(args.file, args.engine, cache=not args.no_cache, optimize=args.optimize,
+                  profile=args.profile, profile_output=args.profile_output)
+    else:
+        r = Repl(args.engine, optimize=args.optimize, profile=args.profile)
+        r.start()
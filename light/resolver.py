@@ -0,0 +1,273 @@
+from . import ast
+from . import objects
+from .evaluator import UNBOUND, ArrayEnvironment, Evaluator
+
+class ResolverError(ValueError):
+    pass
+
+
+def declared_names(statements):
+    """Names bound by `let` in a scope, without entering nested functions"""
+    names = []
+    for stmt in statements:
+        if isinstance(stmt, ast.Assignment):
+            names.append(stmt.ident.literal)
+        elif isinstance(stmt, ast.Block):
+            names.extend(declared_names(stmt.statements))
+        elif isinstance(stmt, ast.Conditional):
+            names.extend(declared_names(stmt.cons.statements))
+            if stmt.alt is not None:
+                names.extend(declared_names(stmt.alt.statements))
+        elif isinstance(stmt, ast.While):
+            names.extend(declared_names(stmt.body.statements))
+        elif isinstance(stmt, ast.FunctionLiteral) and stmt.name is not None:
+            names.append(stmt.name.literal)
+
+    return names
+
+
+class Resolver:
+    """
+    Gives every `ast.Identifier` inside a function its `(depth, slot, fallback)` address.
+
+    A name bound anywhere in a function body has a slot in its frame, `depth`
+    counts the function scopes between the use and that frame. A `let` only
+    binds the slot once it runs, until then the name still refers to the
+    binding of an enclosing scope, like it does for the other engines. So a
+    use that may come before the `let` gets as `fallback` the address to use
+    while the slot is unbound, the enclosing scopes outwards. Top level names
+    are globals and end the chain with None, they are looked up by name so
+    that functions can refer to globals defined after them. Names bound in
+    no scope and not at the top level either must be bound by the global
+    environment the program runs in, `free_names` collects them.
+
+    It also finds the frames that escape: a frame outlives its call only if
+    a function created inside reads a local of it, directly or through the
+    frames in between. Functions that read no enclosing locals don't need a
+    closure at all.
+    """
+
+    def __init__(self):
+        self.scopes = []
+        # The function literals of `scopes`
+        self.functions = []
+        # For every scope, the names whose slots are sure to be bound at the
+        # point being resolved
+        self.bound = []
+        # Names found in no scope, in the order of their first use
+        self.free_names = {}
+
+    def resolve_program(self, program):
+        for stmt in program.statements:
+            self.resolve(stmt)
+
+        for name in declared_names(program.statements):
+            self.free_names.pop(name, None)
+
+        return program
+
+    def resolve(self, ast_node):
+        if isinstance(ast_node, ast.Assignment):
+            self.resolve(ast_node.expr)
+            self.resolve_binding(ast_node.ident)
+        elif isinstance(ast_node, ast.Reassignment):
+            self.resolve(ast_node.expr)
+            self.resolve_identifier(ast_node.ident)
+        elif isinstance(ast_node, ast.Return):
+            self.resolve(ast_node.expr)
+        elif isinstance(ast_node, ast.Conditional):
+            self.resolve(ast_node.cond)
+            self.resolve_branches(ast_node.cons, ast_node.alt)
+        elif isinstance(ast_node, ast.While):
+            self.resolve(ast_node.cond)
+            # The body may not run at all
+            self.resolve_branches(ast_node.body, None)
+        elif isinstance(ast_node, ast.Block):
+            for stmt in ast_node.statements:
+                self.resolve(stmt)
+        elif isinstance(ast_node, ast.Identifier):
+            self.resolve_identifier(ast_node)
+        elif isinstance(ast_node, ast.BinaryOp):
+            self.resolve(ast_node.left)
+            self.resolve(ast_node.right)
+        elif isinstance(ast_node, ast.PrefixOp):
+            self.resolve(ast_node.right)
+        elif isinstance(ast_node, ast.FunctionCall):
+            self.resolve_identifier(ast_node.ident)
+            for arg in ast_node.args:
+                self.resolve(arg)
+        elif isinstance(ast_node, ast.FunctionLiteral):
+            self.resolve_func_literal(ast_node)
+        elif isinstance(ast_node, ast.COLLECTION_LITERALS):
+            for element in ast_node.elements:
+                self.resolve(element)
+        elif isinstance(ast_node, ast.Index):
+            self.resolve(ast_node.left)
+            self.resolve(ast_node.index)
+
+    def resolve_branches(self, cons, alt):
+        """Resolves blocks of which at most one runs, keeping the names bound by both"""
+        if not self.bound:
+            self.resolve(cons)
+            if alt is not None:
+                self.resolve(alt)
+            return
+
+        before = self.bound[-1]
+        self.bound[-1] = set(before)
+        self.resolve(cons)
+        bound = self.bound[-1]
+        if alt is None:
+            self.bound[-1] = before
+        else:
+            self.bound[-1] = set(before)
+            self.resolve(alt)
+            self.bound[-1] &= bound
+
+    def resolve_identifier(self, ident):
+        """
+        Addresses `ident` with the slots that may hold its binding, innermost
+        first, up to a slot that is sure to be bound
+        """
+        name = ident.literal
+        candidates = []
+        for depth in range(len(self.scopes)):
+            scope = self.scopes[-1 - depth]
+            if name in scope:
+                candidates.append((depth, scope[name]))
+                if name in self.bound[-1 - depth]:
+                    break
+
+        address = None
+        for depth, slot in reversed(candidates):
+            address = (depth, slot, address)
+        ident.address = address
+        if candidates:
+            self.capture(candidates[-1][0])
+        else:
+            self.free_names.setdefault(name, None)
+
+    def capture(self, depth):
+        """Marks the `depth` enclosing frames of the current scope as read through closures"""
+        for i in range(1, depth + 1):
+            self.functions[-i].needs_closure = True
+            self.functions[-i - 1].body.escapes = True
+
+    def resolve_binding(self, ident):
+        if self.scopes:
+            ident.address = (0, self.scopes[-1][ident.literal], None)
+            self.bound[-1].add(ident.literal)
+
+    def resolve_func_literal(self, ast_node):
+        if ast_node.name is not None:
+            self.resolve_binding(ast_node.name)
+
+        scope = {}
+        for param in ast_node.params:
+            if not isinstance(param, ast.Identifier):
+                raise ResolverError(f"Function parameters must be names, got {param}")
+            scope.setdefault(param.literal, len(scope))
+        for name in declared_names(ast_node.body.statements):
+            scope.setdefault(name, len(scope))
+
+        ast_node.needs_closure = False
+        ast_node.body.escapes = False
+        self.scopes.append(scope)
+        self.functions.append(ast_node)
+        self.bound.append(set())
+        for param in ast_node.params:
+            self.resolve_binding(param)
+        self.resolve(ast_node.body)
+        self.bound.pop()
+        self.functions.pop()
+        self.scopes.pop()
+
+        ast_node.body.frame_size = len(scope)
+
+
+class ResolvedEvaluator(Evaluator):
+    """
+    Evaluator for programs annotated by `Resolver`.
+
+    Function locals live in `ArrayEnvironment`s and are read by index, only
+    globals are looked up by name in the root `Environment`. Frames that
+    don't escape are recycled once their call returns.
+    """
+
+    def eval_program(self, program, env=None):
+        self.globals = env
+
+        return super().eval_program(program, env)
+
+    def eval_identifier(self, ast_node, env):
+        address = ast_node.address
+        while address is not None:
+            value = env.get_at(address[0], address[1])
+            if value is not UNBOUND:
+                return value
+            address = address[2]
+
+        return self.globals.get(ast_node)
+
+    def lookup_callee(self, ast_node, env):
+        return self.eval_identifier(ast_node.ident, env)
+
+    def bind(self, ident, value, env):
+        if ident.address is None:
+            self.globals.set(ident, value)
+        else:
+            env.set_at(ident.address[1], value)
+
+    def eval_assignment(self, ast_node, env):
+        value = self.eval(ast_node.expr, env)
+        self.bind(ast_node.ident, value, env)
+
+    def eval_reassignment(self, ast_node, env):
+        value = self.eval(ast_node.expr, env)
+        address = ast_node.ident.address
+        while address is not None:
+            if env.assign_at(address[0], address[1], value):
+                return
+            address = address[2]
+
+        self.globals.assign(ast_node.ident, value)
+
+    def eval_func_literal(self, ast_node, env):
+        # Globals aren't read through the closure, so functions that only
+        # read their own locals and globals don't hold on to the frame
+        closure = env if ast_node.needs_closure else None
+        func = objects.Function(ast_node.params, ast_node.body, closure=closure)
+
+        if ast_node.name is not None:
+            self.bind(ast_node.name, func, env)
+
+        return func
+
+    def make_frame(self, func):
+        return ArrayEnvironment(func.body.frame_size, parent=func.closure)
+
+    def captures(self, body):
+        return body.escapes
+
+    def bind_params(self, env, params, values):
+        for param, value in zip(params, values):
+            env.set_at(param.address[1], value)
+
+
+def resolve_program(program):
+    """
+    Annotates `program` with the addresses `ResolvedEvaluator` reads its
+    locals at, returns the names its global environment must bind
+    """
+    resolver = Resolver()
+    resolver.resolve_program(program)
+
+    return list(resolver.free_names)
+
+
+def check_globals(names, env):
+    """Raises a ResolverError for the first of `names` that `env` doesn't bind"""
+    bound = env.names()
+    for name in names:
+        if name not in bound:
+            raise ResolverError(f"Unbound variable `{name}`")
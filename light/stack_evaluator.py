@@ -0,0 +1,285 @@
+from . import arrays
+from . import ast
+from . import objects
+from . import tokens
+from .compiler import literal_value
+from .evaluator import BINARY_FUNCS, BUILDERS, Environment
+
+#
+# Tasks on the work stack, each one is a tuple starting with its tag
+#
+
+EVAL = 0           # (EVAL, node, env) evaluates node and pushes its value
+STATEMENTS = 1     # (STATEMENTS, statements, index, env) runs statements[index:]
+POP = 2            # (POP,) discards the value of a statement
+ASSIGN = 3         # (ASSIGN, ident, env)
+BRANCH = 4         # (BRANCH, conditional, env) picks a branch on the popped condition
+BINARY = 5         # (BINARY, op_func)
+NEGATE = 6         # (NEGATE,)
+DISCARD = 7        # (DISCARD,) replaces the top value by None
+CHECK_CALL = 8     # (CHECK_CALL, call, env, tail) validates the callee, then evaluates args
+INVOKE = 9         # (INVOKE, nargs) enters the callee
+TAIL_INVOKE = 10   # (TAIL_INVOKE, nargs) replaces the current call with the callee
+RETURN = 11        # (RETURN,) unwinds to the enclosing CALL_END
+CALL_END = 12      # (CALL_END, height) call boundary, drops the callee's stack values
+LOOP = 13          # (LOOP, while, env) runs the body again on a popped true condition
+REASSIGN = 14      # (REASSIGN, ident, env)
+BUILD = 15         # (BUILD, nelements, make) makes a collection of the top nelements values
+SUBSCRIPT = 16     # (SUBSCRIPT,) indexes the collection under the top value with it
+
+# Node type -> kind used by the EVAL task
+IDENTIFIER = 0
+LITERAL = 1
+BINARY_OP = 2
+FUNCTION_CALL = 3
+CONDITIONAL = 4
+RETURN_STMT = 5
+BLOCK = 6
+ASSIGNMENT = 7
+FUNCTION_LITERAL = 8
+PREFIX_OP = 9
+WHILE = 10
+REASSIGNMENT = 11
+COLLECTION_LITERAL = 12
+INDEX = 13
+
+NODE_KINDS = {
+    ast.Identifier: IDENTIFIER,
+    ast.IntLiteral: LITERAL,
+    ast.BoolLiteral: LITERAL,
+    ast.StringLiteral: LITERAL,
+    ast.BinaryOp: BINARY_OP,
+    ast.FunctionCall: FUNCTION_CALL,
+    ast.Conditional: CONDITIONAL,
+    ast.Return: RETURN_STMT,
+    ast.Block: BLOCK,
+    ast.Assignment: ASSIGNMENT,
+    ast.FunctionLiteral: FUNCTION_LITERAL,
+    ast.PrefixOp: PREFIX_OP,
+    ast.While: WHILE,
+    ast.Reassignment: REASSIGNMENT,
+    ast.ArrayLiteral: COLLECTION_LITERAL,
+    ast.VectorLiteral: COLLECTION_LITERAL,
+    ast.MapLiteral: COLLECTION_LITERAL,
+    ast.Index: INDEX,
+}
+
+
+class StackEvaluator:
+    """
+    Evaluates the AST with its own work stack instead of Python recursion.
+
+    Pending work is kept as tasks on `todo` and intermediate results on
+    `values`, so neither deep nesting nor deep (non tail) recursion of
+    Light functions touches the Python call stack. Only Light functions
+    called back by builtins like `map` run on a nested work stack.
+    """
+
+    def eval_program(self, program, env=None):
+        if env is None:
+            env = Environment()
+
+        return self.run(program.statements, env)
+
+    def call(self, func, values):
+        """Runs `func` to completion, how builtins call back into Light"""
+        if type(func) is objects.Builtin:
+            return func.invoke(self.call, values)
+        if not isinstance(func, objects.Function):
+            raise ValueError(f"Object {func} is not callable")
+        if len(values) != len(func.params):
+            raise ValueError(
+                f"Number of arguments passed {len(values)} != number of parameters {len(func.params)}")
+
+        local_env = Environment(parent=func.closure)
+        for param, value in zip(func.params, values):
+            local_env.set(param, value)
+
+        return self.run(func.body.statements, local_env)
+
+    def run(self, statements, env):
+        """Runs `statements` in `env` as the body of a call, returns its value"""
+        TRUE = objects.TRUE
+        Function = objects.Function
+        Builtin = objects.Builtin
+        Integer = objects.Integer
+        kinds = NODE_KINDS
+
+        values = []
+        todo = [(CALL_END, 0), (STATEMENTS, statements, 0, env)]
+        push = todo.append
+        pop = todo.pop
+
+        while todo:
+            task = pop()
+            tag = task[0]
+
+            if tag == EVAL:
+                node = task[1]
+                env = task[2]
+                kind = kinds[type(node)]
+                if kind == IDENTIFIER:
+                    values.append(env.get(node.ident))
+                elif kind == LITERAL:
+                    values.append(literal_value(node))
+                elif kind == BINARY_OP:
+                    push((BINARY, BINARY_FUNCS[node.op.kind]))
+                    push((EVAL, node.right, env))
+                    push((EVAL, node.left, env))
+                elif kind == FUNCTION_CALL:
+                    push((CHECK_CALL, node, env, False))
+                    push((EVAL, node.ident, env))
+                elif kind == CONDITIONAL:
+                    push((BRANCH, node, env))
+                    push((EVAL, node.cond, env))
+                elif kind == RETURN_STMT:
+                    expr = node.expr
+                    if type(expr) is ast.FunctionCall:
+                        push((CHECK_CALL, expr, env, True))
+                        push((EVAL, expr.ident, env))
+                    else:
+                        push((RETURN,))
+                        push((EVAL, expr, env))
+                elif kind == BLOCK:
+                    push((STATEMENTS, node.statements, 0, env))
+                elif kind == ASSIGNMENT:
+                    push((ASSIGN, node.ident, env))
+                    push((EVAL, node.expr, env))
+                elif kind == FUNCTION_LITERAL:
+                    func = Function(node.params, node.body, env)
+                    if node.name is not None:
+                        env.set(node.name, func)
+                    values.append(func)
+                elif kind == PREFIX_OP:
+                    if node.op.kind == tokens.MINUS:
+                        push((NEGATE,))
+                    else:
+                        push((DISCARD,))
+                    push((EVAL, node.right, env))
+                elif kind == WHILE:
+                    push((LOOP, node, env))
+                    push((EVAL, node.cond, env))
+                elif kind == REASSIGNMENT:
+                    push((REASSIGN, node.ident, env))
+                    push((EVAL, node.expr, env))
+                elif kind == COLLECTION_LITERAL:
+                    push((BUILD, len(node.elements), BUILDERS[type(node)]))
+                    for element in reversed(node.elements):
+                        push((EVAL, element, env))
+                elif kind == INDEX:
+                    push((SUBSCRIPT,))
+                    push((EVAL, node.index, env))
+                    push((EVAL, node.left, env))
+            elif tag == STATEMENTS:
+                statements = task[1]
+                index = task[2]
+                env = task[3]
+                if index + 1 < len(statements):
+                    push((STATEMENTS, statements, index + 1, env))
+                    push((POP,))
+                    push((EVAL, statements[index], env))
+                elif statements:
+                    push((EVAL, statements[index], env))
+                else:
+                    values.append(None)
+            elif tag == POP:
+                values.pop()
+            elif tag == BINARY:
+                right = values.pop()
+                values[-1] = task[1](values[-1], right)
+            elif tag == BRANCH:
+                node = task[1]
+                if values.pop() is TRUE:
+                    push((EVAL, node.cons, task[2]))
+                elif node.alt is not None:
+                    push((EVAL, node.alt, task[2]))
+                else:
+                    values.append(None)
+            elif tag == CHECK_CALL:
+                node = task[1]
+                func = values[-1]
+                args = node.args
+                # Builtins check their arguments themselves
+                if type(func) is not Builtin:
+                    if not isinstance(func, Function):
+                        raise ValueError(f"Object {func} is not callable")
+                    if len(args) != len(func.params):
+                        raise ValueError(
+                            f"Number of arguments passed {len(args)} != number of parameters {len(func.params)}")
+
+                push((TAIL_INVOKE if task[3] else INVOKE, len(args)))
+                for arg in reversed(args):
+                    push((EVAL, arg, task[2]))
+            elif tag == INVOKE or tag == TAIL_INVOKE:
+                nargs = task[1]
+                if nargs:
+                    args = values[-nargs:]
+                    del values[-nargs:]
+                else:
+                    args = ()
+                func = values.pop()
+
+                if type(func) is Builtin:
+                    value = func.invoke(self.call, args)
+                    if tag == TAIL_INVOKE:
+                        # Returns the result like RETURN
+                        while todo[-1][0] != CALL_END:
+                            pop()
+                    values.append(value)
+                    continue
+
+                if tag == TAIL_INVOKE:
+                    # Drop everything up to the current call boundary, the
+                    # callee returns straight to our caller
+                    while todo[-1][0] != CALL_END:
+                        pop()
+                    del values[todo[-1][1]:]
+                else:
+                    push((CALL_END, len(values)))
+
+                local_env = Environment(parent=func.closure)
+                for param, value in zip(func.params, args):
+                    local_env.set(param, value)
+                push((STATEMENTS, func.body.statements, 0, local_env))
+            elif tag == RETURN:
+                while todo[-1][0] != CALL_END:
+                    pop()
+            elif tag == CALL_END:
+                value = values.pop()
+                del values[task[1]:]
+                values.append(value)
+            elif tag == ASSIGN:
+                task[2].set(task[1], values.pop())
+                values.append(None)
+            elif tag == LOOP:
+                node = task[1]
+                if values.pop() is TRUE:
+                    push(task)
+                    push((EVAL, node.cond, task[2]))
+                    push((POP,))
+                    push((EVAL, node.body, task[2]))
+                else:
+                    values.append(None)
+            elif tag == REASSIGN:
+                task[2].assign(task[1], values.pop())
+                values.append(None)
+            elif tag == NEGATE:
+                try:
+                    values[-1] = Integer(-values[-1])
+                except TypeError:
+                    values[-1] = arrays.negate(values[-1])
+            elif tag == DISCARD:
+                values[-1] = None
+            elif tag == BUILD:
+                nelements = task[1]
+                if nelements:
+                    elements = values[-nelements:]
+                    del values[-nelements:]
+                else:
+                    elements = []
+                values.append(task[2](elements))
+            elif tag == SUBSCRIPT:
+                i = values.pop()
+                values[-1] = arrays.index(values[-1], i)
+
+        return values.pop()
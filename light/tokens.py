@@ -1,139 +1,129 @@
 class Token:
-    def __init__(self, literal):
-        self.literal = literal
-
-    def __repr__(self):
-        return f"{self.__class__.__qualname__}({self.literal})"
+    """
+    A token is its integer `kind`, its `literal` text and the `offset` of
+    that text in the source.
 
+    Tokens with a fixed literal (operators, brackets, keywords) are shared
+    singletons from `FIXED_TOKENS` and carry no offset.
+    """
+    __slots__ = ('kind', 'literal', 'offset')
 
-class ILLEGAL(Token):
-    def __init__(self, literal):
+    def __init__(self, kind, literal, offset=None):
+        self.kind = kind
         self.literal = literal
+        self.offset = offset
 
-class EOF(Token):
-    def __init__(self):
-        self.literal = '\0'
-
-class IDENT(Token):
-    def __init__(self, literal):
-        self.literal = literal
-
-class ASSIGN(Token):
-    def __init__(self):
-        self.literal = '='
+    def __repr__(self):
+        return f"{NAMES[self.kind]}({self.literal})"
 
-class COMMA(Token):
-    def __init__(self):
-        self.literal = ','
 
-class SEMICOLON(Token):
-    def __init__(self):
-        self.literal = ';'
+#
+# Token kinds
+#
 
-class INT(Token):
-    def __init__(self, literal):
-        self.literal = literal
+ILLEGAL = 0
+EOF = 1
+IDENT = 2
+ASSIGN = 3
+COMMA = 4
+SEMICOLON = 5
+INT = 6
 
 #
 # Keywords
 #
 
-class IF(Token):
-    def __init__(self):
-        self.literal = 'if'
-
-class ELSE(Token):
-    def __init__(self):
-        self.literal = 'else'
-
-class LET(Token):
-    def __init__(self):
-        self.literal = 'let'
-
-class FUNC(Token):
-    def __init__(self):
-        self.literal = 'func'
-
-class RETURN(Token):
-    def __init__(self):
-        self.literal = 'return'
+IF = 7
+ELSE = 8
+LET = 9
+FUNC = 10
+RETURN = 11
 
 #
 # Brackets
 #
 
-class LPARAN(Token):
-    def __init__(self):
-        self.literal = '('
-
-class RPARAN(Token):
-    def __init__(self):
-        self.literal = ')'
-
-class LBRACE(Token):
-    def __init__(self):
-        self.literal = '{'
-
-class RBRACE(Token):
-    def __init__(self):
-        self.literal = '}'
+LPARAN = 12
+RPARAN = 13
+LBRACE = 14
+RBRACE = 15
 
 #
 # Boolean Literals
 #
 
-class TRUE(Token):
-    def __init__(self):
-        self.literal = 'true'
-
-class FALSE(Token):
-    def __init__(self):
-        self.literal = 'false'
+TRUE = 16
+FALSE = 17
 
 #
 # Arithmetic Ops
 #
 
-class PLUS(Token):
-    def __init__(self):
-        self.literal = '+'
-
-class MINUS(Token):
-    def __init__(self):
-        self.literal = '-'
-
-class ASTERISK(Token):
-    def __init__(self):
-        self.literal = '*'
-
-class SLASH(Token):
-    def __init__(self):
-        self.literal = '/'
+PLUS = 18
+MINUS = 19
+ASTERISK = 20
+SLASH = 21
 
 #
 # Relational Ops
 #
 
-class EQ(Token):
-    def __init__(self):
-        self.literal = '=='
-
-class NEQ(Token):
-    def __init__(self):
-        self.literal = '!='
-
-class GT(Token):
-    def __init__(self):
-        self.literal = '>'
+EQ = 22
+NEQ = 23
+GT = 24
+LT = 25
+GTE = 26
+LTE = 27
 
-class LT(Token):
-    def __init__(self):
-        self.literal = '<'
-
-class GTE(Token):
-    def __init__(self):
-        self.literal = '>='
+#
+# Keywords added later, numbered after the others since cached programs
+# store token kinds
+#
 
-class LTE(Token):
-    def __init__(self):
-        self.literal = '<='
\ No newline at end of file
+WHILE = 28
+LBRACKET = 29
+RBRACKET = 30
+VECTOR_START = 31
+MAP_START = 32
+COLON = 33
+
+NAMES = {
+    value: name for name, value in list(globals().items())
+    if name.isupper() and isinstance(value, int)
+}
+
+FIXED_LITERALS = {
+    EOF: '\0',
+    ASSIGN: '=',
+    COMMA: ',',
+    SEMICOLON: ';',
+    IF: 'if',
+    ELSE: 'else',
+    LET: 'let',
+    FUNC: 'func',
+    RETURN: 'return',
+    WHILE: 'while',
+    LPARAN: '(',
+    RPARAN: ')',
+    LBRACE: '{',
+    RBRACE: '}',
+    LBRACKET: '[',
+    RBRACKET: ']',
+    VECTOR_START: '#[',
+    MAP_START: '#{',
+    COLON: ':',
+    TRUE: 'true',
+    FALSE: 'false',
+    PLUS: '+',
+    MINUS: '-',
+    ASTERISK: '*',
+    SLASH: '/',
+    EQ: '==',
+    NEQ: '!=',
+    GT: '>',
+    LT: '<',
+    GTE: '>=',
+    LTE: '<=',
+}
+
+FIXED_TOKENS = {kind: Token(kind, literal) for kind, literal in FIXED_LITERALS.items()}
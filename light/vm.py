@@ -0,0 +1,249 @@
+from . import arrays
+from . import objects
+from . import persistent
+from . import tokens
+from .compiler import (
+    LOAD_CONST, LOAD_NAME, STORE_NAME, POP_TOP, DUP_TOP, JUMP,
+    POP_JUMP_IF_NOT_TRUE, MAKE_FUNCTION, CALL_FUNCTION, RETURN_VALUE,
+    UNARY_NEGATIVE, BINARY_ADD, BINARY_SUBTRACT, BINARY_MULTIPLY,
+    BINARY_DIVIDE, COMPARE_EQ, COMPARE_NEQ, COMPARE_GT, COMPARE_LT,
+    COMPARE_GTE, COMPARE_LTE, TAIL_CALL, ASSIGN_NAME, BUILD_ARRAY, BINARY_SUBSCR,
+    BUILD_VECTOR, BUILD_MAP,
+    compile_function,
+)
+from .evaluator import Environment
+
+class VMError(Exception):
+    pass
+
+
+class Frame:
+    __slots__ = ('code', 'pc', 'env')
+
+    def __init__(self, code, pc, env):
+        self.code = code
+        self.pc = pc
+        self.env = env
+
+
+class VM:
+    """
+    Stack based virtual machine executing `compiler.Code`.
+
+    Calls push a `Frame` on an explicit frame stack instead of recursing
+    in Python, so Light recursion depth is bounded by memory only.
+    Builtins are called in place, those calling back into Light run the
+    function on a nested `run`.
+
+    Operators compute on scalars directly, operands that are arrays make them
+    raise a TypeError (or, for `==` and `!=`, are checked for) and go through
+    `arrays.binary_op` instead.
+    """
+
+    def call(self, func, values):
+        """Runs `func` to completion, how builtins call back into Light"""
+        if type(func) is objects.Builtin:
+            return func.invoke(self.call, values)
+        if not isinstance(func, objects.Function):
+            raise ValueError(f"Object {func} is not callable")
+
+        params = func.params
+        if len(values) != len(params):
+            raise ValueError(
+                f"Number of arguments passed {len(values)} != number of parameters {len(params)}")
+
+        if func.code is None:
+            func.code = compile_function(params, func.body)
+        env = Environment(parent=func.closure)
+        for param, value in zip(params, values):
+            env.set(param, value)
+
+        return self.run(func.code, env)
+
+    def run(self, code, env=None):
+        if env is None:
+            env = Environment()
+
+        TRUE = objects.TRUE
+        FALSE = objects.FALSE
+        Integer = objects.Integer
+        Function = objects.Function
+        Builtin = objects.Builtin
+        Array = objects.Array
+        binary_op = arrays.binary_op
+
+        frames = []
+        stack = []
+        push = stack.append
+        pop = stack.pop
+
+        ops = code.ops
+        consts = code.consts
+        names = code.names
+        pc = 0
+
+        while True:
+            op = ops[pc]
+            arg = ops[pc+1]
+            pc += 2
+
+            if op == LOAD_NAME:
+                push(env.get(names[arg]))
+            elif op == LOAD_CONST:
+                push(consts[arg])
+            elif op == POP_TOP:
+                pop()
+            elif op == BINARY_ADD:
+                right = pop()
+                try:
+                    stack[-1] = Integer(stack[-1] + right)
+                except TypeError:
+                    stack[-1] = binary_op(tokens.PLUS, stack[-1], right)
+            elif op == BINARY_SUBTRACT:
+                right = pop()
+                try:
+                    stack[-1] = Integer(stack[-1] - right)
+                except TypeError:
+                    stack[-1] = binary_op(tokens.MINUS, stack[-1], right)
+            elif op == COMPARE_LT:
+                right = pop()
+                try:
+                    stack[-1] = TRUE if stack[-1] < right else FALSE
+                except TypeError:
+                    stack[-1] = binary_op(tokens.LT, stack[-1], right)
+            elif op == COMPARE_EQ:
+                right = pop()
+                left = stack[-1]
+                if type(left) is Array or type(right) is Array:
+                    stack[-1] = binary_op(tokens.EQ, left, right)
+                else:
+                    stack[-1] = TRUE if left == right else FALSE
+            elif op == POP_JUMP_IF_NOT_TRUE:
+                if pop() is not TRUE:
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == CALL_FUNCTION or op == TAIL_CALL:
+                if arg:
+                    args = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    args = ()
+                func = pop()
+                if type(func) is Builtin:
+                    # A following RETURN_VALUE returns the result of a tail call
+                    push(func.invoke(self.call, args))
+                    continue
+                if not isinstance(func, Function):
+                    raise ValueError(f"Object {func} is not callable")
+
+                params = func.params
+                if arg != len(params):
+                    raise ValueError(
+                        f"Number of arguments passed {arg} != number of parameters {len(params)}")
+
+                if func.code is None:
+                    # Functions created by another engine are compiled lazily
+                    func.code = compile_function(params, func.body)
+
+                if op == CALL_FUNCTION or not frames:
+                    frames.append(Frame(code, pc, env))
+                # A tail call reuses the current frame, its callee returns
+                # straight to our caller
+                env = Environment(parent=func.closure)
+                for param, value in zip(params, args):
+                    env.set(param, value)
+
+                code = func.code
+                ops = code.ops
+                consts = code.consts
+                names = code.names
+                pc = 0
+            elif op == RETURN_VALUE:
+                if not frames:
+                    return pop()
+
+                frame = frames.pop()
+                code = frame.code
+                ops = code.ops
+                consts = code.consts
+                names = code.names
+                pc = frame.pc
+                env = frame.env
+            elif op == STORE_NAME:
+                env.set(names[arg], pop())
+            elif op == ASSIGN_NAME:
+                env.assign(names[arg], pop())
+            elif op == BINARY_MULTIPLY:
+                right = pop()
+                try:
+                    stack[-1] = Integer(stack[-1] * right)
+                except TypeError:
+                    stack[-1] = binary_op(tokens.ASTERISK, stack[-1], right)
+            elif op == BINARY_DIVIDE:
+                right = pop()
+                try:
+                    stack[-1] = Integer(int(stack[-1] / right))
+                except TypeError:
+                    stack[-1] = binary_op(tokens.SLASH, stack[-1], right)
+            elif op == COMPARE_NEQ:
+                right = pop()
+                left = stack[-1]
+                if type(left) is Array or type(right) is Array:
+                    stack[-1] = binary_op(tokens.NEQ, left, right)
+                else:
+                    stack[-1] = TRUE if left != right else FALSE
+            elif op == COMPARE_GT:
+                right = pop()
+                try:
+                    stack[-1] = TRUE if stack[-1] > right else FALSE
+                except TypeError:
+                    stack[-1] = binary_op(tokens.GT, stack[-1], right)
+            elif op == COMPARE_GTE:
+                right = pop()
+                try:
+                    stack[-1] = TRUE if stack[-1] >= right else FALSE
+                except TypeError:
+                    stack[-1] = binary_op(tokens.GTE, stack[-1], right)
+            elif op == COMPARE_LTE:
+                right = pop()
+                try:
+                    stack[-1] = TRUE if stack[-1] <= right else FALSE
+                except TypeError:
+                    stack[-1] = binary_op(tokens.LTE, stack[-1], right)
+            elif op == UNARY_NEGATIVE:
+                try:
+                    stack[-1] = Integer(-stack[-1])
+                except TypeError:
+                    stack[-1] = arrays.negate(stack[-1])
+            elif op == MAKE_FUNCTION:
+                func_code = consts[arg]
+                push(Function(func_code.params, func_code.body, env, code=func_code))
+            elif op == DUP_TOP:
+                push(stack[-1])
+            elif op == BUILD_ARRAY:
+                if arg:
+                    elements = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    elements = []
+                push(arrays.make(elements))
+            elif op == BUILD_VECTOR:
+                if arg:
+                    elements = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    elements = []
+                push(persistent.vector(elements))
+            elif op == BUILD_MAP:
+                if arg:
+                    elements = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    elements = []
+                push(persistent.hash_map(elements))
+            elif op == BINARY_SUBSCR:
+                i = pop()
+                stack[-1] = arrays.index(stack[-1], i)
+            else:
+                raise VMError(f"Unknown opcode {op} at {pc - 2}")
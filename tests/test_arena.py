@@ -0,0 +1,62 @@
+import pytest
+
+from light import ast
+from light.arena import IDENTIFIER, INT_LITERAL, Arena
+from light.evaluator import Environment, execute
+from light.parser import parse_source
+
+from benchmarks.bench_lexer import generate_source
+
+SOURCES = [
+    '1',
+    'let x = 5; x = x + 1; -x',
+    'let f = func(a, b){ if a > b { return a } else { return b } }; f(1, 2)',
+    'let g = func(){ }; if true { g() }',
+    'let i = 0; while i < 3 { i = i + 1 }; i == 3 != false',
+    'let xs = [1, [2, 3]]; let v = #[4]; let m = #{1: xs, 2: v}; m[1][1][0] + v[0]',
+    generate_source(30),
+]
+
+
+def shape(program):
+    """Node types with their literal or operator, in preorder"""
+    nodes = []
+    for node in ast.walk(program):
+        if isinstance(node, (ast.BinaryOp, ast.PrefixOp)):
+            detail = node.op.kind
+        elif isinstance(node, (ast.Identifier, ast.IntLiteral, ast.BoolLiteral)):
+            detail = node.literal
+        else:
+            detail = None
+        nodes.append((type(node).__name__, detail))
+
+    return nodes
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_round_trip(source):
+    program = parse_source(source)
+    arena = Arena.from_program(program)
+    decoded = arena.to_program()
+
+    assert shape(decoded) == shape(program)
+    assert len(arena) == len(shape(program))
+    reencoded = Arena.from_program(decoded)
+    assert (reencoded.kinds, reencoded.sizes, reencoded.data, reencoded.literals) == \
+        (arena.kinds, arena.sizes, arena.data, arena.literals)
+
+
+# The generated source reads names it never binds
+@pytest.mark.parametrize('source', SOURCES[:-1])
+def test_decoded_programs_run(source):
+    decoded = Arena.from_program(parse_source(source)).to_program()
+
+    assert str(execute(decoded, Environment())) == str(execute(parse_source(source), Environment()))
+
+
+def test_literals_are_interned():
+    arena = Arena.from_program(parse_source('let x = 1; x + x + 1'))
+
+    assert arena.literals == ['x', '1']
+    assert arena.count(IDENTIFIER) == 3
+    assert [arena.literal(i) for i in arena.find(INT_LITERAL)] == ['1', '1']
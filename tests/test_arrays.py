@@ -0,0 +1,155 @@
+import importlib
+import sys
+
+import pytest
+
+from light import arrays, tokens
+from light.arrays import INT64_MAX
+from light.objects import FALSE, TRUE, Array, Integer
+
+
+@pytest.fixture(params=['numpy', 'lists'])
+def backend(request, monkeypatch):
+    """Runs a test with NumPy, when it is installed, and as if it wasn't"""
+    if request.param == 'numpy':
+        if arrays.numpy is None:
+            pytest.skip("NumPy is not installed")
+    else:
+        monkeypatch.setattr(arrays, 'numpy', None)
+
+    return request.param
+
+
+def array(*values):
+    return arrays.make([Integer(value) if type(value) is int else value for value in values])
+
+
+def elements(value):
+    return [int(element) if type(element) is Integer else element for element in value.elements()]
+
+
+def test_import_without_numpy(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'numpy', None)
+    try:
+        module = importlib.reload(arrays)
+
+        assert module.numpy is None
+        assert type(module.make([Integer(1)]).values) is list
+    finally:
+        monkeypatch.undo()
+        importlib.reload(arrays)
+
+
+def test_make_picks_the_storage(backend):
+    ints = array(1, 2, 3)
+    bools = arrays.make([TRUE, FALSE])
+    mixed = arrays.make([Integer(1), TRUE])
+
+    assert type(mixed.values) is list
+    if backend == 'numpy':
+        assert ints.values.dtype == arrays.numpy.int64
+        assert bools.values.dtype == bool
+    else:
+        assert type(ints.values) is list and type(bools.values) is list
+    assert elements(ints) == [1, 2, 3]
+    assert bools.elements() == [TRUE, FALSE]
+
+
+@pytest.mark.parametrize('values', [
+    [INT64_MAX, -INT64_MAX],
+    [INT64_MAX + 1],
+    [-INT64_MAX - 1],
+    [2 ** 100, 1],
+])
+def test_make_int64_edges(values, backend):
+    made = array(*values)
+
+    assert elements(made) == values
+    if backend == 'numpy':
+        fits = all(-INT64_MAX <= value <= INT64_MAX for value in values)
+        assert (type(made.values) is not list) == fits
+
+
+@pytest.mark.parametrize('kind, left, right, expected', [
+    (tokens.PLUS, [INT64_MAX, 1], 1, [INT64_MAX + 1, 2]),
+    (tokens.MINUS, [-INT64_MAX], 1, [-INT64_MAX - 1]),
+    (tokens.MINUS, [-INT64_MAX], [INT64_MAX], [-2 * INT64_MAX]),
+    (tokens.ASTERISK, [2 ** 32], 2 ** 32, [2 ** 64]),
+    (tokens.ASTERISK, [2 ** 31], [2 ** 31], [2 ** 62]),
+    (tokens.SLASH, [7, -7, 7, -7], [2, 2, -2, -2], [3, -3, -3, 3]),
+    # Division goes through a float, like on scalars
+    (tokens.SLASH, [INT64_MAX], -1, [int(INT64_MAX / -1)]),
+    (tokens.SLASH, [2 ** 53 - 1, 2 ** 53 + 1], 1, [2 ** 53 - 1, 2 ** 53]),
+    (tokens.PLUS, [2 ** 70], [1], [2 ** 70 + 1]),
+    (tokens.GT, [1, 5], 3, [FALSE, TRUE]),
+    (tokens.EQ, [1, 2], [1, 3], [TRUE, FALSE]),
+    (tokens.LTE, 2, [1, 2, 3], [FALSE, TRUE, TRUE]),
+])
+def test_binary_op(kind, left, right, expected, backend):
+    left = array(*left) if type(left) is list else Integer(left)
+    right = array(*right) if type(right) is list else Integer(right)
+
+    assert elements(arrays.binary_op(kind, left, right)) == expected
+
+
+def test_boolean_arrays_only_compare_for_equality(backend):
+    bools = arrays.make([TRUE, FALSE])
+
+    assert arrays.binary_op(tokens.EQ, bools, TRUE).elements() == [TRUE, FALSE]
+    assert arrays.binary_op(tokens.NEQ, bools, bools).elements() == [FALSE, FALSE]
+    with pytest.raises(TypeError):
+        arrays.binary_op(tokens.PLUS, bools, Integer(1))
+    with pytest.raises(TypeError):
+        arrays.binary_op(tokens.LT, bools, TRUE)
+
+
+def test_binary_op_errors(backend):
+    with pytest.raises(ValueError):
+        arrays.binary_op(tokens.PLUS, array(1, 2), array(1))
+    with pytest.raises(ZeroDivisionError):
+        arrays.binary_op(tokens.SLASH, array(1, 2), array(1, 0))
+
+
+def test_negate(backend):
+    assert elements(arrays.negate(array(-INT64_MAX, 0, INT64_MAX))) == [INT64_MAX, 0, -INT64_MAX]
+    assert elements(arrays.negate(array(-INT64_MAX - 1))) == [INT64_MAX + 1]
+
+
+def test_reductions(backend):
+    assert arrays.total(array(INT64_MAX, INT64_MAX)) == 2 * INT64_MAX
+    assert arrays.total(array()) == 0
+    assert arrays.minimum(array(3, -INT64_MAX, 5)) == -INT64_MAX
+    assert arrays.maximum(array(2 ** 64, 1)) == 2 ** 64
+    assert arrays.any_true(arrays.make([FALSE, TRUE])) is TRUE
+    assert arrays.all_true(arrays.make([FALSE, TRUE])) is FALSE
+    assert arrays.any_true(array(1)) is FALSE
+    with pytest.raises(ValueError):
+        arrays.minimum(array())
+
+
+def test_arange(backend):
+    assert elements(arrays.arange(-2, 3)) == [-2, -1, 0, 1, 2]
+    assert elements(arrays.arange(INT64_MAX - 1, INT64_MAX + 2)) == [INT64_MAX - 1, INT64_MAX, INT64_MAX + 1]
+    assert elements(arrays.arange(3, 1)) == []
+
+
+def test_index(backend):
+    values = array(4, 5, INT64_MAX)
+
+    assert arrays.index(values, 2) == INT64_MAX
+    assert type(arrays.index(values, 0)) is Integer
+    for i in (-1, 3):
+        with pytest.raises(ValueError):
+            arrays.index(values, i)
+    with pytest.raises(ValueError):
+        arrays.index(values, TRUE)
+
+
+def test_operators_are_boxed_on_request():
+    plus = arrays.operator(tokens.PLUS, boxed=True)
+    unboxed = arrays.operator(tokens.PLUS, boxed=False)
+
+    assert type(plus(1, 2)) is Integer
+    assert type(unboxed(1, 2)) is int
+    assert type(plus(array(1), 2)) is Array
+    assert arrays.operator(tokens.EQ, boxed=True)(array(1), array(1)).elements() == [TRUE]
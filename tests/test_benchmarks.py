@@ -0,0 +1,104 @@
+import json
+import sys
+
+import pytest
+
+# Importing run.py raises the recursion limit for deep workloads, the other tests keep theirs
+_limit = sys.getrecursionlimit()
+from benchmarks import run
+sys.setrecursionlimit(_limit)
+from benchmarks.workloads import evaluation
+
+
+def metrics(ops_per_sec, peak_bytes, live_blocks):
+    return {
+        'ops_per_sec': ops_per_sec,
+        'peak_bytes': peak_bytes,
+        'live_blocks': dict.fromkeys(run.PHASES, 0) | {'eval': live_blocks},
+        'phase': 'eval',
+    }
+
+
+def baseline(**results):
+    return {'engine': 'tree', 'results': results}
+
+
+@pytest.mark.parametrize('new, flags', [
+    (metrics(100, 1000, 1000), ''),
+    # Within the threshold
+    (metrics(95, 1050, 1050), ''),
+    (metrics(80, 1000, 1000), 'SLOWER'),
+    (metrics(100, 1200, 1000), 'MORE MEMORY'),
+    (metrics(100, 1000, 1200), 'MORE LIVE BLOCKS'),
+    (metrics(50, 2000, 2000), 'SLOWER MORE MEMORY MORE LIVE BLOCKS'),
+])
+def test_compare(new, flags, capsys):
+    regressions = run.compare({'fib': new}, baseline(fib=metrics(100, 1000, 1000)), run.THRESHOLD)
+    line = capsys.readouterr().out.rstrip()
+
+    assert regressions == bool(flags)
+    assert line.startswith('fib ')
+    assert line.endswith(f'live blocks  {flags}'.rstrip())
+
+
+def test_compare_live_blocks_slack(capsys):
+    # Doubled, but by fewer blocks than `ALLOCATION_SLACK`
+    assert run.compare({'fib': metrics(100, 1000, 20)}, baseline(fib=metrics(100, 1000, 10)), run.THRESHOLD) == 0
+
+
+def test_compare_older_baselines(capsys):
+    old = metrics(100, 1000, 1000)
+    old['allocated_blocks'] = old.pop('live_blocks')
+    assert run.compare({'fib': metrics(100, 1000, 1200)}, baseline(fib=old), run.THRESHOLD) == 1
+
+    del old['allocated_blocks']
+    assert run.compare({'fib': metrics(100, 1000, 1200)}, baseline(fib=old), run.THRESHOLD) == 0
+    assert 'live blocks' not in capsys.readouterr().out.splitlines()[-1]
+
+
+def test_compare_skips_new_benchmarks(capsys):
+    assert run.compare({'new': metrics(1, 1000, 1000)}, baseline(), run.THRESHOLD) == 0
+    assert capsys.readouterr().out == ''
+
+
+def test_measure():
+    result = run.measure(evaluation('let xs = range(100); xs * 2')(engine='tree'), repeat=1)
+
+    assert result['ops_per_sec'] > 0
+    assert result['peak_bytes'] > 0
+    assert set(result['live_blocks']) == set(run.PHASES)
+    assert result['live_blocks']['eval'] > 0
+
+
+def test_save_and_compare(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(run, 'WORKLOADS', {'tiny': ('eval', evaluation('1 + 2'))})
+    path = tmp_path / 'baseline.json'
+    monkeypatch.setattr(sys, 'argv', ['run.py', '--repeat', '1', '--save', str(path)])
+    run.main()
+
+    saved = json.loads(path.read_text())
+    assert saved['engine'] == 'tree'
+    assert set(saved['results']) == {'tiny'}
+    assert set(saved['results']['tiny']) == {
+        'ops_per_sec', 'peak_bytes', 'live_blocks', 'live_bytes', 'retained_blocks', 'gc_collections', 'phase'}
+
+    # The run is far faster than the baseline
+    saved['results']['tiny']['ops_per_sec'] /= 1000
+    path.write_text(json.dumps(saved))
+    monkeypatch.setattr(sys, 'argv', ['run.py', '--repeat', '1', '--compare', str(path)])
+    run.main()
+    assert capsys.readouterr().out.splitlines()[-1].startswith('tiny ')
+
+    # Then far slower
+    saved['results']['tiny']['ops_per_sec'] *= 1e9
+    path.write_text(json.dumps(saved))
+    with pytest.raises(SystemExit) as exit_:
+        run.main()
+    assert exit_.value.code == 1
+    assert 'SLOWER' in capsys.readouterr().out
+
+
+def test_unknown_benchmark(monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['run.py', 'nothing'])
+    with pytest.raises(SystemExit):
+        run.main()
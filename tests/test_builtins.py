@@ -0,0 +1,87 @@
+import pytest
+
+from light.builtins import BUILTINS
+from light.evaluator import ENGINES, Environment, execute
+from light.objects import TRUE, Array, Integer
+from light.parser import parse_source
+
+
+def run(source, engine='tree'):
+    return str(execute(parse_source(source), Environment(), engine))
+
+
+def call(func, values):
+    """Calls back into Python builtins only, like an engine would"""
+    return func.invoke(call, values)
+
+
+def invoke(name, *values):
+    return BUILTINS[name].invoke(call, list(values))
+
+
+def integers(*values):
+    return Array([Integer(value) for value in values])
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('source, expected', [
+    ('reduce(func(a, b){ return a + b }, [1, 2, 3])', '6'),
+    ('reduce(func(a, b){ return a + b }, [1, 2, 3], 10)', '16'),
+    ('reduce(func(a, b){ return a - b }, [10, 1, 2])', '7'),
+    ('reduce(func(a, b){ return a + b }, [], 5)', '5'),
+    ('reduce(func(a, b){ return a }, [4])', '4'),
+    ('reduce(func(a, b){ return conj(a, b) }, [1, 2], #[])', '#[1, 2]'),
+    # A first element of None is a value like any other
+    ('let none = func(){ }; reduce(func(a, b){ return a }, map(func(x){ return none() }, [1, 2]))', 'None'),
+    ('map(func(x){ return x * x }, range(5))', '[0, 1, 4, 9, 16]'),
+    ('map(func(x){ return x > 1 }, [1, 2])', '[false, true]'),
+    ('map(len, map(range, range(3)))', '[0, 1, 2]'),
+    ('map(func(x){ return x }, [])', '[]'),
+])
+def test_reduce_and_map(source, expected, engine):
+    assert run(source, engine) == expected
+
+
+def test_reduce_of_builtins():
+    assert invoke('reduce', BUILTINS['len'], integers(1)) == 1
+    assert invoke('reduce', BUILTINS['range'], integers(), Integer(3)) == 3
+
+
+def test_reduce_of_an_empty_array():
+    with pytest.raises(ValueError, match="empty array"):
+        invoke('reduce', BUILTINS['range'], integers())
+
+
+@pytest.mark.parametrize('name', ['reduce', 'map'])
+def test_collection_must_be_an_array(name):
+    with pytest.raises(ValueError):
+        invoke(name, BUILTINS['len'], Integer(3))
+
+
+@pytest.mark.parametrize('values', [
+    [],
+    [BUILTINS['len']],
+    [BUILTINS['len'], integers(), Integer(1), Integer(2)],
+])
+def test_reduce_arity(values):
+    with pytest.raises(ValueError, match="Number of arguments"):
+        invoke('reduce', *values)
+
+
+def test_map_boxes_results():
+    result = invoke('map', BUILTINS['range'], integers(2, 0))
+
+    assert [str(element) for element in result.elements()] == ['[0, 1]', '[]']
+    assert type(invoke('map', BUILTINS['len'], Array([integers(1)])).elements()[0]) is Integer
+
+
+def test_purity():
+    assert BUILTINS['len'].pure and BUILTINS['range'].pure
+    assert not BUILTINS['map'].pure
+    assert not BUILTINS['reduce'].pure
+    assert not BUILTINS['print'].pure
+
+
+def test_print(capsys):
+    assert invoke('print', Integer(1), TRUE) is None
+    assert capsys.readouterr().out == '1 true\n'
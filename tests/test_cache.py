@@ -0,0 +1,106 @@
+import os
+import pickle
+
+import pytest
+
+from light import cache
+from light.evaluator import Environment, execute
+
+SOURCE = 'let f = func(n){ if n < 2 { return n } return f(n - 1) + f(n - 2) }; f(10)'
+
+
+@pytest.fixture
+def script(tmp_path):
+    path = tmp_path / 'fib.lt'
+    path.write_text(SOURCE)
+
+    return str(path)
+
+
+def run(program):
+    return str(execute(program, Environment(), 'tree'))
+
+
+def test_round_trip(script):
+    program = cache.load_program(script)
+    path = cache.cache_path(script)
+
+    assert os.path.exists(path)
+    assert cache.read_cache(path, SOURCE) is not None
+    assert run(cache.load_program(script)) == run(program) == '55'
+
+
+def test_cached_program_is_used(script, monkeypatch):
+    cache.load_program(script)
+    monkeypatch.setattr(cache, 'parse_source', None)
+
+    assert run(cache.load_program(script)) == '55'
+
+
+def test_no_cache(script):
+    assert run(cache.load_program(script, use_cache=False)) == '55'
+    assert not os.path.exists(cache.cache_path(script))
+
+
+def test_source_change_invalidates(script):
+    cache.load_program(script)
+    with open(script, 'w') as f:
+        f.write('1 + 2')
+
+    assert cache.read_cache(cache.cache_path(script), '1 + 2') is None
+    assert run(cache.load_program(script)) == '3'
+    assert cache.read_cache(cache.cache_path(script), '1 + 2') is not None
+
+
+def test_version_change_invalidates(script, monkeypatch):
+    cache.load_program(script)
+    monkeypatch.setattr(cache, 'CACHE_VERSION', cache.CACHE_VERSION + 1)
+
+    assert cache.read_cache(cache.cache_path(script), SOURCE) is None
+    assert run(cache.load_program(script)) == '55'
+    assert cache.read_cache(cache.cache_path(script), SOURCE) is not None
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'LPC\0',
+    b'garbage',
+    'header',
+    'truncated',
+    'not an arena',
+])
+def test_corrupt_entry_is_rewritten(script, data):
+    path = cache.cache_path(script)
+    if data == 'header':
+        data = cache.header(SOURCE)
+    elif data == 'truncated':
+        cache.load_program(script)
+        with open(path, 'rb') as f:
+            data = f.read()[:-10]
+    elif data == 'not an arena':
+        data = cache.header(SOURCE) + pickle.dumps(42)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    assert cache.read_cache(path, SOURCE) is None
+    assert run(cache.load_program(script)) == '55'
+    assert cache.read_cache(path, SOURCE) is not None
+
+
+def test_failed_write_runs_uncached(script, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RecursionError("maximum recursion depth exceeded")
+
+    monkeypatch.setattr(cache.Arena, 'from_program', fail)
+    directory = os.path.dirname(cache.cache_path(script))
+
+    assert run(cache.load_program(script)) == '55'
+    assert os.listdir(directory) == []
+
+
+def test_unwritable_directory_runs_uncached(script, tmp_path):
+    # A file where the cache directory should be
+    (tmp_path / cache.CACHE_DIR).write_text('')
+
+    assert run(cache.load_program(script)) == '55'
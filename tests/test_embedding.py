@@ -0,0 +1,51 @@
+import pytest
+
+import light
+from light.embedding import ProgramCache
+
+
+def test_hits_misses_and_evictions():
+    cache = ProgramCache(maxsize=2)
+    first = cache.get('1')
+    cache.get('2')
+
+    assert cache.get('1') is first
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'evictions': 0, 'size': 2, 'maxsize': 2}
+
+    # '2' is the least recently used
+    cache.get('3')
+    assert cache.stats()['evictions'] == 1
+    assert cache.get('1') is first
+    cache.get('2')
+    assert cache.stats() == {'hits': 2, 'misses': 4, 'evictions': 2, 'size': 2, 'maxsize': 2}
+
+
+def test_optimize_flag_is_part_of_the_key():
+    cache = ProgramCache()
+
+    assert cache.get('1 + 2') is not cache.get('1 + 2', optimize=True)
+    assert (cache.hits, cache.misses, len(cache)) == (0, 2, 2)
+
+
+def test_clear_keeps_counters():
+    cache = ProgramCache()
+    cache.get('1')
+    cache.clear()
+    cache.get('1')
+
+    assert (cache.hits, cache.misses, len(cache)) == (0, 2, 1)
+
+
+@pytest.mark.parametrize('engine', light.ENGINES)
+def test_compiled_program_runs_with_bindings(engine):
+    handle = light.compile('let sq = func(x){ return x * x }; sq(n)', cache=ProgramCache())
+
+    assert str(handle.run({'n': 12}, engine)) == '144'
+    assert str(handle.run({'n': 3}, engine)) == '9'
+
+
+def test_compile_without_cache():
+    misses = light.PROGRAM_CACHE.misses
+
+    assert light.compile('1', cache=None) is not light.compile('1', cache=None)
+    assert light.PROGRAM_CACHE.misses == misses
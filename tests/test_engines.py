@@ -0,0 +1,167 @@
+"""Every engine, with and without the optimizer, must agree with the tree walker"""
+import pytest
+
+from light.evaluator import ENGINES, Environment, execute, prepare
+from light.optimizer import optimize_program
+from light.parser import parse_source
+from light.resolver import ResolverError
+
+PROGRAMS = [
+    '1 + 2 * 3 - 4',
+    '-7 / 2',
+    '(7 / 2) * 2',
+    '2 * -3',
+    '--3',
+    '1 == 1',
+    'true != false',
+    '3 >= 3',
+    'if 1 < 2 { 5 }',
+    'if 1 > 2 { 5 }',
+    'if 1 > 2 { 5 } else { 6 }',
+    'if 1 { 2 } else { 3 }',
+    'return 5',
+    'let x = 5',
+    '{ 1; 2 }',
+    '',
+    'let a = 1; let a = 2; a',
+    'let x = 1; { let x = 2 }; x',
+    'let f = func(){ }; f()',
+    'let f = func(n){ if n < 2 { return 100 } }; f(1)',
+    'let f = func(n){ if n > 0 { 1 } }; f(0)',
+    'let f = func(n){ { return n * 3 } return 0 }; f(2)',
+    'let fib = func(n){ if n < 2 { return n } return fib(n - 1) + fib(n - 2) }; fib(15)',
+    'let sum = func(n, acc){ if n == 0 { return acc } return sum(n - 1, acc + n) }; sum(100, 0)',
+    'let mk = func(a){ return func(b){ return a + b } }; let add = mk(3); add(4)',
+    'let compose = func(f, g){ return func(x){ return f(g(x)) } }; '
+    'let h = compose(func(x){ return x + 1 }, func(x){ return x * 2 }); h(5)',
+    'let twice = func(f, x){ return f(f(x)) }; let sq = func(x){ return x * x }; twice(sq, 3)',
+    'let even = func(n){ if n == 0 { return true } return odd(n - 1) }; '
+    'let odd = func(n){ if n == 0 { return false } return even(n - 1) }; even(10)',
+    'let f = func(){ let g = func(){ return h() }; let h = func(){ return 42 }; return g() }; f()',
+    'let x = 10; let f = func(){ return x }; let x = 20; f()',
+    'let f = func(a){ let a = a + 1; return a }; f(1)',
+    'let f = func(n){ let k = n; if k > 0 { let k = k * 10 } return k }; f(3)',
+    # Reads before a `let` in the same body see the enclosing binding
+    'let x = 1; let f = func(){ let y = x; let x = 2; return y }; f()',
+    'let x = 1; let f = func(c){ if c { let x = 2 } return x }; f(true) + f(false)',
+    # Loops
+    'let i = 0; let t = 0; while i < 10 { t = t + i; i = i + 1 }; t',
+    'let f = func(n){ let i = 0; while true { if i == n { return i * 2 } i = i + 1 } }; f(7)',
+    'let k = 3; let f = func(x){ return x + k }; let g = func(){ k = k + 1; return f(1) }; g() + g()',
+    # Rebinding a called name invalidates the call site caches
+    'let f = func(){ return 1 }; let g = func(){ return f() }; let a = g(); '
+    'f = func(){ return 2 }; a * 10 + g()',
+    # Deep tail calls run in constant stack
+    'let loop = func(i){ if i == 0 { return 0 } return loop(i - 1) }; loop(20000)',
+    'let loop = func(i, acc){ if i == 0 { return acc } return loop(i - 1, acc + 1) }; loop(20000, 0)',
+    # Collections and builtins
+    'let a = [1, 2, 3]; a[1] + sum(a * 2)',
+    '[1, 2] == [1, 3]',
+    'let v = conj(#[1, 2], 3); v[2] + len(v)',
+    'let m = assoc(#{1: 2}, 3, 4); get(m, 3) + get(m, 5, 10)',
+    'reduce(func(a, b){ return a + b }, [1, 2, 3])',
+    'map(func(x){ return x * x }, range(5))',
+    'map(len, map(range, range(4)))',
+    'print(1, true); 2',
+    # Arguments are evaluated left to right, also once inlined
+    'let p = func(x){ print(x); return x }; let f = func(a, b){ return a - b }; f(p(1), p(2))',
+    'let i = 0; let p = func(){ print(i); return i }; while i < 3 { p(); i = i + 1 }',
+    # The first error stays the same once inlined
+    'let f = func(a, b){ return b + a }; f(1 / 0, zz)',
+    'let f = func(a, b){ return b + a }; f(1 / 0, [1][3])',
+    'let f = func(a, b){ return b * a }; f(len(5), 1 / 0)',
+    'let f = func(a, b){ return a + b }; f(zz, 1 / 0)',
+    'let f = func(a, b){ return (a + 1) * b }; f(true, 1 / 0)',
+    'let f = func(a){ return 1 }; f(zz)',
+    'let f = func(a, b){ return a(b) }; f(zz, 1 / 0)',
+    'let k = 2; let f = func(a, b){ return b - a }; f(k, 7) + f(1 / 1, k)',
+    # Errors
+    'y',
+    '5 / 0',
+    'let x = 3; x(1)',
+    'let f = func(a){ return a }; f(1, 2)',
+    'let f = func(){ return y }; f()',
+    'let f = func(){ y = 1 }; f()',
+    '[1, 2][5]',
+    'reduce(func(a, b){ return a }, [])',
+]
+
+
+def run(source, engine, optimize, capsys):
+    """The printed result of `source`, or its exception type, and its stdout"""
+    program = parse_source(source)
+    if optimize:
+        program, _ = optimize_program(program)
+
+    try:
+        result = str(execute(program, Environment(), engine))
+    except ResolverError:
+        # Reported before anything runs, the other engines fail later on
+        result = ResolverError
+    except Exception as e:
+        # Messages mention plain ints or Integers depending on the engine
+        result = type(e)
+
+    return result, capsys.readouterr().out
+
+
+@pytest.mark.parametrize('optimize', [False, True], ids=['plain', 'optimized'])
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_engines_agree(source, engine, optimize, capsys):
+    expected = run(source, 'tree', False, capsys)
+    result = run(source, engine, optimize, capsys)
+
+    if result[0] is ResolverError:
+        assert isinstance(expected[0], type) and issubclass(expected[0], Exception)
+    else:
+        assert result == expected
+
+
+@pytest.mark.parametrize('source, expected', [
+    ('let x = 1; let f = func(){ let y = x; let x = 2; return y }; f()', '1'),
+    ('let loop = func(i){ if i == 0 { return 0 } return loop(i - 1) }; loop(100000)', '0'),
+    ('let i = 0; let t = 0; while i < 10 { t = t + i; i = i + 1 }; t', '45'),
+])
+@pytest.mark.parametrize('engine', ENGINES)
+def test_expected_results(source, expected, engine, capsys):
+    assert run(source, engine, False, capsys) == (expected, '')
+
+
+def test_inlined_arguments_keep_their_order(capsys):
+    source = 'let p = func(x){ print(x); return x }; let f = func(a, b){ return a - b }; f(p(1), p(2))'
+
+    assert run(source, 'tree', True, capsys) == ('-1', '1\n2\n')
+
+
+@pytest.mark.parametrize('source', [
+    'y',
+    'let f = func(){ return y }; 1',
+    'let f = func(){ y = 1 }; 1',
+    'print(1); let f = func(){ return g() }; f()',
+])
+def test_resolver_rejects_unbound_names(source, capsys):
+    runner = prepare(parse_source(source), 'resolved')
+
+    with pytest.raises(ResolverError, match="Unbound variable"):
+        runner(Environment())
+    assert capsys.readouterr().out == ''
+
+
+@pytest.mark.parametrize('source, expected', [
+    ('y + 1', '3'),
+    ('let f = func(){ return y * 2 }; f()', '4'),
+    ('let f = func(){ return g() }; let g = func(){ return 5 }; f()', '5'),
+    ('if false { let y = 1 } let f = func(){ return y }; f()', '2'),
+])
+def test_resolver_allows_names_bound_by_the_caller_or_later(source, expected):
+    runner = prepare(parse_source(source), 'resolved')
+
+    assert str(runner(Environment.from_bindings({'y': 2}))) == expected
+
+
+def test_resolver_rejects_parameters_that_are_not_names():
+    program = parse_source('let f = func(1){ return 1 }; f(1)')
+
+    with pytest.raises(ResolverError):
+        prepare(program, 'resolved')
@@ -0,0 +1,75 @@
+import pytest
+
+from light import ast
+from light.evaluator import Environment, Evaluator, execute
+from light.inference import BOOL, INT, infer_program
+from light.objects import Integer
+from light.parser import parse_source
+
+
+def types(source):
+    """The inferred type of every expression of `source`, by node class name"""
+    program = infer_program(parse_source(source))
+
+    return [(type(node).__name__, node.type) for node in ast.walk(program)
+            if isinstance(node, ast.Expression)]
+
+
+def test_operators_and_literals_are_typed():
+    assert types('1 + x * 2 < 3 == true') == [
+        ('BinaryOp', BOOL),
+        ('BinaryOp', BOOL),
+        ('BinaryOp', INT),
+        ('IntLiteral', INT),
+        ('BinaryOp', INT),
+        ('Identifier', None),
+        ('IntLiteral', INT),
+        ('IntLiteral', INT),
+        ('BoolLiteral', BOOL),
+    ]
+
+
+def test_names_and_calls_are_untyped():
+    assert types('let f = func(n){ return -n }; f(1)') == [
+        ('Identifier', None),
+        ('FunctionLiteral', None),
+        ('Identifier', None),
+        ('PrefixOp', INT),
+        ('Identifier', None),
+        ('FunctionCall', None),
+        ('Identifier', None),
+        ('IntLiteral', INT),
+    ]
+
+
+def test_typed_arithmetic_is_unboxed():
+    program = infer_program(parse_source('let f = func(n){ return n * 2 + 1 }; f(3)'))
+    evaluator = Evaluator()
+    env = Environment()
+    evaluator.eval_program(program, env)
+    call = program.statements[1]
+
+    # Plain ints go through the call and the return, boxed only at the end
+    assert type(evaluator.eval(call, env)) is int
+    assert type(evaluator.eval_program(program, Environment())) is Integer
+
+
+@pytest.mark.parametrize('source', [
+    'let fib = func(n){ if n < 2 { return n } return fib(n - 1) + fib(n - 2) }; fib(12)',
+    'let f = func(x){ return x + 1 }; f([1, 2])',
+    'let f = func(x){ return -x }; f(true)',
+    'let x = 1; let f = func(){ let y = x; x = true; return y + 1 }; f()',
+    '[1, 2] * 3 == [3, 6]',
+    '7 / -2',
+])
+def test_typed_results_match_untyped(source):
+    def run(typed):
+        program = parse_source(source)
+        try:
+            if typed:
+                return str(execute(program, Environment(), 'tree'))
+            return str(Evaluator().eval_program(program, Environment()))
+        except Exception as e:
+            return type(e)
+
+    assert run(True) == run(False)
@@ -0,0 +1,66 @@
+import gc
+import weakref
+
+import pytest
+
+import light
+from light import evaluator
+from light.evaluator import Environment, Evaluator
+from light.parser import parse_source
+
+# The call in g isn't in tail position, so it goes through the inline cache
+CALLER = 'let f = func(){ return 1 }; let g = func(){ return f() + 0 }; '
+
+
+def run(source):
+    env = Environment()
+
+    return str(Evaluator().eval_program(parse_source(source), env)), env
+
+
+@pytest.mark.parametrize('source, expected', [
+    ('g()', '1'),
+    ('let a = g(); f = func(){ return 2 }; a * 10 + g()', '12'),
+    ('let a = g(); let f = func(){ return 3 }; a * 10 + g()', '13'),
+    # g's frame has a new parent, the entry of the first one doesn't apply
+    ('let mk = func(n){ let f = func(){ return n }; return func(){ return f() + 0 } }; '
+     'let h = mk(4); let k = mk(5); h() * 10 + k()', '45'),
+])
+def test_rebinding_invalidates_entries(source, expected):
+    assert run(CALLER + source)[0] == expected
+
+
+def test_rebinding_to_a_value_that_is_not_callable():
+    with pytest.raises(ValueError, match="Object 5 is not callable"):
+        run(CALLER + 'let a = g(); f = 5; g()')
+
+
+def test_plain_values_leave_versions_alone():
+    result, env = run(CALLER + 'let i = 0; while i < 10 { g(); i = i + 1 }; let n = g(); f = f; n')
+
+    assert result == '1'
+    assert env.caches.versions == {'f': 1}
+
+
+def test_caches_belong_to_the_global_environment():
+    _, first = run(CALLER + 'g()')
+    _, second = run(CALLER + 'g()')
+    frame = Environment(parent=first)
+
+    assert first.caches is not second.caches
+    assert frame.caches is first.caches
+    assert len(first.caches.entries) == 1
+    assert not hasattr(evaluator, 'BINDING_VERSIONS')
+
+
+def test_environments_are_released_after_a_run():
+    handle = light.compile(CALLER + 'g()')
+    env = Environment()
+    handle.run_in(env)
+    func = weakref.ref(env.get(parse_source('f').statements[0]))
+    del env
+    gc.collect()
+
+    # Nothing the program keeps refers to the functions of the last run
+    assert func() is None
+    assert handle.run() is not None
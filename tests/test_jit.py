@@ -0,0 +1,42 @@
+import pytest
+
+from light.evaluator import Environment, execute
+from light.inference import infer_program
+from light.jit import JITEvaluator
+from light.parser import parse_source
+
+
+def run(source, threshold):
+    evaluator = JITEvaluator(threshold=threshold)
+    result = evaluator.eval_program(infer_program(parse_source(source)), Environment())
+
+    return str(result), evaluator
+
+
+def test_hot_functions_are_compiled():
+    result, evaluator = run('let f = func(x){ return x * 2 }; f(1) + f(2) + f(3)', 2)
+
+    assert result == '12'
+    assert (evaluator.compiled, evaluator.deopts) == (1, 0)
+
+
+@pytest.mark.parametrize('source, expected', [
+    # Compiled for an int, then called with an array
+    ('let f = func(x){ return x * 2 }; let a = f(1) + f(2) + f(3); [a, f([1, 2]), f(4)]', '[12, [2, 4], 8]'),
+    # Compiled for a bool, then called with an int
+    ('let f = func(x, y){ if x { return y } return 0 }; [f(true, 1), f(true, 2), f(1, 3), f(false, 4)]',
+     '[1, 2, 0, 0]'),
+])
+def test_mismatched_arguments_deoptimize(source, expected):
+    result, evaluator = run(source, 2)
+
+    assert result == expected == str(execute(parse_source(source), Environment(), 'tree'))
+    # The interpreter runs the call, the compiled code is kept for matching ones
+    assert (evaluator.compiled, evaluator.deopts) == (1, 1)
+
+
+def test_cold_functions_are_interpreted():
+    result, evaluator = run('let f = func(x){ return x * 2 }; f(1) + f([1])', 10)
+
+    assert result == '[4]'
+    assert (evaluator.compiled, evaluator.deopts) == (0, 0)
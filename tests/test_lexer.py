@@ -0,0 +1,35 @@
+import pytest
+
+from light.lexer import Lexer, tokenize, tokenize_iter
+
+from benchmarks.bench_lexer import generate_source
+
+
+def spelled(toks):
+    return [(tok.kind, tok.literal, tok.offset) for tok in toks]
+
+
+@pytest.mark.parametrize('source', [
+    '',
+    '   \n\t',
+    'let x = 5; x',
+    'let f = func(a, b){ if a >= b { return a } else { return b } }',
+    'while i != 10 { i = i + 1 }',
+    'a==b<=c>=d<e>f',
+    '#[1, 2] #{1: 2} [3][0]',
+    'x_y _ true false truex',
+    '12 007 3abc',
+    '!x # $ ?',
+    'before\0after',
+    'trailing\x0b\x0c\r',
+    generate_source(50),
+])
+def test_same_tokens_as_the_lexer(source):
+    expected = spelled(Lexer(source).scan())
+
+    assert spelled(tokenize_iter(source)) == expected
+    assert spelled(tokenize(source)) == expected
+
+
+def test_stops_after_eof():
+    assert [tok.literal for tok in tokenize_iter('a\0b')] == ['a', '\0']
@@ -0,0 +1,48 @@
+import pytest
+
+from light.evaluator import Environment, execute
+from light.memo import MemoizingEvaluator, memo_stats
+from light.parser import parse_source
+
+
+def run(source, env):
+    return str(execute(parse_source(source), env, 'memo'))
+
+
+def test_hits_and_misses():
+    env = Environment()
+
+    assert run('let f = func(n){ return n * 2 }; f(1) + f(1) + f(2)', env) == '8'
+    assert memo_stats(env) == {'f': {'hits': 1, 'misses': 2, 'evictions': 0, 'size': 2, 'maxsize': 1024}}
+
+
+def test_recursive_calls_hit():
+    env = Environment()
+
+    assert run('let fib = func(n){ if n < 2 { return n } return fib(n - 1) + fib(n - 2) }; fib(20)', env) == '6765'
+    assert memo_stats(env)['fib'] == {'hits': 18, 'misses': 21, 'evictions': 0, 'size': 21, 'maxsize': 1024}
+
+
+def test_evictions():
+    env = Environment()
+    program = parse_source('let f = func(n){ return n * 2 }; f(1) + f(2) + f(3) + f(1)')
+
+    assert str(MemoizingEvaluator(maxsize=2).eval_program(program, env)) == '14'
+    assert memo_stats(env)['f'] == {'hits': 0, 'misses': 4, 'evictions': 2, 'size': 2, 'maxsize': 2}
+
+
+@pytest.mark.parametrize('rebinding', ['k = 20', 'let k = 20'])
+def test_rebinding_a_dependency_empties_the_table(rebinding):
+    env = Environment()
+    assert run('let k = 10; let f = func(n){ return n + k }; f(1) + f(2)', env) == '23'
+
+    assert run(f'{rebinding}; f(1) + f(1)', env) == '42'
+    assert memo_stats(env)['f'] == {'hits': 1, 'misses': 3, 'evictions': 0, 'size': 1, 'maxsize': 1024}
+
+
+def test_impure_functions_have_no_table(capsys):
+    env = Environment()
+
+    assert run('let f = func(n){ print(n); return n }; f(1) + f(1)', env) == '2'
+    assert capsys.readouterr().out == '1\n1\n'
+    assert memo_stats(env) == {}
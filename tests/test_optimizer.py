@@ -0,0 +1,81 @@
+import pytest
+
+from light.evaluator import Environment, execute
+from light.optimizer import Optimizer, count_nodes, optimize_program
+from light.parser import parse_source
+
+BIG = '10000000000000000000001'
+
+# Expressions the optimizer folds or simplifies
+EXPRESSIONS = [
+    '2 * 3 + 1',
+    '-7 / 2',
+    '7 / 0',
+    '1 + true',
+    'true == true',
+    '--x',
+    'x + 0',
+    '0 + x',
+    'x - 0',
+    'x * 1',
+    '1 * x',
+    'x / 1',
+    '(x + 0) / 1',
+    '(x * 1) / 1',
+    '(x * 2) + 0',
+    'x / 1 == x',
+    '[x, x] / 1',
+    '([x] + 0) / 1',
+    'if 1 < 2 { x } else { 0 }',
+    'if false { x }',
+]
+
+
+def run(source, optimize):
+    program = parse_source(source)
+    if optimize:
+        program, _ = optimize_program(program)
+
+    try:
+        return str(execute(program, Environment(), 'tree'))
+    except Exception as e:
+        return type(e)
+
+
+@pytest.mark.parametrize('x', ['3', '-3', BIG, '-' + BIG, 'true'])
+@pytest.mark.parametrize('expression', EXPRESSIONS)
+def test_optimized_results_are_unchanged(expression, x):
+    source = f'let x = {x}; {expression}'
+
+    assert run(source, True) == run(source, False)
+
+
+def test_division_by_one_is_kept():
+    # The quotient goes through a float, which rounds integers from 2 ** 53 up
+    assert run(f'let b = {BIG}; (b * 1) / 1', True) == str(int(int(BIG) / 1)) != BIG
+
+
+@pytest.mark.parametrize('source, eliminated', [
+    ('2 * 3 + 1', 4),
+    ('x', 0),
+    ('7 / 0', 0),
+    ('(x * 1) / 1', 0),
+    # The condition and the branch not taken
+    ('if 1 < 2 { x } else { 0 }', 6),
+    ('while false { x }; 1', 3),
+    # The call and its callee's name make way for the folded body
+    ('let f = func(a){ return a + 1 }; f(2)', 2),
+])
+def test_eliminated_nodes(source, eliminated):
+    program = parse_source(source)
+    before = count_nodes(program)
+    program, count = optimize_program(program)
+
+    assert count == eliminated == before - count_nodes(program)
+
+
+def test_inlined_calls_are_counted():
+    optimizer = Optimizer()
+    optimizer.optimize_program(parse_source('let f = func(a){ return a + 1 }; f(2) + f(3)'))
+
+    assert (optimizer.inlined, optimizer.eliminated) == (2, 6)
@@ -0,0 +1,131 @@
+import pytest
+
+from light import persistent
+from light.objects import Integer, Map
+
+# Lengths around the tail, the first leaf and the levels of the trie
+LENGTHS = [0, 1, 31, 32, 33, 64, 65, 1024, 1056, 1057, 2000, 32 * 32 * 32 + 33]
+
+
+def integers(n):
+    return [Integer(i) for i in range(n)]
+
+
+@pytest.mark.parametrize('n', LENGTHS)
+def test_vector_matches_appends(n):
+    built = persistent.vector(integers(n))
+    appended = persistent.vector([])
+    for value in integers(n):
+        appended = persistent.append(appended, value)
+
+    assert built.count == appended.count == n
+    assert built.elements() == appended.elements() == integers(n)
+    assert [persistent.nth(appended, i) for i in range(n)] == integers(n)
+    assert built == appended
+
+
+def test_append_leaves_the_original_unchanged():
+    vec = persistent.vector(integers(1056))
+    longer = persistent.append(vec, Integer(-1))
+
+    assert vec.elements() == integers(1056)
+    assert longer.elements() == integers(1056) + [-1]
+
+
+@pytest.mark.parametrize('n', LENGTHS[1:])
+def test_assoc_index_copies_one_path(n):
+    vec = persistent.vector(integers(n))
+    for i in {0, n // 2, n - 1}:
+        updated = persistent.assoc(vec, i, Integer(-1))
+
+        assert persistent.nth(updated, i) == -1
+        assert persistent.nth(vec, i) == i
+        assert updated.elements()[:i] + updated.elements()[i + 1:] == \
+            integers(n)[:i] + integers(n)[i + 1:]
+
+
+def test_assoc_index_at_the_length_appends():
+    vec = persistent.assoc(persistent.vector(integers(32)), 32, Integer(32))
+
+    assert vec.elements() == integers(33)
+
+
+@pytest.mark.parametrize('i', [-1, 4, 'a'])
+def test_assoc_index_out_of_range(i):
+    with pytest.raises(ValueError):
+        persistent.assoc(persistent.vector(integers(3)), i, Integer(0))
+
+
+def test_map_assoc_and_get():
+    map_ = persistent.hash_map([])
+    for i in range(1000):
+        map_ = persistent.assoc(map_, Integer(i), Integer(i * i))
+
+    assert map_.count == 1000
+    assert all(persistent.get(map_, Integer(i)) == i * i for i in range(1000))
+    assert persistent.lookup(map_, Integer(1000)) is persistent.MISSING
+    with pytest.raises(ValueError):
+        persistent.get(map_, Integer(1000))
+
+
+def test_map_assoc_leaves_the_original_unchanged():
+    map_ = persistent.hash_map([Integer(1), Integer(2)])
+    replaced = persistent.assoc(map_, Integer(1), Integer(3))
+    added = persistent.assoc(map_, Integer(2), Integer(4))
+
+    assert dict(map_.items()) == {1: 2}
+    assert dict(replaced.items()) == {1: 3}
+    assert dict(added.items()) == {1: 2, 2: 4}
+    assert replaced.count == 1 and added.count == 2
+
+
+def test_map_assoc_of_the_same_value_returns_the_map():
+    value = Integer(2)
+    map_ = persistent.hash_map([Integer(1), value])
+
+    assert persistent.assoc(map_, Integer(1), value) is map_
+
+
+def test_map_hash_collisions():
+    # Keys whose hashes are equal in their low 32 bits share a collision node
+    keys = [Integer(i << 32 | 7) for i in range(5)]
+    map_ = persistent.hash_map([])
+    for key in keys:
+        map_ = persistent.assoc(map_, key, key + 1)
+    map_ = persistent.assoc(map_, Integer(7 + 32), Integer(0))
+    map_ = persistent.assoc(map_, keys[2], Integer(-2))
+
+    assert map_.count == 6
+    expected = [key + 1 for key in keys]
+    expected[2] = -2
+    assert [persistent.get(map_, key) for key in keys] == expected
+    assert persistent.get(map_, Integer(7 + 32)) == 0
+    assert persistent.lookup(map_, Integer(5 << 32 | 7)) is persistent.MISSING
+
+
+def test_maps_compare_by_contents():
+    pairs = [[Integer(i), Integer(-i)] for i in range(100)]
+    first = persistent.hash_map(sum(pairs, []))
+    second = persistent.hash_map(sum(pairs[::-1], []))
+
+    assert type(first) is Map
+    assert first == second
+    assert hash(first) == hash(second)
+    assert first != persistent.assoc(second, Integer(0), Integer(1))
+
+
+def test_vectors_as_map_keys():
+    key = persistent.vector(integers(3))
+    map_ = persistent.hash_map([key, Integer(1)])
+
+    assert persistent.get(map_, persistent.vector(integers(3))) == 1
+
+
+def test_conj():
+    vec = persistent.conj(persistent.vector([]), Integer(1))
+    map_ = persistent.conj(persistent.hash_map([]), persistent.vector(integers(2)))
+
+    assert vec.elements() == [1]
+    assert dict(map_.items()) == {0: 1}
+    with pytest.raises(ValueError):
+        persistent.conj(map_, persistent.vector(integers(3)))
@@ -0,0 +1,79 @@
+import re
+
+from light.evaluator import Environment
+from light.parser import parse_source
+from light.profiler import TOP_LEVEL, ProfilingEvaluator, collapsed_stacks, format_report, write_collapsed_stacks
+
+SOURCE = """
+let fib = func(n){ if n < 2 { return n } return fib(n - 1) + fib(n - 2) }
+let id = func(x){ return x }
+id(fib(8)) + len([1])
+"""
+
+
+def profile():
+    evaluator = ProfilingEvaluator()
+    result = evaluator.eval_program(parse_source(SOURCE), Environment())
+
+    assert str(result) == '22'
+    return evaluator.profile
+
+
+def test_calls():
+    profile_ = profile()
+
+    assert {name: timing.calls for name, timing in profile_.functions.items()} == {
+        TOP_LEVEL: 1, 'fib': 67, 'id': 1, 'len': 1}
+    assert sorted(timing.calls for timing in profile_.sites.values()) == [1, 1, 1, 33, 33]
+    assert profile_.nodes['Conditional'] == 67
+
+
+def test_times():
+    profile_ = profile()
+    fib = profile_.functions['fib']
+
+    assert profile_.total == profile_.functions[TOP_LEVEL].inclusive > 0
+    assert 0 < fib.exclusive <= fib.inclusive <= profile_.total
+    assert sum(timing.exclusive for timing in profile_.functions.values()) <= profile_.total * 1.001
+
+
+def test_report():
+    report = format_report(profile())
+
+    assert report.startswith('Profile: ')
+    assert re.search(r'^fib +67 +[\d.]+ms +[\d.]+ms$', report, re.MULTILINE)
+    assert re.search(r'^len +1 ', report, re.MULTILINE)
+    assert re.search(r'^Conditional +67$', report, re.MULTILINE)
+    # Call sites are named after the caller, the callee and its offset
+    assert len(re.findall(r'^fib -> fib @\d+ +33 +[\d.]+ms$', report, re.MULTILINE)) == 2
+
+
+def test_report_limit():
+    lines = format_report(profile(), limit=1).splitlines()
+
+    # The total, then a heading and one row per table
+    rows = [line for line in lines if line][2::2]
+
+    assert len(rows) == 3
+    assert rows[0].startswith('fib ')
+    # The outermost call of fib includes all the others
+    assert rows[1].startswith(f'{TOP_LEVEL} -> fib @')
+    assert rows[2].split() == ['Identifier', '168']
+
+
+def test_collapsed_stacks(tmp_path):
+    profile_ = profile()
+    lines = collapsed_stacks(profile_)
+    path = tmp_path / 'stacks.txt'
+    write_collapsed_stacks(profile_, str(path))
+
+    assert path.read_text().splitlines() == lines
+    for line in lines:
+        stack, micros = line.rsplit(' ', 1)
+        frames = stack.split(';')
+        assert frames[0] == TOP_LEVEL
+        assert int(micros) > 0
+        # fib(8) recurses 8 deep at most, the other calls are made from the top level
+        assert frames[1:] in ([], ['id'], ['len']) or set(frames[1:]) == {'fib'}
+        assert len(frames) <= 9
+    assert f'{TOP_LEVEL};fib;fib' in {line.rsplit(' ', 1)[0] for line in lines}